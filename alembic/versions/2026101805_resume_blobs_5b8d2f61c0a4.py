@@ -0,0 +1,43 @@
+"""resume blobs
+
+Revision ID: 5b8d2f61c0a4
+Revises: 3e0fb5ddc1fa
+Create Date: 2026-10-18 09:05:12.418305
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5b8d2f61c0a4"
+down_revision = "3e0fb5ddc1fa"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "resume_blobs",
+        sa.Column("digest", sa.String(length=64), nullable=False),
+        sa.Column("size", sa.BigInteger(), nullable=False),
+        sa.Column("ref_count", sa.Integer(), nullable=False),
+        sa.Column(
+            "create_time",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column(
+            "update_time",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("digest"),
+    )
+
+
+def downgrade():
+    op.drop_table("resume_blobs")
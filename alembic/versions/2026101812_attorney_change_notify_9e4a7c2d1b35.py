@@ -0,0 +1,44 @@
+"""attorney change notify
+
+Revision ID: 9e4a7c2d1b35
+Revises: 5b8d2f61c0a4
+Create Date: 2026-10-18 09:12:40.226517
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "9e4a7c2d1b35"
+down_revision = "5b8d2f61c0a4"
+branch_labels = None
+depends_on = None
+
+# Must match Settings.cache.invalidation_channel and the "attorney" namespace
+# of app/core/attorney_cache.py
+CHANNEL = "app_cache_invalidation"
+
+
+def upgrade():
+    op.execute(
+        f"""
+        CREATE FUNCTION attorneys_notify_change() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('{CHANNEL}', 'attorney:' || OLD.attorney_id::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER attorneys_notify_change
+        AFTER UPDATE OR DELETE ON attorneys
+        FOR EACH ROW EXECUTE FUNCTION attorneys_notify_change()
+        """
+    )
+
+
+def downgrade():
+    op.execute("DROP TRIGGER attorneys_notify_change ON attorneys")
+    op.execute("DROP FUNCTION attorneys_notify_change()")
@@ -0,0 +1,118 @@
+"""attorney lead counts
+
+Revision ID: c3f19a8e6d27
+Revises: 9e4a7c2d1b35
+Create Date: 2026-10-18 09:20:31.904117
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c3f19a8e6d27"
+down_revision = "9e4a7c2d1b35"
+branch_labels = None
+depends_on = None
+
+CHANNEL = "app_cache_invalidation"
+
+
+def upgrade():
+    op.create_table(
+        "attorney_lead_counts",
+        sa.Column("attorney_id", sa.Uuid(as_uuid=False), nullable=False),
+        sa.Column("state", sa.String(length=64), nullable=False),
+        sa.Column("lead_count", sa.Integer(), nullable=False),
+        sa.Column(
+            "create_time",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column(
+            "update_time",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(
+            ["attorney_id"], ["attorneys.attorney_id"], ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("attorney_id", "state"),
+    )
+    op.create_index(
+        "ix_attorney_lead_counts_state_lead_count",
+        "attorney_lead_counts",
+        ["state", "lead_count"],
+    )
+    op.execute(sa.schema.CreateSequence(sa.Sequence("attorney_assignment_seq")))
+
+    # Backfill from existing leads, every attorney gets a PENDING row so the
+    # least loaded strategy also sees attorneys without leads
+    op.execute(
+        """
+        INSERT INTO attorney_lead_counts (attorney_id, state, lead_count)
+        SELECT attorney_id, 'PENDING', 0 FROM attorneys
+        ON CONFLICT DO NOTHING
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO attorney_lead_counts (attorney_id, state, lead_count)
+        SELECT attorney_id, state, count(*) FROM leads GROUP BY attorney_id, state
+        ON CONFLICT (attorney_id, state) DO UPDATE SET lead_count = excluded.lead_count
+        """
+    )
+
+    # New attorneys have to reach the in-memory attorney directory of every
+    # worker too, so the change notification now also fires on INSERT
+    op.execute(
+        f"""
+        CREATE OR REPLACE FUNCTION attorneys_notify_change() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                PERFORM pg_notify('{CHANNEL}', 'attorney:' || NEW.attorney_id::text);
+            ELSE
+                PERFORM pg_notify('{CHANNEL}', 'attorney:' || OLD.attorney_id::text);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute("DROP TRIGGER attorneys_notify_change ON attorneys")
+    op.execute(
+        """
+        CREATE TRIGGER attorneys_notify_change
+        AFTER INSERT OR UPDATE OR DELETE ON attorneys
+        FOR EACH ROW EXECUTE FUNCTION attorneys_notify_change()
+        """
+    )
+
+
+def downgrade():
+    op.execute("DROP TRIGGER attorneys_notify_change ON attorneys")
+    op.execute(
+        f"""
+        CREATE OR REPLACE FUNCTION attorneys_notify_change() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('{CHANNEL}', 'attorney:' || OLD.attorney_id::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER attorneys_notify_change
+        AFTER UPDATE OR DELETE ON attorneys
+        FOR EACH ROW EXECUTE FUNCTION attorneys_notify_change()
+        """
+    )
+    op.execute(sa.schema.DropSequence(sa.Sequence("attorney_assignment_seq")))
+    op.drop_index(
+        "ix_attorney_lead_counts_state_lead_count", table_name="attorney_lead_counts"
+    )
+    op.drop_table("attorney_lead_counts")
@@ -0,0 +1,67 @@
+"""email outbox
+
+Revision ID: 4d7e1b9c3a52
+Revises: c3f19a8e6d27
+Create Date: 2026-10-18 09:28:44.671209
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "4d7e1b9c3a52"
+down_revision = "c3f19a8e6d27"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "email_outbox",
+        sa.Column("id", sa.BigInteger(), nullable=False),
+        sa.Column("subject", sa.String(length=256), nullable=False),
+        sa.Column("recipients", sa.JSON(), nullable=False),
+        sa.Column("body", sa.JSON(), nullable=False),
+        sa.Column("template", sa.String(length=128), nullable=False),
+        sa.Column("status", sa.String(length=16), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column(
+            "next_attempt_time",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("sent_time", sa.DateTime(timezone=True), nullable=True),
+        sa.Column(
+            "create_time",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column(
+            "update_time",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_email_outbox_unsent_next_attempt_time",
+        "email_outbox",
+        ["next_attempt_time"],
+        unique=False,
+        postgresql_where=sa.text("status IN ('PENDING', 'SENDING')"),
+    )
+
+
+def downgrade():
+    op.drop_index(
+        "ix_email_outbox_unsent_next_attempt_time",
+        table_name="email_outbox",
+        postgresql_where=sa.text("status IN ('PENDING', 'SENDING')"),
+    )
+    op.drop_table("email_outbox")
@@ -0,0 +1,77 @@
+"""lead query indexes
+
+Revision ID: 7a1c5e9f2b84
+Revises: 4d7e1b9c3a52
+Create Date: 2026-10-18 10:36:12.318544
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "7a1c5e9f2b84"
+down_revision = "4d7e1b9c3a52"
+branch_labels = None
+depends_on = None
+
+# name, table, columns, partial index predicate
+INDEXES = [
+    (
+        "ix_leads_state_create_time_lead_id",
+        "leads",
+        ["state", "create_time", "lead_id"],
+        None,
+    ),
+    ("ix_leads_create_time_lead_id", "leads", ["create_time", "lead_id"], None),
+    ("ix_leads_attorney_id_state", "leads", ["attorney_id", "state"], None),
+    ("ix_leads_prospect_id", "leads", ["prospect_id"], None),
+    (
+        "ix_attorneys_create_time_attorney_id",
+        "attorneys",
+        ["create_time", "attorney_id"],
+        None,
+    ),
+    (
+        "ix_prospects_create_time_prospect_id",
+        "prospects",
+        ["create_time", "prospect_id"],
+        None,
+    ),
+    ("ix_refresh_token_exp", "refresh_token", ["exp"], None),
+    ("ix_refresh_token_attorney_id", "refresh_token", ["attorney_id"], None),
+    (
+        "ix_resume_blobs_unreferenced_update_time",
+        "resume_blobs",
+        ["update_time"],
+        "ref_count = 0",
+    ),
+]
+
+
+# CONCURRENTLY keeps the tables writable while the indexes are built, it
+# cannot run inside a transaction
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                unique=False,
+                if_not_exists=True,
+                postgresql_concurrently=True,
+                postgresql_where=sa.text(where) if where else None,
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(
+                name,
+                table_name=table,
+                if_exists=True,
+                postgresql_concurrently=True,
+            )
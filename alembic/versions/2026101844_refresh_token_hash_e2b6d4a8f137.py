@@ -0,0 +1,66 @@
+"""refresh token hash
+
+Revision ID: e2b6d4a8f137
+Revises: 7a1c5e9f2b84
+Create Date: 2026-10-18 10:44:27.905136
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e2b6d4a8f137"
+down_revision = "7a1c5e9f2b84"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "refresh_token",
+        sa.Column("token_hash", sa.LargeBinary(length=32), nullable=True),
+    )
+    # Same digest as app/core/security/refresh_token.py, issued tokens keep working
+    op.execute(
+        "UPDATE refresh_token SET token_hash = sha256(convert_to(refresh_token, 'UTF8'))"
+    )
+    op.alter_column("refresh_token", "token_hash", nullable=False)
+    op.create_index(
+        op.f("ix_refresh_token_token_hash"),
+        "refresh_token",
+        ["token_hash"],
+        unique=True,
+    )
+    op.drop_index("ix_refresh_token_refresh_token", table_name="refresh_token")
+    op.drop_column("refresh_token", "refresh_token")
+    op.create_index(
+        "ix_refresh_token_used_update_time",
+        "refresh_token",
+        ["update_time"],
+        unique=False,
+        postgresql_where=sa.text("used"),
+    )
+
+
+def downgrade():
+    # Tokens cannot be recovered from their hashes, everyone logs in again
+    op.execute("DELETE FROM refresh_token")
+    op.drop_index(
+        "ix_refresh_token_used_update_time",
+        table_name="refresh_token",
+        postgresql_where=sa.text("used"),
+    )
+    op.add_column(
+        "refresh_token",
+        sa.Column("refresh_token", sa.String(length=512), nullable=False),
+    )
+    op.create_index(
+        "ix_refresh_token_refresh_token",
+        "refresh_token",
+        ["refresh_token"],
+        unique=True,
+    )
+    op.drop_index(op.f("ix_refresh_token_token_hash"), table_name="refresh_token")
+    op.drop_column("refresh_token", "token_hash")
@@ -0,0 +1,56 @@
+"""id list notify
+
+Revision ID: b8f3a61d0c29
+Revises: e2b6d4a8f137
+Create Date: 2026-10-18 10:52:13.418306
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "b8f3a61d0c29"
+down_revision = "e2b6d4a8f137"
+branch_labels = None
+depends_on = None
+
+# Must match Settings.cache.invalidation_channel and the "id_list" namespace
+# of app/core/response_cache.py. Attorneys are covered by the
+# attorneys_notify_change trigger already.
+CHANNEL = "app_cache_invalidation"
+
+
+def upgrade():
+    # Once per statement, and Postgres folds identical notifications of one
+    # transaction into one, a bulk intake notifies once per table
+    op.execute(
+        f"""
+        CREATE FUNCTION id_list_notify_change() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('{CHANNEL}', 'id_list:' || TG_TABLE_NAME);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    # The lists hold lead ids per state, updates of other columns leave them as is
+    op.execute(
+        """
+        CREATE TRIGGER leads_id_list_notify_change
+        AFTER INSERT OR DELETE OR UPDATE OF state OR TRUNCATE ON leads
+        FOR EACH STATEMENT EXECUTE FUNCTION id_list_notify_change()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER prospects_id_list_notify_change
+        AFTER INSERT OR DELETE OR TRUNCATE ON prospects
+        FOR EACH STATEMENT EXECUTE FUNCTION id_list_notify_change()
+        """
+    )
+
+
+def downgrade():
+    op.execute("DROP TRIGGER prospects_id_list_notify_change ON prospects")
+    op.execute("DROP TRIGGER leads_id_list_notify_change ON leads")
+    op.execute("DROP FUNCTION id_list_notify_change()")
@@ -0,0 +1,62 @@
+"""uuid v7 default
+
+Revision ID: 3c9e1f7a5d42
+Revises: b8f3a61d0c29
+Create Date: 2026-10-18 11:00:41.582904
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "3c9e1f7a5d42"
+down_revision = "b8f3a61d0c29"
+branch_labels = None
+depends_on = None
+
+KEYS = [
+    ("attorneys", "attorney_id"),
+    ("prospects", "prospect_id"),
+    ("leads", "lead_id"),
+]
+
+
+def upgrade():
+    # Postgres 18 has uuidv7(). A random v4 with the first 48 bits replaced
+    # by the Unix time in milliseconds and the version nibble 0100 turned
+    # into 0111, same layout as app/core/ids.py without the counter.
+    op.execute(
+        """
+        CREATE FUNCTION uuid_generate_v7() RETURNS uuid AS $$
+            SELECT encode(
+                set_bit(
+                    set_bit(
+                        overlay(
+                            uuid_send(gen_random_uuid())
+                            PLACING substring(
+                                int8send(floor(extract(epoch FROM clock_timestamp()) * 1000)::bigint)
+                                FROM 3
+                            )
+                            FROM 1 FOR 6
+                        ),
+                        52, 1
+                    ),
+                    53, 1
+                ),
+                'hex'
+            )::uuid
+        $$ LANGUAGE sql VOLATILE
+        """
+    )
+    # For rows inserted outside the app, which sends its own keys. Existing
+    # keys are kept, v4 and v7 keys live side by side.
+    for table, column in KEYS:
+        op.alter_column(table, column, server_default=sa.text("uuid_generate_v7()"))
+
+
+def downgrade():
+    for table, column in KEYS:
+        op.alter_column(table, column, server_default=None)
+    op.execute("DROP FUNCTION uuid_generate_v7()")
@@ -0,0 +1,169 @@
+"""resume blob backfill
+
+Revision ID: 6f0d3b8e2a17
+Revises: 3c9e1f7a5d42
+Create Date: 2026-10-18 11:08:17.203561
+
+"""
+
+import hashlib
+import logging
+import os
+import re
+import shutil
+from collections import Counter
+from pathlib import Path
+
+import sqlalchemy as sa
+from pydantic import BaseModel
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from sqlalchemy.dialects.postgresql import insert
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "6f0d3b8e2a17"
+down_revision = "3c9e1f7a5d42"
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+DIGEST_RE = re.compile(r"[0-9a-f]{64}")
+
+PROJECT_DIR = Path(__file__).parent.parent.parent
+
+
+# The resume settings as of this revision, read the same way app.core.config
+# reads them, so later changes to the app cannot change what this migration does
+class ResumeSettings(BaseModel):
+    storage_dir: Path = PROJECT_DIR / "app" / "resume"
+
+
+class MigrationSettings(BaseSettings):
+    resume: ResumeSettings = ResumeSettings()
+
+    model_config = SettingsConfigDict(
+        env_file=f"{PROJECT_DIR}/.env",
+        case_sensitive=False,
+        env_nested_delimiter="__",
+        extra="ignore",
+    )
+
+
+def legacy_paths(storage_dir: Path, name: str) -> list[Path]:
+    # Before the resume store, /filelead wrote the upload to app/resume/<name>
+    # by concatenating getcwd() + "\\app\\resume\\" + name, which on anything
+    # but Windows made one oddly named file next to the project directory
+    return [
+        storage_dir / name,
+        Path(os.getcwd() + "\\app\\resume\\" + name),
+    ]
+
+
+def hash_file(path: Path) -> tuple[str, int]:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as source:
+        while chunk := source.read(1024 * 1024):
+            hasher.update(chunk)
+    return hasher.hexdigest(), path.stat().st_size
+
+
+def park_blobs(storage_dir: Path, blobs: dict[str, Path]) -> None:
+    # Copies go to the resume store's pending dir (storage_dir/.pending), named
+    # by digest, the same place uploads land when a backend write fails. The
+    # maintenance job (or python -m app.core.maintenance) moves them into the
+    # configured backend, so this migration needs no backend code of its own.
+    # The legacy files stay until the rows pointing at the digests committed.
+    staging_dir = storage_dir / ".staging"
+    pending_dir = storage_dir / ".pending"
+    staging_dir.mkdir(parents=True, exist_ok=True)
+    pending_dir.mkdir(parents=True, exist_ok=True)
+    for digest, path in blobs.items():
+        # copied under another name first, pending files must be complete
+        partial = staging_dir / f"{digest}.migration"
+        shutil.copyfile(path, partial)
+        os.replace(partial, pending_dir / digest)
+
+
+def upgrade():
+    # Prospects filed before the resume store hold the legacy file name in
+    # prospects.resume. Their files are copied into the store and the rows
+    # rewritten to the digest, with resume_blobs counting the references.
+    connection = op.get_bind()
+    storage_dir = MigrationSettings().resume.storage_dir
+    prospects = sa.table(
+        "prospects", sa.column("prospect_id", sa.Uuid), sa.column("resume", sa.String)
+    )
+    resume_blobs = sa.table(
+        "resume_blobs",
+        sa.column("digest", sa.String),
+        sa.column("size", sa.BigInteger),
+        sa.column("ref_count", sa.Integer),
+    )
+
+    digests: dict[str, str] = {}
+    sizes: dict[str, int] = {}
+    blobs: dict[str, Path] = {}
+    missing: list[str] = []
+    for name in connection.scalars(sa.select(prospects.c.resume).distinct()):
+        if DIGEST_RE.fullmatch(name):
+            continue
+        path = next(
+            (path for path in legacy_paths(storage_dir, name) if path.is_file()), None
+        )
+        if path is None:
+            missing.append(name)
+            continue
+        digest, size = hash_file(path)
+        digests[name] = digest
+        sizes[digest] = size
+        blobs.setdefault(digest, path)
+
+    if missing:
+        # Without the file there is no digest, the rows keep the old name.
+        # release() and collect_garbage() only ever match digests, so they
+        # never touch these rows.
+        logger.warning(
+            "%s legacy resumes not found, left unconverted: %s",
+            len(missing),
+            ", ".join(missing[:20]),
+        )
+    if not digests:
+        return
+
+    park_blobs(storage_dir, blobs)
+
+    refs: Counter[str] = Counter()
+    for name, digest in digests.items():
+        result = connection.execute(
+            sa.update(prospects).where(prospects.c.resume == name).values(resume=digest)
+        )
+        refs[digest] += result.rowcount
+
+    stmt = insert(resume_blobs).values(
+        [
+            {"digest": digest, "size": sizes[digest], "ref_count": count}
+            for digest, count in refs.items()
+        ]
+    )
+    connection.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[resume_blobs.c.digest],
+            set_={"ref_count": resume_blobs.c.ref_count + stmt.excluded.ref_count},
+        )
+    )
+
+    # autocommit_block() commits the migration transaction first. Should that
+    # fail the legacy files are still there and the rows keep their old names.
+    # Identical files and files whose content was stored already go as well.
+    with op.get_context().autocommit_block():
+        for name in digests:
+            for path in legacy_paths(storage_dir, name):
+                if path.is_file():
+                    path.unlink()
+
+
+def downgrade():
+    # The legacy file names are not kept, converted rows stay on the digest
+    pass
@@ -0,0 +1,40 @@
+"""lead attorney page index
+
+Revision ID: d5a8c3e1f906
+Revises: 6f0d3b8e2a17
+Create Date: 2026-10-18 11:16:42.570318
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "d5a8c3e1f906"
+down_revision = "6f0d3b8e2a17"
+branch_labels = None
+depends_on = None
+
+
+# /users/leads?attorney_id=... pages in (create_time, lead_id) order, with
+# ix_leads_attorney_id_state every page sorted all of the attorney's leads.
+# CONCURRENTLY keeps leads writable while it is built, outside a transaction.
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_leads_attorney_id_create_time_lead_id",
+            "leads",
+            ["attorney_id", "create_time", "lead_id"],
+            unique=False,
+            if_not_exists=True,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_leads_attorney_id_create_time_lead_id",
+            table_name="leads",
+            if_exists=True,
+            postgresql_concurrently=True,
+        )
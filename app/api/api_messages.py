@@ -5,4 +5,14 @@ REFRESH_TOKEN_EXPIRED = "Refresh token expired"
 REFRESH_TOKEN_ALREADY_USED = "Refresh token already used"
 EMAIL_ADDRESS_ALREADY_USED = "Cannot use this email address"
 NO_VALID_ATTORNEY_FOUND = "An Attorney could not be found"
-ERROR_CREATING_LEAD = "Could not register Lead"
\ No newline at end of file
+ERROR_CREATING_LEAD = "Could not register Lead"
+RESUME_TOO_LARGE = "Resume file is too large"
+PASSWORD_HASHER_BUSY = "Too many password checks in progress, try again later"
+INVALID_CURSOR = "Invalid pagination cursor"
+INVALID_MANIFEST = "Manifest must be a CSV or JSON list with fname, lname, email and file"
+MISSING_MANIFEST = "Send either a manifest with files or a zip archive containing manifest.csv or manifest.json"
+TOO_MANY_ROWS = "Too many rows in one batch"
+MANIFEST_TOO_LARGE = "Manifest file is too large"
+INVALID_EMAIL = "Invalid email address"
+MISSING_RESUME_FILE = "Resume file not found in upload"
+DUPLICATE_EMAIL_IN_BATCH = "Email appears more than once in this batch"
@@ -1,7 +1,7 @@
 from fastapi import APIRouter
 
 from app.api import api_messages
-from app.api.endpoints import auth, users
+from app.api.endpoints import auth, exports, leads, users
 
 auth_router = APIRouter()
 auth_router.include_router(auth.router, prefix="/auth", tags=["auth"])
@@ -33,3 +33,5 @@ api_router = APIRouter(
 )
 
 api_router.include_router(users.router, prefix="/users", tags=["users"])
+api_router.include_router(leads.router, prefix="/leads", tags=["leads"])
+api_router.include_router(exports.router, prefix="/exports", tags=["exports"])
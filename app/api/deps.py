@@ -8,6 +8,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api import api_messages
 from app.core import database_session
+from app.core.attorney_cache import detached_copy, get_attorney_cache
 from app.core.security.jwt import verify_jwt_token
 from app.models import Attorney
 
@@ -19,12 +20,25 @@ async def get_session() -> AsyncGenerator[AsyncSession, None]:
         yield session
 
 
+async def get_read_session() -> AsyncGenerator[AsyncSession, None]:
+    # Replica when one is configured and caught up, the primary otherwise.
+    # Only for reads that can be a few seconds stale.
+    async with await database_session.get_read_session() as session:
+        yield session
+
+
 async def get_current_attorney(
     token: Annotated[str, Depends(oauth2_scheme)],
     session: AsyncSession = Depends(get_session),
 ) -> Attorney:
     token_payload = verify_jwt_token(token)
 
+    cache = get_attorney_cache()
+    cached = cache.get(token_payload.sub)
+    if cached is not None:
+        # load=False attaches the cached row to this session without a query
+        return await session.merge(cached, load=False)
+
     user = await session.scalar(select(Attorney).where(Attorney.attorney_id == token_payload.sub))
 
     if user is None:
@@ -32,4 +46,5 @@ async def get_current_attorney(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail=api_messages.JWT_ERROR_USER_REMOVED,
         )
+    cache.set(token_payload.sub, detached_copy(user))
     return user
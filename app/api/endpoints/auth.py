@@ -1,5 +1,4 @@
-import secrets
-import time
+from collections import Counter
 from typing import Any
 
 from fastapi import APIRouter, Depends, HTTPException, status
@@ -9,12 +8,20 @@ from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api import api_messages, deps
-from app.core.config import get_settings
+from app.core.assignment import get_attorney_directory
+from app.core.lead_stats import adjust_lead_counts, transition_deltas
+from app.core.response_cache import get_response_cache
 from app.core.security.jwt import create_jwt_token
 from app.core.security.password import (
-    DUMMY_PASSWORD,
-    get_password_hash,
-    verify_password,
+    get_password_hash_async,
+    verify_dummy_password_async,
+    verify_password_async,
+)
+from app.core.security.refresh_token import (
+    generate_refresh_token,
+    hash_refresh_token,
+    refresh_token_exp,
+    rotate_refresh_token,
 )
 from app.models import RefreshToken, Attorney, Lead
 from app.schemas.requests import LeadUpdate, RefreshTokenRequest, AttorneyCreateRequest
@@ -75,14 +82,14 @@ async def login_access_token(
 
     if user is None:
         # this is naive method to not return early
-        verify_password(form_data.password, DUMMY_PASSWORD)
+        await verify_dummy_password_async(form_data.password)
 
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=api_messages.PASSWORD_INVALID,
         )
 
-    if not verify_password(form_data.password, user.hashed_password):
+    if not await verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=api_messages.PASSWORD_INVALID,
@@ -90,10 +97,11 @@ async def login_access_token(
 
     jwt_token = create_jwt_token(user_id=user.attorney_id)
 
+    new_token = generate_refresh_token()
     refresh_token = RefreshToken(
         attorney_id=user.attorney_id,
-        refresh_token=secrets.token_urlsafe(32),
-        exp=int(time.time() + get_settings().security.refresh_token_expire_secs),
+        token_hash=hash_refresh_token(new_token),
+        exp=refresh_token_exp(),
     )
     session.add(refresh_token)
     await session.commit()
@@ -101,11 +109,13 @@ async def login_access_token(
     return AccessTokenResponse(
         access_token=jwt_token.access_token,
         expires_at=jwt_token.payload.exp,
-        refresh_token=refresh_token.refresh_token,
+        refresh_token=new_token,
         refresh_token_expires_at=refresh_token.exp,
     )
 
 # Refresh token endpoint as part of JWT refresh specs
+# The presented token is marked used and the new one issued in one statement,
+# a token can be rotated once even when the same token is sent concurrently
 
 @router.post(
     "/refresh-token",
@@ -117,46 +127,14 @@ async def refresh_token(
     data: RefreshTokenRequest,
     session: AsyncSession = Depends(deps.get_session),
 ) -> AccessTokenResponse:
-    token = await session.scalar(
-        select(RefreshToken)
-        .where(RefreshToken.refresh_token == data.refresh_token)
-        .with_for_update(skip_locked=True)
-    )
-
-    if token is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=api_messages.REFRESH_TOKEN_NOT_FOUND,
-        )
-    elif time.time() > token.exp:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=api_messages.REFRESH_TOKEN_EXPIRED,
-        )
-    elif token.used:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=api_messages.REFRESH_TOKEN_ALREADY_USED,
-        )
-
-    token.used = True
-    session.add(token)
-
-    jwt_token = create_jwt_token(user_id=token.attorney_id)
-
-    refresh_token = RefreshToken(
-        attorney_id=token.attorney_id,
-        refresh_token=secrets.token_urlsafe(32),
-        exp=int(time.time() + get_settings().security.refresh_token_expire_secs),
-    )
-    session.add(refresh_token)
-    await session.commit()
+    issued = await rotate_refresh_token(session, data.refresh_token)
+    jwt_token = create_jwt_token(user_id=issued.attorney_id)
 
     return AccessTokenResponse(
         access_token=jwt_token.access_token,
         expires_at=jwt_token.payload.exp,
-        refresh_token=refresh_token.refresh_token,
-        refresh_token_expires_at=refresh_token.exp,
+        refresh_token=issued.token,
+        refresh_token_expires_at=issued.exp,
     )
 
 # Register Attorney Endpoint creates a new record with the attorney details sent in
@@ -180,11 +158,14 @@ async def register_new_attorney(
     user = Attorney(
         name=new_user.name,
         email=new_user.email,
-        hashed_password=get_password_hash(new_user.password),
+        hashed_password=await get_password_hash_async(new_user.password),
     )
     session.add(user)
 
     try:
+        await session.flush()
+        # Empty PENDING counter so the least loaded strategy sees the new attorney
+        await adjust_lead_counts(session, Counter({(user.attorney_id, "PENDING"): 0}))
         await session.commit()
     except IntegrityError:  # pragma: no cover
         await session.rollback()
@@ -193,36 +174,45 @@ async def register_new_attorney(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=api_messages.EMAIL_ADDRESS_ALREADY_USED,
         )
+    get_attorney_directory().invalidate()
+    await get_response_cache().invalidate("attorneys")
 
     return user
 
 # Update Lead endpoint that takes the attorney login creds, can be swapped to session token check if the app session was made persistent.
 # Checks valid login, then tries to grab the lead and update it
-@router.post("/updatelead", response_model=LeadInfo, description="Update Lead")
+# Deprecated, runs bcrypt on every call, use POST /leads/transitions with an access token instead
+@router.post("/updatelead", response_model=LeadInfo, description="Update Lead", deprecated=True)
 async def read_current_user(update_form: LeadUpdate, session: AsyncSession = Depends(deps.get_session)) -> None:
     user = await session.scalar(select(Attorney).where(Attorney.email == update_form.email))
     if user is None:
         # this is naive method to not return early
-        verify_password(update_form.password, DUMMY_PASSWORD)
+        await verify_dummy_password_async(update_form.password)
 
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=api_messages.PASSWORD_INVALID,
         )
 
-    if not verify_password(update_form.password, user.hashed_password):
+    if not await verify_password_async(update_form.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=api_messages.NO_VALID_ATTORNEY_FOUND,
         )    
     
-    lead = await session.scalar(select(Lead).where(Lead.lead_id == update_form.lead_id))
+    # Locked so concurrent updates of the same lead see each other's state
+    # and the counters are moved once
+    lead = await session.scalar(
+        select(Lead).where(Lead.lead_id == update_form.lead_id).with_for_update()
+    )
     if lead is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=api_messages.ERROR_CREATING_LEAD,
         )
+    await adjust_lead_counts(session, transition_deltas(lead.attorney_id, lead.state, "REACHED_OUT"))
     lead.state = "REACHED_OUT"
     session.add(lead)
     await session.commit()
+    await get_response_cache().invalidate("leads")
     return lead
\ No newline at end of file
@@ -0,0 +1,133 @@
+import csv
+import io
+import json
+import zlib
+from collections.abc import AsyncIterator, Callable, Sequence
+from datetime import datetime
+from typing import Any, Literal
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Label, Row, Select, select
+
+from app.api import deps
+from app.core import database_session
+from app.models import Attorney, Lead, Prospect
+
+router = APIRouter()
+
+# Rows fetched per round trip from the server side cursor
+EXPORT_BATCH_SIZE = 5000
+
+# Every column labeled, the labels are the NDJSON keys and the CSV header
+EXPORT_COLUMNS: tuple[Label[Any], ...] = (
+    Lead.lead_id.label("lead_id"),
+    Lead.state.label("state"),
+    Lead.create_time.label("create_time"),
+    Lead.update_time.label("update_time"),
+    Prospect.prospect_id.label("prospect_id"),
+    Prospect.name.label("prospect_name"),
+    Prospect.email.label("prospect_email"),
+    Attorney.attorney_id.label("attorney_id"),
+    Attorney.name.label("attorney_name"),
+    Attorney.email.label("attorney_email"),
+)
+EXPORT_FIELDS = [column.name for column in EXPORT_COLUMNS]
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _plain(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _encode_ndjson(rows: Sequence[Row[Any]]) -> bytes:
+    return "".join(
+        json.dumps(dict(zip(EXPORT_FIELDS, map(_plain, row)))) + "\n" for row in rows
+    ).encode()
+
+
+def _csv_encoder() -> Callable[[Sequence[Row[Any]]], bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+
+    def encode(rows: Sequence[Row[Any]]) -> bytes:
+        writer.writerows([map(_plain, row) for row in rows])
+        chunk = buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+        return chunk
+
+    return encode
+
+
+def export_query(state: str | None) -> Select[Any]:
+    query = (
+        select(*EXPORT_COLUMNS)
+        .join(Lead.prospect)
+        .join(Lead.attorney)
+        .order_by(Lead.create_time, Lead.lead_id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    if state is not None:
+        query = query.where(Lead.state == state)
+    return query
+
+
+async def _export_chunks(
+    state: str | None, encode: Callable[[Sequence[Row[Any]]], bytes], compress: bool
+) -> AsyncIterator[bytes]:
+    query = export_query(state)
+
+    # gzip container (wbits 16+), flushed once the last batch is compressed
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS) if compress else None
+
+    # A session of its own, dependency sessions are closed before a streaming
+    # body is sent. StreamingResponse awaits each send, so the next batch is
+    # only pulled from the cursor once the client has taken the previous one.
+    async with database_session.get_async_session() as session:
+        result = await session.stream(query)
+        async for rows in result.partitions():
+            chunk = encode(rows)
+            if compressor is not None:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                yield chunk
+
+    if compressor is not None:
+        yield compressor.flush()
+
+
+# Export Leads endpoint streams every lead joined to its prospect and attorney
+# as NDJSON (one object per line) or CSV with a header row
+# Rows are read through a server side cursor, memory stays flat for any table size
+@router.get(
+    "/leads",
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "content": {
+                media_type: {}
+                for media_type in [*MEDIA_TYPES.values(), "application/gzip"]
+            }
+        }
+    },
+    description="Stream all leads with their prospect and attorney",
+)
+async def export_leads(
+    _: Attorney = Depends(deps.get_current_attorney),
+    format: Literal["ndjson", "csv"] = "ndjson",
+    gzip: bool = False,
+    state: str | None = None,
+) -> StreamingResponse:
+    encode = _encode_ndjson if format == "ndjson" else _csv_encoder()
+    # gzip=true downloads a leads.<format>.gz file, no Content-Encoding, or
+    # clients would decompress it and save plain text under the .gz name
+    filename = f"leads.{format}.gz" if gzip else f"leads.{format}"
+
+    return StreamingResponse(
+        _export_chunks(state, encode, gzip),
+        media_type="application/gzip" if gzip else MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -0,0 +1,61 @@
+import uuid
+
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api import deps
+from app.core.lead_stats import read_lead_stats
+from app.core.lead_transitions import transition_leads
+from app.core.response_cache import get_response_cache
+from app.models import Attorney
+from app.schemas.requests import LeadTransitionRequest
+from app.schemas.responses import LeadStatsResponse, LeadTransitionResponse
+
+router = APIRouter()
+
+# Lead Transitions endpoint moves many leads of the logged in attorney to a new state at once
+# Authenticated with the access token instead of email and password on every call
+# Allowed moves are PENDING -> REACHED_OUT and REACHED_OUT -> PENDING (see app/core/lead_transitions.py)
+# Returns one outcome per lead id: updated, unchanged, not_found or invalid_transition
+
+
+@router.post(
+    "/transitions",
+    response_model=LeadTransitionResponse,
+    description="Move many leads to a new state",
+)
+async def transition_lead_states(
+    request: LeadTransitionRequest,
+    current_attorney: Attorney = Depends(deps.get_current_attorney),
+    session: AsyncSession = Depends(deps.get_session),
+) -> LeadTransitionResponse:
+    results = await transition_leads(
+        session,
+        current_attorney.attorney_id,
+        [str(lead_id) for lead_id in request.lead_ids],
+        request.state,
+    )
+    updated = sum(result.outcome == "updated" for result in results)
+    if updated:
+        await get_response_cache().invalidate("leads")
+    return LeadTransitionResponse(updated=updated, results=results)
+
+
+# Lead Stats endpoint returns the number of leads per state for every attorney
+# and in total, optionally for one attorney only
+# Read from the attorney_lead_counts counters (app/core/lead_stats.py), the
+# cost grows with the number of attorneys, not leads
+
+
+@router.get(
+    "/stats",
+    response_model=LeadStatsResponse,
+    description="Lead counts per attorney and state",
+)
+async def lead_stats(
+    attorney_id: uuid.UUID | None = None,
+    session: AsyncSession = Depends(deps.get_session),
+) -> LeadStatsResponse:
+    return await read_lead_stats(
+        session, str(attorney_id) if attorney_id is not None else None
+    )
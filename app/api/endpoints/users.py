@@ -1,22 +1,30 @@
-from sqlite3 import IntegrityError
-from typing import Annotated
-from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile, status
-from sqlalchemy import select, func
+import uuid
+from datetime import datetime
+from typing import Annotated, Any
+from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, Request, Response, UploadFile, status
+from sqlalchemy import Select, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from os import getcwd
 from app.api import api_messages, deps
+from app.api.pagination import PageParams, keyset_page
 from app.models import Lead, Prospect, Attorney
-from app.schemas.responses import IDList, ProspectResponse
-from app.core.send_mail import send_email_async
-from app.core.config import Settings
+from app.schemas.requests import ProspectForm
+from app.schemas.responses import BulkLeadResponse, IDList, IDPage, ProspectResponse
+from app.core.assignment import get_attorney_directory
+from app.core import database_session
+from app.core.bulk_intake import IntakeRow, file_leads, stage_archive, stage_uploaded_files
+from app.core.id_lists import id_list_json
+from app.core.lead_intake import file_lead
+from app.core.response_cache import conditional_response, get_response_cache
+from app.core.storage import get_resume_store
 
 router = APIRouter()
 
 # File Lead API Endpoint. Takes multipart form for File, lname, fname, email
-# Creates a prospect record and a lead record
-# Saves the file uploaded in the app/resumes folder
-# Gets random attorney in attorney table to assign to lead
-# Then runs the Email func with data
+# Creates or updates the prospect record and creates a lead record, in one statement and transaction
+# Streams the file uploaded into the content addressed resume store, identical files are stored once
+# Picks an attorney with the configured assignment strategy (random by default)
+# The email to the attorney and prospect is written to the outbox with the lead and sent in the background
 
 @router.post(
     "/filelead",
@@ -26,118 +34,181 @@ router = APIRouter()
 )
 async def register_new_prospect(
     file: Annotated[UploadFile, File()],
-    fname: Annotated[str, Form()],
-    lname: Annotated[str, Form()],
-    email: Annotated[str, Form()],
+    form: Annotated[ProspectForm, Depends()],
+    background_tasks: BackgroundTasks,
     session: AsyncSession = Depends(deps.get_session),
 ) -> ProspectResponse:
-    name=f"{fname} {lname}"
-    user = await session.scalar(select(Prospect).where(Prospect.email == email))
-    if user is None:
-        file_path = getcwd()+"\\app\\resume\\"+fname+"_"+lname+"_"+file.filename
-        with open(file_path, "wb") as f:
-            f.write(file.file.read())
-            f.close
-        user = Prospect(
-            email=email,
-            name=name,
-            resume=fname+"_"+lname+"_"+file.filename
-        )
-        session.add(user)
-        try:
-            await session.commit()
-        except IntegrityError:  # pragma: no cover
-            await session.rollback()
+    name=f"{form.fname} {form.lname}"
+    store = get_resume_store()
+    staged = await store.stage(file)
+    try:
+        ret = await file_lead(session, staged, name, form.email)
+    except BaseException:
+        await store.discard(staged)
+        raise
+    # The blob is moved into the store after the response is sent
+    background_tasks.add_task(store.persist, staged)
+    await get_response_cache().invalidate("leads", "prospects")
+
+    return ret
 
+
+# Bulk File Leads API Endpoint. Takes either a manifest (CSV or JSON list with fname, lname, email, file)
+# plus the resume files it names, or a zip archive holding manifest.csv/manifest.json and the resumes
+# Valid rows are written set based in one transaction, invalid rows are skipped and reported
+# Returns one result per manifest row, emails go through the outbox like /filelead
+# Starlette's form parser takes at most 1000 files per request (the manifest and 999 resumes),
+# larger batches up to resume.max_bulk_rows have to come as a zip archive
+
+@router.post(
+    "/fileleads",
+    response_model=BulkLeadResponse,
+    description="File many leads at once",
+)
+async def register_new_prospects(
+    background_tasks: BackgroundTasks,
+    manifest: Annotated[UploadFile | None, File()] = None,
+    files: Annotated[list[UploadFile], File()] = [],
+    archive: Annotated[UploadFile | None, File()] = None,
+    session: AsyncSession = Depends(deps.get_session),
+) -> BulkLeadResponse:
+    store = get_resume_store()
+    rows: list[IntakeRow] = []
+    try:
+        # the staging helpers discard what they staged themselves when they fail
+        if archive is not None:
+            rows = await stage_archive(archive, store)
+        elif manifest is not None:
+            rows = await stage_uploaded_files(manifest, files, store)
+        else:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail=api_messages.EMAIL_ADDRESS_ALREADY_USED,
-            )
-    else:
-        with open(getcwd()+"\\app\\resume\\"+user.resume, "wb") as f:
-            f.write(file.file.read())
-            f.close
-    
-    prospect, attorney = await session.scalar(select(Prospect).where(Prospect.email == email)), await session.scalar(select(Attorney).order_by(func.random()).limit(1))
-    if attorney is None:
-        raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=api_messages.NO_VALID_ATTORNEY_FOUND,
+                detail=api_messages.MISSING_MANIFEST,
             )
-    lead = Lead(
-        prospect_id = prospect.prospect_id,
-        attorney_id = attorney.attorney_id,
-        state = "PENDING"
-    )
-    
-    session.add(lead)
-    try:
-        await session.commit()
-    except IntegrityError:  # pragma: no cover
-        await session.rollback()
-
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=api_messages.ERROR_CREATING_LEAD,
-        )
-    ret = ProspectResponse(
-        prospect_id = lead.prospect_id,
-        attorney_id = lead.attorney_id,
-        lead_id = lead.lead_id,
-        email = user.email
-    )
 
-    await send_email_async("New Lead Pair", attorney.email, prospect.email, {'title': f"{user.name} has a new lead attached to {attorney.name}, id:{lead.lead_id}", 'data': f"status for lead {lead.lead_id} is {lead.state}."})
+        try:
+            created = await file_leads(session, rows, store)
+        except IntegrityError:
+            # an attorney removed by another worker, retry with a fresh directory
+            await session.rollback()
+            get_attorney_directory().invalidate()
+            created = await file_leads(session, rows, store)
+    except BaseException:
+        for row in rows:
+            if row.staged is not None:
+                await store.discard(row.staged)
+        raise
 
-    return ret
+    for row in rows:
+        if row.staged is not None:
+            task = store.persist if row.error is None else store.discard
+            background_tasks.add_task(task, row.staged)
+
+    if created:
+        await get_response_cache().invalidate("leads", "prospects")
+
+    results = [row.result() for row in rows]
+    return BulkLeadResponse(
+        created=len(created),
+        failed=len(results) - len(created),
+        results=results,
+    )
 
 # The following endpoints are getter functions that will return the list of the ids for the specified type
 # /getpendingleads returns list of lead ids where lead.state == "PENDING"
 # /getreachedleads returns list of lead ids where lead.state == "REACHED_OUT"
 # /getattorneys returns list of attorney ids
 # /getprospects returns list of prospect ids
+# Only the id column is selected and turned into the JSON body as bytes, no rows or models are built (app/core/id_lists.py)
+# Served from the read replica when one is configured (database_session.get_read_session)
+# The serialized lists are cached until a write changes them (app/core/response_cache.py) and carry an ETag,
+# a GET with If-None-Match gets a 304 without a query. POST is kept for existing clients
 # can be expanded to take auth access and return more info 
 
+ID_LIST_RESPONSES: dict[int | str, dict[str, Any]] = {
+    304: {"description": "Not modified, the ETag sent in If-None-Match is current"},
+}
+
+async def cached_id_list(request: Request, table: str, variant: str, q: Select[Any]) -> Response:
+    cache = get_response_cache()
+
+    # The session is only opened on a miss, a cache hit never touches the database
+    async def load() -> bytes:
+        # right after a write the replica may not have it yet
+        if cache.read_primary(table):
+            session = database_session.get_async_session()
+        else:
+            session = await database_session.get_read_session()
+        async with session:
+            return await id_list_json(session, q)
+
+    return conditional_response(request, await cache.get(table, variant, load))
+
+@router.get("/getpendingleads", response_model=IDList, responses=ID_LIST_RESPONSES, description="Get pending leads")
 @router.post("/getpendingleads", response_model=IDList, description="Get pending leads")
-async def read_current_user(session: AsyncSession = Depends(deps.get_session)) -> None:
-    q = select(Lead).where(Lead.state == "PENDING")
-    leads_list = await session.execute(q)
-    ret = IDList(
-        ids=[]
-    )
-    for lead in leads_list.scalars().all():
-        ret.ids.append(lead.lead_id)
-    return ret
+async def read_current_user(request: Request) -> Response:
+    q = select(Lead.lead_id).where(Lead.state == "PENDING")
+    return await cached_id_list(request, "leads", "PENDING", q)
 
+@router.get("/getreachedleads", response_model=IDList, responses=ID_LIST_RESPONSES, description="Get reached out leads")
 @router.post("/getreachedleads", response_model=IDList, description="Get reached out leads")
-async def read_current_user(session: AsyncSession = Depends(deps.get_session)) -> None:
-    q = select(Lead).where(Lead.state == "REACHED_OUT")
-    leads_list = await session.execute(q)
-    ret = IDList(
-        ids=[]
-    )
-    for lead in leads_list.scalars().all():
-        ret.ids.append(lead.lead_id)
-    return ret
+async def read_current_user(request: Request) -> Response:
+    q = select(Lead.lead_id).where(Lead.state == "REACHED_OUT")
+    return await cached_id_list(request, "leads", "REACHED_OUT", q)
 
+@router.get("/getattorneys", response_model=IDList, responses=ID_LIST_RESPONSES, description="Get attorneys")
 @router.post("/getattorneys", response_model=IDList, description="Get attorneys")
-async def read_current_user(session: AsyncSession = Depends(deps.get_session)) -> None:
-    q = select(Attorney)
-    attorneys_list = await session.execute(q)
-    ret = IDList(
-        ids=[]
-    )
-    for attorney in attorneys_list.scalars().all():
-        ret.ids.append(attorney.attorney_id)
-    return ret
+async def read_current_user(request: Request) -> Response:
+    q = select(Attorney.attorney_id)
+    return await cached_id_list(request, "attorneys", "", q)
 
+@router.get("/getprospects", response_model=IDList, responses=ID_LIST_RESPONSES, description="Get prospects")
 @router.post("/getprospects", response_model=IDList, description="Get prospects")
-async def read_current_user(session: AsyncSession = Depends(deps.get_session)) -> None:
-    q = select(Prospect)
-    prospects_list = await session.execute(q)
-    ret = IDList(
-        ids=[]
-    )
-    for prospect in prospects_list.scalars().all():
-        ret.ids.append(prospect.prospect_id)
-    return ret
\ No newline at end of file
+async def read_current_user(request: Request) -> Response:
+    q = select(Prospect.prospect_id)
+    return await cached_id_list(request, "prospects", "", q)
+
+# Paginated versions of the getters above, ordered by creation time
+# Pass limit and the next_cursor of the previous page as cursor to walk through all ids
+# /leads can filter on state, attorney_id and created_since
+# /attorneys and /prospects can filter on created_since
+# Also served from the read replica
+
+@router.get("/leads", response_model=IDPage, description="Get a page of lead ids")
+async def list_leads(
+    page: Annotated[PageParams, Depends()],
+    state: str | None = None,
+    attorney_id: uuid.UUID | None = None,
+    created_since: datetime | None = None,
+    session: AsyncSession = Depends(deps.get_read_session),
+) -> IDPage:
+    q = select(Lead.lead_id)
+    if state is not None:
+        q = q.where(Lead.state == state)
+    if attorney_id is not None:
+        q = q.where(Lead.attorney_id == str(attorney_id))
+    if created_since is not None:
+        q = q.where(Lead.create_time >= created_since)
+    return await keyset_page(session, q, Lead.lead_id, Lead.create_time, page)
+
+@router.get("/attorneys", response_model=IDPage, description="Get a page of attorney ids")
+async def list_attorneys(
+    page: Annotated[PageParams, Depends()],
+    created_since: datetime | None = None,
+    session: AsyncSession = Depends(deps.get_read_session),
+) -> IDPage:
+    q = select(Attorney.attorney_id)
+    if created_since is not None:
+        q = q.where(Attorney.create_time >= created_since)
+    return await keyset_page(session, q, Attorney.attorney_id, Attorney.create_time, page)
+
+@router.get("/prospects", response_model=IDPage, description="Get a page of prospect ids")
+async def list_prospects(
+    page: Annotated[PageParams, Depends()],
+    created_since: datetime | None = None,
+    session: AsyncSession = Depends(deps.get_read_session),
+) -> IDPage:
+    q = select(Prospect.prospect_id)
+    if created_since is not None:
+        q = q.where(Prospect.create_time >= created_since)
+    return await keyset_page(session, q, Prospect.prospect_id, Prospect.create_time, page)
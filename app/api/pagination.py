@@ -0,0 +1,89 @@
+# Keyset (seek) pagination over (create_time, id).
+#
+# Pages are fetched with WHERE (create_time, id) > (:last_time, :last_id)
+# ORDER BY create_time, id LIMIT n, so every page costs the same no matter how
+# deep into the table it is, unlike OFFSET. The cursor handed to clients is an
+# opaque urlsafe base64 of the last row's sort key.
+
+import base64
+import binascii
+import json
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Annotated, Any
+
+from fastapi import HTTPException, Query, status
+from sqlalchemy import Select, literal, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import InstrumentedAttribute
+
+from app.api import api_messages
+from app.schemas.responses import IDPage
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+# The limit and cursor query parameters, endpoints take it with Depends()
+@dataclass(frozen=True)
+class PageParams:
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE
+    cursor: str | None = None
+
+
+def encode_cursor(create_time: datetime, id: str) -> str:
+    raw = json.dumps([create_time.isoformat(), str(id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        create_time, id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(create_time), str(uuid.UUID(id))
+    except (binascii.Error, ValueError, TypeError, AttributeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=api_messages.INVALID_CURSOR,
+        )
+
+
+def keyset_query(
+    query: Select[Any],
+    id_column: InstrumentedAttribute[str],
+    time_column: InstrumentedAttribute[datetime],
+    page: PageParams,
+) -> Select[Any]:
+    if page.cursor is not None:
+        last_time, last_id = decode_cursor(page.cursor)
+        query = query.where(
+            tuple_(time_column, id_column)
+            > tuple_(
+                literal(last_time, time_column.type), literal(last_id, id_column.type)
+            )
+        )
+
+    # One extra row tells whether another page exists
+    return (
+        query.with_only_columns(id_column, time_column)
+        .order_by(time_column, id_column)
+        .limit(page.limit + 1)
+    )
+
+
+async def keyset_page(
+    session: AsyncSession,
+    query: Select[Any],
+    id_column: InstrumentedAttribute[str],
+    time_column: InstrumentedAttribute[datetime],
+    page: PageParams,
+) -> IDPage:
+    rows = (
+        await session.execute(keyset_query(query, id_column, time_column, page))
+    ).all()
+
+    next_cursor = None
+    if len(rows) > page.limit:
+        rows = rows[: page.limit]
+        next_cursor = encode_cursor(rows[-1][1], rows[-1][0])
+    return IDPage(ids=[row[0] for row in rows], next_cursor=next_cursor)
@@ -0,0 +1,153 @@
+# Attorney assignment for new leads.
+#
+# Strategies (ASSIGNMENT__STRATEGY):
+# - random        uniform pick from an in-memory array of attorney ids, O(1)
+# - round_robin   walks the same array using a Postgres sequence shared by all
+#                 workers, so turns are fair across processes
+# - least_loaded  attorney with the fewest PENDING leads, read from the
+#                 attorney_lead_counts index instead of counting leads
+#
+# The id array (AttorneyDirectory) is loaded once and reloaded when any
+# worker adds, changes or removes an attorney (NOTIFY from the attorneys
+# trigger, see app/core/invalidation.py) or after refresh_secs at the latest.
+
+import abc
+import heapq
+import random
+import time
+from functools import lru_cache
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import invalidation
+from app.core.attorney_cache import detached_copy, get_attorney_cache
+from app.core.config import get_settings
+from app.models import ATTORNEY_ASSIGNMENT_SEQ, Attorney, AttorneyLeadCount
+
+PENDING = "PENDING"
+
+
+class AttorneyDirectory:
+    def __init__(self, refresh_secs: float) -> None:
+        self.refresh_secs = refresh_secs
+        self._ids: list[str] = []
+        self._loaded_at: float | None = None
+
+    def invalidate(self, *_: str) -> None:
+        self._loaded_at = None
+
+    async def get_ids(self, session: AsyncSession) -> list[str]:
+        if (
+            self._loaded_at is None
+            or time.monotonic() - self._loaded_at > self.refresh_secs
+        ):
+            # Sorted so every worker sees the same order for round robin
+            self._ids = list(
+                await session.scalars(
+                    select(Attorney.attorney_id).order_by(Attorney.attorney_id)
+                )
+            )
+            self._loaded_at = time.monotonic()
+        return self._ids
+
+
+class AssignmentStrategy(abc.ABC):
+    # Returns `count` attorney ids, possibly repeating, or [] without attorneys
+    @abc.abstractmethod
+    async def pick_many(self, session: AsyncSession, count: int) -> list[str]: ...
+
+    async def pick(self, session: AsyncSession) -> str | None:
+        picked = await self.pick_many(session, 1)
+        return picked[0] if picked else None
+
+
+class RandomStrategy(AssignmentStrategy):
+    def __init__(self, directory: AttorneyDirectory) -> None:
+        self.directory = directory
+
+    async def pick_many(self, session: AsyncSession, count: int) -> list[str]:
+        ids = await self.directory.get_ids(session)
+        return random.choices(ids, k=count) if ids else []
+
+
+class RoundRobinStrategy(AssignmentStrategy):
+    def __init__(self, directory: AttorneyDirectory) -> None:
+        self.directory = directory
+
+    async def pick_many(self, session: AsyncSession, count: int) -> list[str]:
+        ids = await self.directory.get_ids(session)
+        if not ids:
+            return []
+        turns = await session.scalars(
+            select(ATTORNEY_ASSIGNMENT_SEQ.next_value()).select_from(
+                func.generate_series(1, count)
+            )
+        )
+        return [ids[turn % len(ids)] for turn in turns]
+
+
+class LeastLoadedStrategy(AssignmentStrategy):
+    async def pick_many(self, session: AsyncSession, count: int) -> list[str]:
+        # Only the `count` least loaded attorneys can receive one of `count`
+        # leads, they are filled up greedily like a water level
+        rows = (
+            await session.execute(
+                select(AttorneyLeadCount.lead_count, AttorneyLeadCount.attorney_id)
+                .where(AttorneyLeadCount.state == PENDING)
+                .order_by(AttorneyLeadCount.lead_count, AttorneyLeadCount.attorney_id)
+                .limit(count)
+            )
+        ).all()
+        if not rows:
+            return []
+
+        heap = [(lead_count, attorney_id) for lead_count, attorney_id in rows]
+        heapq.heapify(heap)
+        picked = []
+        for _ in range(count):
+            lead_count, attorney_id = heap[0]
+            picked.append(attorney_id)
+            heapq.heapreplace(heap, (lead_count + 1, attorney_id))
+        return picked
+
+
+@lru_cache(maxsize=1)
+def get_attorney_directory() -> AttorneyDirectory:
+    directory = AttorneyDirectory(get_settings().assignment.directory_refresh_secs)
+    invalidation.register_handler(
+        "attorney", directory.invalidate, directory.invalidate
+    )
+    return directory
+
+
+@lru_cache(maxsize=1)
+def get_assignment_strategy() -> AssignmentStrategy:
+    strategy = get_settings().assignment.strategy
+    if strategy == "round_robin":
+        return RoundRobinStrategy(get_attorney_directory())
+    if strategy == "least_loaded":
+        return LeastLoadedStrategy()
+    return RandomStrategy(get_attorney_directory())
+
+
+async def assign_attorney(session: AsyncSession) -> Attorney | None:
+    # The returned attorney can be a detached copy from the attorney cache,
+    # it is only meant for reading its columns.
+    # The directory can briefly list an attorney removed by another worker,
+    # in that case it is reloaded and the pick retried once
+    strategy = get_assignment_strategy()
+    cache = get_attorney_cache()
+    for _ in range(2):
+        attorney_id = await strategy.pick(session)
+        if attorney_id is None:
+            return None
+        attorney = cache.get(attorney_id)
+        if attorney is not None:
+            return attorney
+        attorney = await session.get(Attorney, attorney_id)
+        if attorney is not None:
+            cache.set(attorney_id, detached_copy(attorney))
+            return attorney
+        get_attorney_directory().invalidate()
+    return None
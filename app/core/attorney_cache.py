@@ -0,0 +1,54 @@
+# Cache of authenticated attorneys, used by get_current_attorney.
+#
+# Entries are detached Attorney copies keyed by attorney_id. Callers attach
+# them to their session with session.merge(..., load=False), which costs no
+# query. Changes are picked up three ways:
+# - ORM updates/deletes in this worker evict the entry right away (mapper events)
+# - the attorneys_notify_change trigger NOTIFYs every worker on any update/delete
+# - entries expire after CACHE__ATTORNEY_TTL_SECS as a last resort
+
+from functools import lru_cache
+from typing import Any
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Mapper, make_transient_to_detached
+
+from app.core import invalidation
+from app.core.cache import TTLCache
+from app.core.config import get_settings
+from app.models import Attorney
+
+NAMESPACE = "attorney"
+
+
+@lru_cache(maxsize=1)
+def get_attorney_cache() -> TTLCache[str, Attorney]:
+    settings = get_settings().cache
+    cache: TTLCache[str, Attorney] = TTLCache(
+        name=NAMESPACE,
+        max_entries=settings.attorney_max_entries,
+        ttl_secs=settings.attorney_ttl_secs,
+    )
+    invalidation.register_handler(NAMESPACE, cache.pop, cache.clear)
+    return cache
+
+
+def detached_copy(attorney: Attorney) -> Attorney:
+    # A column-only copy, so the cached object never shares state
+    # (or lazy loaders) with the session it was loaded in
+    copy = Attorney(
+        **{
+            attr.key: getattr(attorney, attr.key)
+            for attr in inspect(Attorney).column_attrs
+        }
+    )
+    make_transient_to_detached(copy)
+    return copy
+
+
+@event.listens_for(Attorney, "after_update")
+@event.listens_for(Attorney, "after_delete")
+def _evict_changed_attorney(
+    mapper: Mapper[Any], connection: Any, target: Attorney
+) -> None:
+    invalidation.dispatch(NAMESPACE, str(target.attorney_id))
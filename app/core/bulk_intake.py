@@ -0,0 +1,369 @@
+# Bulk lead intake, used by /users/fileleads.
+#
+# A batch is a manifest (CSV with a header row or a JSON list of objects, both
+# with fname, lname, email and file) plus the resume files it names, either
+# uploaded next to it or packed together in a zip archive.
+#
+# Every row is validated and its resume staged first, rows that fail (bad
+# email, missing or too large resume) are reported and skipped. The valid rows are then written set based in a single
+# transaction: one INSERT ... ON CONFLICT (email) DO UPDATE per chunk of
+# prospects, one pick_many() for attorneys, one multi-row INSERT (COPY for big
+# batches) for the leads, one upsert each for blob refs and lead counters and
+# one insert for the outbox emails.
+
+import csv
+import io
+import json
+import uuid
+import zipfile
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import PurePosixPath
+from typing import Any
+
+from fastapi import HTTPException, UploadFile, status
+from pydantic import EmailStr, TypeAdapter, ValidationError
+from sqlalchemy import Select, func, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.api import api_messages
+from app.core.assignment import get_assignment_strategy
+from app.core.config import get_settings
+from app.core.email_outbox import enqueue_emails, new_lead_email
+from app.core.ids import new_id
+from app.core.lead_stats import LeadCountDeltas, adjust_lead_counts, transition_deltas
+from app.core.storage import ResumeStore
+from app.core.uploads import ResumeTooLarge, StagedUpload
+from app.models import Attorney, Lead, Prospect
+from app.schemas.responses import BulkLeadResult
+
+MANIFEST_FIELDS = ("fname", "lname", "email", "file")
+MANIFEST_NAMES = ("manifest.csv", "manifest.json")
+
+# asyncpg allows 32767 bind parameters per statement, prospects use 4 per row
+PROSPECT_CHUNK_SIZE = 5_000
+# From this many leads on they are written with COPY instead of INSERT
+COPY_THRESHOLD = 1_000
+
+_email_adapter: TypeAdapter[str] = TypeAdapter(EmailStr)
+
+
+@dataclass
+class IntakeRow:
+    row: int
+    fname: str
+    lname: str
+    email: str
+    file: str
+    staged: StagedUpload | None = None
+    error: str | None = None
+    prospect_id: str | None = None
+    attorney_id: str | None = None
+    lead_id: str | None = None
+
+    def result(self) -> BulkLeadResult:
+        return BulkLeadResult(
+            row=self.row,
+            email=self.email,
+            created=self.error is None,
+            prospect_id=self.prospect_id,
+            attorney_id=self.attorney_id,
+            lead_id=self.lead_id,
+            detail=self.error,
+        )
+
+
+def _invalid_manifest() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=api_messages.INVALID_MANIFEST,
+    )
+
+
+def _manifest_row(row: int, record: Any) -> IntakeRow:
+    values = [record[field] for field in MANIFEST_FIELDS]
+    # JSON null or numbers, or a CSV row short of columns (None)
+    if not all(isinstance(value, str) for value in values):
+        raise _invalid_manifest()
+    fname, lname, email, file = (value.strip() for value in values)
+    return IntakeRow(row, fname, lname, email, file)
+
+
+def _check_manifest_size(size: int | None) -> None:
+    if size is not None and size > get_settings().resume.max_manifest_bytes:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=api_messages.MANIFEST_TOO_LARGE,
+        )
+
+
+def parse_manifest(data: bytes, filename: str) -> list[IntakeRow]:
+    try:
+        text = data.decode("utf-8-sig")
+        records: list[Any]
+        if filename.lower().endswith(".json"):
+            records = json.loads(text)
+        else:
+            records = list(csv.DictReader(io.StringIO(text)))
+        if not isinstance(records, list):
+            raise _invalid_manifest()
+
+        rows = [
+            _manifest_row(row, record) for row, record in enumerate(records, start=1)
+        ]
+    except (UnicodeDecodeError, ValueError, KeyError, TypeError, csv.Error):
+        raise _invalid_manifest()
+
+    if len(rows) > get_settings().resume.max_bulk_rows:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=api_messages.TOO_MANY_ROWS,
+        )
+    return rows
+
+
+def _validate_rows(rows: list[IntakeRow]) -> None:
+    seen: Counter[str] = Counter(row.email.lower() for row in rows)
+    for row in rows:
+        try:
+            _email_adapter.validate_python(row.email)
+        except ValidationError:
+            row.error = api_messages.INVALID_EMAIL
+            continue
+        if seen[row.email.lower()] > 1:
+            # ON CONFLICT cannot touch the same prospect twice in one statement
+            row.error = api_messages.DUPLICATE_EMAIL_IN_BATCH
+
+
+async def _discard_staged(rows: list[IntakeRow], store: ResumeStore) -> None:
+    for row in rows:
+        if row.staged is not None:
+            await store.discard(row.staged)
+
+
+async def stage_uploaded_files(
+    manifest: UploadFile, files: list[UploadFile], store: ResumeStore
+) -> list[IntakeRow]:
+    _check_manifest_size(manifest.size)
+    rows = parse_manifest(await manifest.read(), manifest.filename or "")
+    _validate_rows(rows)
+
+    by_name = {PurePosixPath(file.filename or "").name: file for file in files}
+    try:
+        for row in rows:
+            if row.error is not None:
+                continue
+            file = by_name.get(PurePosixPath(row.file).name)
+            if file is None:
+                row.error = api_messages.MISSING_RESUME_FILE
+                continue
+            # Several rows may reference the same upload
+            await file.seek(0)
+            try:
+                row.staged = await store.stage(file)
+            except ResumeTooLarge:
+                row.error = api_messages.RESUME_TOO_LARGE
+    except BaseException:
+        await _discard_staged(rows, store)
+        raise
+    return rows
+
+
+async def stage_archive(archive: UploadFile, store: ResumeStore) -> list[IntakeRow]:
+    try:
+        zip_file = await run_in_threadpool(zipfile.ZipFile, archive.file)
+    except zipfile.BadZipFile:
+        raise _invalid_manifest()
+
+    with zip_file:
+        members = {
+            PurePosixPath(info.filename).name: info
+            for info in zip_file.infolist()
+            if not info.is_dir()
+        }
+        manifest_name = next((name for name in MANIFEST_NAMES if name in members), None)
+        if manifest_name is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=api_messages.MISSING_MANIFEST,
+            )
+        # file_size is the uncompressed size from the archive's directory,
+        # checked before a small zip bomb is inflated into memory. The zip
+        # module stops reading at that size even if the member holds more.
+        _check_manifest_size(members[manifest_name].file_size)
+        rows = parse_manifest(
+            await run_in_threadpool(zip_file.read, members[manifest_name]),
+            manifest_name,
+        )
+        _validate_rows(rows)
+
+        try:
+            for row in rows:
+                if row.error is not None:
+                    continue
+                member = members.get(PurePosixPath(row.file).name)
+                if member is None:
+                    row.error = api_messages.MISSING_RESUME_FILE
+                    continue
+                # Opening a member reads its local header, reading decompresses,
+                # both happen in the threadpool
+                source = await run_in_threadpool(zip_file.open, member)
+                try:
+                    row.staged = await store.stage_fileobj(source)  # type: ignore[arg-type]
+                except ResumeTooLarge:
+                    row.error = api_messages.RESUME_TOO_LARGE
+                finally:
+                    await run_in_threadpool(source.close)
+        except BaseException:
+            await _discard_staged(rows, store)
+            raise
+    return rows
+
+
+def _upsert_prospects_statement(
+    rows: list[IntakeRow],
+) -> Select[tuple[str, str, str | None]]:
+    # Compare and set like lead_intake: "old" reads the current resumes and an
+    # existing prospect is only updated while it still has that resume, which
+    # is returned next to it (NULL for new prospects). Rows changed or inserted
+    # by a concurrent request in between are neither updated nor returned,
+    # Postgres keeps them locked and they are retried.
+    old = (
+        select(Prospect.email, Prospect.resume)
+        .where(Prospect.email.in_([row.email for row in rows]))
+        .cte("old")
+    )
+    stmt = insert(Prospect).values(
+        [
+            {
+                "prospect_id": new_id(),
+                "email": row.email,
+                "name": f"{row.fname} {row.lname}",
+                "resume": row.staged.sha256,  # type: ignore[union-attr]
+            }
+            for row in rows
+        ]
+    )
+    upserted = (
+        stmt.on_conflict_do_update(
+            index_elements=[Prospect.email],
+            set_={
+                "name": stmt.excluded.name,
+                "resume": stmt.excluded.resume,
+                "update_time": func.now(),
+            },
+            where=tuple_(Prospect.email, Prospect.resume).in_(
+                select(old.c.email, old.c.resume)
+            ),
+        )
+        .returning(Prospect.email, Prospect.prospect_id)
+        .cte("upserted")
+    )
+    return select(upserted.c.email, upserted.c.prospect_id, old.c.resume).outerjoin(
+        old, old.c.email == upserted.c.email
+    )
+
+
+async def _upsert_prospects(session: AsyncSession, rows: list[IntakeRow]) -> list[str]:
+    # Returns the resumes the updated prospects had before
+    ids_by_email: dict[str, str] = {}
+    previous_resumes: list[str] = []
+    for start in range(0, len(rows), PROSPECT_CHUNK_SIZE):
+        pending = rows[start : start + PROSPECT_CHUNK_SIZE]
+        while pending:
+            result = await session.execute(_upsert_prospects_statement(pending))
+            for email, prospect_id, previous_resume in result.tuples():
+                ids_by_email[email] = prospect_id
+                if previous_resume is not None:
+                    previous_resumes.append(previous_resume)
+            pending = [row for row in pending if row.email not in ids_by_email]
+
+    for row in rows:
+        row.prospect_id = ids_by_email[row.email]
+    return previous_resumes
+
+
+async def _insert_leads(session: AsyncSession, rows: list[IntakeRow]) -> None:
+    records = [
+        {
+            "lead_id": row.lead_id,
+            "attorney_id": row.attorney_id,
+            "prospect_id": row.prospect_id,
+            "state": "PENDING",
+        }
+        for row in rows
+    ]
+    if len(records) < COPY_THRESHOLD:
+        await session.execute(insert(Lead).values(records))
+        return
+
+    # COPY skips per-row parsing and planning, create_time and update_time
+    # are left to their server defaults
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+    columns = list(records[0])
+    await raw_connection.driver_connection.copy_records_to_table(  # type: ignore[union-attr]
+        Lead.__tablename__,
+        records=[
+            [
+                uuid.UUID(record[column]) if column != "state" else record[column]
+                for column in columns
+            ]
+            for record in records
+        ],
+        columns=columns,
+    )
+
+
+async def file_leads(
+    session: AsyncSession, rows: list[IntakeRow], store: ResumeStore
+) -> list[IntakeRow]:
+    # Returns the rows that got a lead, after the transaction committed
+    valid = [row for row in rows if row.error is None]
+    if not valid:
+        return []
+
+    attorney_ids = await get_assignment_strategy().pick_many(session, len(valid))
+    if not attorney_ids:
+        for row in valid:
+            row.error = api_messages.NO_VALID_ATTORNEY_FOUND
+        return []
+
+    previous_resumes = await _upsert_prospects(session, valid)
+
+    deltas: LeadCountDeltas = Counter()
+    for row, attorney_id in zip(valid, attorney_ids):
+        row.attorney_id = attorney_id
+        row.lead_id = new_id()
+        deltas.update(transition_deltas(attorney_id, None, "PENDING"))
+    await _insert_leads(session, valid)
+
+    await store.release(session, previous_resumes)
+    await store.acquire(session, [row.staged for row in valid])  # type: ignore[misc]
+    await adjust_lead_counts(session, deltas)
+
+    attorneys = (
+        await session.execute(
+            select(Attorney.attorney_id, Attorney.name, Attorney.email).where(
+                Attorney.attorney_id.in_(set(attorney_ids))
+            )
+        )
+    ).all()
+    attorneys_by_id = {attorney.attorney_id: attorney for attorney in attorneys}
+    await enqueue_emails(
+        session,
+        [
+            new_lead_email(
+                row.lead_id,  # type: ignore[arg-type]
+                attorneys_by_id[row.attorney_id].name,
+                attorneys_by_id[row.attorney_id].email,
+                f"{row.fname} {row.lname}",
+                row.email,
+            )
+            for row in valid
+        ],
+    )
+    await session.commit()
+    return valid
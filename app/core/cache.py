@@ -0,0 +1,92 @@
+# Bounded in-process LRU cache with per entry expiry.
+#
+# Not thread safe, it is meant to be used from the event loop only. Every entry
+# expires after ttl_secs, or earlier at an explicit expires_at, and the least
+# recently used entry is evicted once max_entries is reached. Hit, miss and
+# eviction counts and the number of entries are exported per cache name as
+# Prometheus metrics (app/core/metrics.py), stats() returns this cache's own.
+
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Generic, TypeVar
+
+from app.core.metrics import CACHE_ENTRIES, CACHE_EVICTIONS, CACHE_HITS, CACHE_MISSES
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    size: int = 0
+
+    def as_dict(self) -> dict[str, int]:
+        return asdict(self)
+
+
+class TTLCache(Generic[K, V]):
+    def __init__(self, name: str, max_entries: int, ttl_secs: float) -> None:
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_secs = ttl_secs
+        self._entries: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        self._stats = CacheStats()
+        self._hits = CACHE_HITS.labels(name)
+        self._misses = CACHE_MISSES.labels(name)
+        self._evictions = CACHE_EVICTIONS.labels(name)
+        self._size = CACHE_ENTRIES.labels(name)
+
+    def get(self, key: K) -> V | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            self._miss()
+            return None
+
+        expires_at, value = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            self._size.set(len(self._entries))
+            self._miss()
+            return None
+
+        self._entries.move_to_end(key)
+        self._stats.hits += 1
+        self._hits.inc()
+        return value
+
+    def _miss(self) -> None:
+        self._stats.misses += 1
+        self._misses.inc()
+
+    def set(self, key: K, value: V, expires_at: float | None = None) -> None:
+        max_expires_at = time.time() + self.ttl_secs
+        if expires_at is None or expires_at > max_expires_at:
+            expires_at = max_expires_at
+
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats.evictions += 1
+            self._evictions.inc()
+        self._size.set(len(self._entries))
+
+    def pop(self, key: K) -> None:
+        self._entries.pop(key, None)
+        self._size.set(len(self._entries))
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._size.set(0)
+
+    def stats(self) -> CacheStats:
+        return CacheStats(
+            hits=self._stats.hits,
+            misses=self._stats.misses,
+            evictions=self._stats.evictions,
+            size=len(self._entries),
+        )
@@ -16,7 +16,7 @@
 
 from functools import lru_cache
 from pathlib import Path
-from typing import List
+from typing import List, Literal
 
 from pydantic import AnyHttpUrl, BaseModel, EmailStr, SecretStr, computed_field
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -29,8 +29,14 @@ class Security(BaseModel):
     jwt_issuer: str = "my-app"
     jwt_secret_key: SecretStr
     jwt_access_token_expire_secs: int = 24 * 3600  # 1d
+    # verified tokens are cached until exp, but no longer than jwt_cache_ttl_secs
+    jwt_cache_max_entries: int = 10_000
+    jwt_cache_ttl_secs: float = 300.0
     refresh_token_expire_secs: int = 28 * 24 * 3600  # 28d
     password_bcrypt_rounds: int = 12
+    # bcrypt runs in a process pool, extra requests fail fast with 503
+    password_hash_workers: int = 2
+    password_hash_max_pending: int = 64
     allowed_hosts: list[str] = ["localhost", "127.0.0.1"]
     backend_cors_origins: list[AnyHttpUrl] = []
 
@@ -41,6 +47,136 @@ class Database(BaseModel):
     password: SecretStr
     port: int = 5432
     db: str = "postgres"
+    # per process, see app/core/database_session.py
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout_secs: float = 30.0
+    pool_recycle_secs: int = 600
+    # Connecting through PgBouncer in transaction pooling mode: prepared
+    # statements are not cached per connection and get unique names, the
+    # server connection can change between transactions. LISTEN needs a
+    # session, turn CACHE__LISTEN_FOR_INVALIDATIONS off behind such a pooler.
+    pgbouncer: bool = False
+    # Optional streaming replica (same credentials and db) for the read only
+    # list endpoints. Reads go to the primary while it is unreachable or more
+    # than replica_max_lag_secs behind, checked every replica_check_secs.
+    replica_hostname: str | None = None
+    replica_port: int | None = None
+    replica_pool_size: int = 5
+    replica_max_overflow: int = 10
+    replica_max_lag_secs: float = 5.0
+    replica_check_secs: float = 1.0
+    replica_check_timeout_secs: float = 1.0
+    # of new attorney, prospect and lead keys, v7 is time ordered, see app/core/ids.py
+    uuid_version: Literal["v4", "v7"] = "v4"
+
+
+class Resume(BaseModel):
+    # "local" keeps blobs under storage_dir, "s3" talks to any S3 compatible API
+    backend: Literal["local", "s3"] = "local"
+    storage_dir: Path = PROJECT_DIR / "app" / "resume"
+    max_upload_bytes: int = 10 * 1024 * 1024  # 10MiB
+    upload_chunk_bytes: int = 1024 * 1024  # 1MiB
+    # whole request limit and row limit of bulk intake (/users/fileleads)
+    max_bulk_upload_bytes: int = 1024 * 1024 * 1024  # 1GiB
+    max_bulk_rows: int = 10_000
+    # read into memory whole, also when it is decompressed from a zip archive
+    max_manifest_bytes: int = 16 * 1024 * 1024  # 16MiB
+    # unreferenced blobs are kept this long before garbage collection
+    gc_grace_secs: int = 24 * 3600  # 1d
+    # backend writes after the response, retried with backoff before the
+    # staged file is parked in pending_dir for the maintenance job
+    persist_attempts: int = 3
+    persist_retry_secs: float = 1.0
+    s3_endpoint_url: str = "http://localhost:9000"
+    s3_bucket: str = "resumes"
+    s3_region: str = "us-east-1"
+    s3_access_key: str = ""
+    s3_secret_key: SecretStr = SecretStr("")
+    s3_key_prefix: str = "resumes/"
+
+    @property
+    def staging_dir(self) -> Path:
+        # Staging next to the blobs keeps the local backend's final move a rename
+        return self.storage_dir / ".staging"
+
+    @property
+    def pending_dir(self) -> Path:
+        return self.storage_dir / ".pending"
+
+
+class Cache(BaseModel):
+    attorney_ttl_secs: float = 60.0
+    attorney_max_entries: int = 10_000
+    # Postgres NOTIFY channel shared by all workers, see app/core/invalidation.py
+    invalidation_channel: str = "app_cache_invalidation"
+    listen_for_invalidations: bool = True
+    # /users/get* id list responses, see app/core/response_cache.py
+    id_list_ttl_secs: float = 30.0
+    # shared by all workers when set, redis://host:port/db (rediss:// for TLS)
+    redis_url: str | None = None
+    redis_username: str = ""
+    redis_password: SecretStr = SecretStr("")
+    redis_key_prefix: str = "app:"
+    redis_timeout_secs: float = 0.5
+
+
+class Assignment(BaseModel):
+    # how new leads pick an attorney, see app/core/assignment.py
+    strategy: Literal["random", "round_robin", "least_loaded"] = "random"
+    directory_refresh_secs: float = 60.0
+
+
+class Email(BaseModel):
+    # disabled: messages are logged instead of sent, the outbox is still used
+    enabled: bool = False
+    server: str = "localhost"
+    port: int = 587
+    username: str = ""
+    password: SecretStr = SecretStr("")
+    sender: str = "noreply@example.com"
+    start_tls: bool = True
+    use_tls: bool = False
+    timeout_secs: float = 30.0
+    # delivery tasks per process, each keeps one SMTP connection open
+    # 0 leaves delivery to other processes, see app/core/email_outbox.py
+    outbox_workers: int = 1
+    outbox_batch_size: int = 50
+    outbox_poll_secs: float = 1.0
+    # a claimed message not marked sent within the lease is claimed again
+    outbox_lease_secs: float = 300.0
+    outbox_max_attempts: int = 8
+    outbox_retry_base_secs: float = 30.0
+    outbox_retry_max_secs: float = 3600.0
+
+
+class Maintenance(BaseModel):
+    # periodic cleanup job, see app/core/maintenance.py
+    enabled: bool = True
+    interval_secs: float = 3600.0
+    # rows deleted per transaction, with a pause between batches
+    batch_size: int = 1000
+    batch_pause_secs: float = 0.1
+    # used and expired refresh tokens are kept this long, so a replayed token
+    # is still reported as used or expired instead of not found
+    refresh_token_retention_secs: int = 24 * 3600  # 1d
+
+
+class Metrics(BaseModel):
+    # /metrics and the request middleware, see app/core/metrics.py
+    enabled: bool = True
+
+
+class QueryStats(BaseModel):
+    # per request SQL statistics, see app/core/query_stats.py
+    enabled: bool = False
+    # more statements than this in one request are logged
+    query_budget: int = 20
+    # the same statement this often in one request is logged as a likely N+1
+    repeat_threshold: int = 5
+    # slowest statements listed in the warning
+    slowest_kept: int = 3
+
 
 class EmailSchema(BaseModel):
     email: List[EmailStr]
@@ -49,7 +185,16 @@ class EmailSchema(BaseModel):
 class Settings(BaseSettings):
     security: Security
     database: Database
-    
+    resume: Resume = Resume()
+    cache: Cache = Cache()
+    assignment: Assignment = Assignment()
+    email: Email = Email()
+    maintenance: Maintenance = Maintenance()
+    metrics: Metrics = Metrics()
+    query_stats: QueryStats = QueryStats()
+    # prebuilt schema, see app/core/openapi.py
+    openapi_schema_file: Path | None = None
+
     @computed_field  # type: ignore[misc]
     @property
     def sqlalchemy_database_uri(self) -> URL:
@@ -62,6 +207,15 @@ class Settings(BaseSettings):
             database=self.database.db,
         )
 
+    @property
+    def sqlalchemy_replica_uri(self) -> URL | None:
+        if self.database.replica_hostname is None:
+            return None
+        return self.sqlalchemy_database_uri.set(
+            host=self.database.replica_hostname,
+            port=self.database.replica_port or self.database.port,
+        )
+
     model_config = SettingsConfigDict(
         env_file=f"{PROJECT_DIR}/.env",
         case_sensitive=False,
@@ -4,9 +4,24 @@
 #
 # for pool size configuration:
 # https://docs.sqlalchemy.org/en/20/core/pooling.html#sqlalchemy.pool.Pool
+#
+# Every process has one pool to the primary and, when DATABASE__REPLICA_HOSTNAME
+# is set, one to the replica, sized by the DATABASE__* pool settings. Writes
+# and anything that must see its own writes use get_async_session, the read
+# only list endpoints get_read_session (see ReplicaRouter).
 
+import asyncio
+import logging
+import time
+import uuid
+from functools import lru_cache
+from typing import Any
 
+from sqlalchemy import Select, TextualSelect, bindparam, column, text
+from sqlalchemy.dialects.postgresql.base import PGDialect
+from sqlalchemy.engine.interfaces import BindTyping
 from sqlalchemy.engine.url import URL
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import (
     AsyncEngine,
     AsyncSession,
@@ -14,23 +29,238 @@ from sqlalchemy.ext.asyncio import (
     create_async_engine,
 )
 
-from app.core.config import get_settings
+from app.core.config import Database, get_settings
+from app.core.metrics import instrumented_pool
+from app.core.query_stats import instrument_engine
+
+logger = logging.getLogger(__name__)
+
 
+def _connect_args(
+    database: Database, connect_timeout_secs: float | None
+) -> dict[str, Any]:
+    connect_args: dict[str, Any] = {}
+    if connect_timeout_secs is not None:
+        connect_args["timeout"] = connect_timeout_secs
+    if database.pgbouncer:
+        # A transaction pooler hands out a different server connection per
+        # transaction, statements prepared on one are unknown (or clash by
+        # name) on the next
+        connect_args["statement_cache_size"] = 0
+        connect_args["prepared_statement_cache_size"] = 0
+        connect_args["prepared_statement_name_func"] = (
+            lambda: f"__asyncpg_{uuid.uuid4()}__"
+        )
+    return connect_args
 
-def new_async_engine(uri: URL) -> AsyncEngine:
-    return create_async_engine(
+
+def new_async_engine(
+    uri: URL,
+    pool: str = "primary",
+    pool_size: int | None = None,
+    max_overflow: int | None = None,
+    connect_timeout_secs: float | None = None,
+) -> AsyncEngine:
+    settings = get_settings()
+    database = settings.database
+    engine = create_async_engine(
         uri,
+        # reports checked out connections and checkout waits to /metrics
+        poolclass=instrumented_pool(pool),
         pool_pre_ping=True,
-        pool_size=5,
-        max_overflow=10,
-        pool_timeout=30.0,
-        pool_recycle=600,
+        pool_size=database.pool_size if pool_size is None else pool_size,
+        max_overflow=database.max_overflow if max_overflow is None else max_overflow,
+        pool_timeout=database.pool_timeout_secs,
+        pool_recycle=database.pool_recycle_secs,
+        connect_args=_connect_args(database, connect_timeout_secs),
     )
+    if settings.query_stats.enabled:
+        instrument_engine(engine)
+    return engine
+
 
+# Engines and sessionmakers are created on first use rather than at import
+# time, so importing the app (workers booting, alembic, scripts) stays cheap
+@lru_cache(maxsize=1)
+def get_async_engine() -> AsyncEngine:
+    return new_async_engine(get_settings().sqlalchemy_database_uri)
 
-_ASYNC_ENGINE = new_async_engine(get_settings().sqlalchemy_database_uri)
-_ASYNC_SESSIONMAKER = async_sessionmaker(_ASYNC_ENGINE, expire_on_commit=False)
+
+@lru_cache(maxsize=1)
+def get_async_sessionmaker() -> async_sessionmaker[AsyncSession]:
+    return async_sessionmaker(get_async_engine(), expire_on_commit=False)
 
 
 def get_async_session() -> AsyncSession:  # pragma: no cover
-    return _ASYNC_SESSIONMAKER()
+    return get_async_sessionmaker()()
+
+
+# Seconds the replica is behind: 0 when it replayed everything it received
+# (an idle primary sends nothing, the last replay can be old), and 0 for a
+# server that is not a replica at all
+REPLICA_LAG = text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 'Infinity')
+    END
+    """
+)
+
+
+class ReplicaRouter:
+    # Decides whether read sessions go to the replica. Its lag is checked at
+    # most every check_secs, by the request that finds the last check expired,
+    # the others meanwhile keep the previous answer. Reads go to the primary
+    # while the replica is lagging or down, and when a replica connection
+    # fails between two checks (see get_read_session). The check is bounded by
+    # check_timeout_secs, a replica that stops answering costs one slow
+    # request per check_secs, not all of them.
+
+    def __init__(
+        self,
+        replica: async_sessionmaker[AsyncSession],
+        max_lag_secs: float,
+        check_secs: float,
+        check_timeout_secs: float,
+    ) -> None:
+        self.replica = replica
+        self.max_lag_secs = max_lag_secs
+        self.check_secs = check_secs
+        self.check_timeout_secs = check_timeout_secs
+        self.use_replica = False
+        self._checked_at = float("-inf")
+        self._checking = False
+
+    async def lag_secs(self) -> float:
+        async with self.replica() as session:
+            return float(await session.scalar(REPLICA_LAG))
+
+    async def _check(self) -> None:
+        try:
+            lag = await asyncio.wait_for(self.lag_secs(), self.check_timeout_secs)
+        except (OSError, SQLAlchemyError, TimeoutError) as error:
+            use_replica = False
+            reason = f"unreachable ({type(error).__name__})"
+        else:
+            use_replica = lag <= self.max_lag_secs
+            reason = f"{lag:.1f}s behind"
+        self._route(use_replica, reason)
+
+    def _route(self, use_replica: bool, reason: str) -> None:
+        if use_replica != self.use_replica:
+            logger.warning(
+                "reads go to the %s, replica %s",
+                "replica" if use_replica else "primary",
+                reason,
+            )
+        self.use_replica = use_replica
+
+    async def replica_ok(self) -> bool:
+        if (
+            not self._checking
+            and time.monotonic() - self._checked_at >= self.check_secs
+        ):
+            self._checking = True
+            try:
+                await self._check()
+            finally:
+                self._checked_at = time.monotonic()
+                self._checking = False
+        return self.use_replica
+
+    def failed(self, error: Exception) -> None:
+        # Until the next check
+        self._checked_at = time.monotonic()
+        self._route(False, f"unreachable ({type(error).__name__})")
+
+
+@lru_cache(maxsize=1)
+def get_replica_engine() -> AsyncEngine | None:
+    settings = get_settings()
+    if settings.sqlalchemy_replica_uri is None:
+        return None
+    return new_async_engine(
+        settings.sqlalchemy_replica_uri,
+        pool="replica",
+        pool_size=settings.database.replica_pool_size,
+        max_overflow=settings.database.replica_max_overflow,
+        connect_timeout_secs=settings.database.replica_check_timeout_secs,
+    )
+
+
+@lru_cache(maxsize=1)
+def get_replica_router() -> ReplicaRouter | None:
+    engine = get_replica_engine()
+    if engine is None:
+        return None
+    database = get_settings().database
+    return ReplicaRouter(
+        async_sessionmaker(engine, expire_on_commit=False),
+        max_lag_secs=database.replica_max_lag_secs,
+        check_secs=database.replica_check_secs,
+        check_timeout_secs=database.replica_check_timeout_secs,
+    )
+
+
+async def get_read_session() -> AsyncSession:
+    # For reads that tolerate replica_max_lag_secs of staleness
+    router = get_replica_router()
+    if router is None or not await router.replica_ok():
+        return get_async_session()
+    session = router.replica()
+    try:
+        # Connected up front, so a replica gone since the last check costs a
+        # fallback instead of a failed request
+        await session.connection()
+    except (OSError, SQLAlchemyError) as error:
+        await session.close()
+        router.failed(error)
+        return get_async_session()
+    return session
+
+
+async def dispose_async_engine() -> None:
+    if get_async_engine.cache_info().currsize:
+        await get_async_engine().dispose()
+        get_async_engine.cache_clear()
+        get_async_sessionmaker.cache_clear()
+    if get_replica_engine.cache_info().currsize:
+        replica = get_replica_engine()
+        if replica is not None:
+            await replica.dispose()
+        get_replica_engine.cache_clear()
+        get_replica_router.cache_clear()
+
+
+class _TextDialect(PGDialect):
+    # :name placeholders without ::TYPE casts, which text() could not parse.
+    # The driver dialect adds the casts again from the bind types.
+    bind_typing = BindTyping.NONE
+
+
+_TEXT_DIALECT = _TextDialect(paramstyle="named")  # type: ignore[no-untyped-call]
+
+
+def precompile(statement: Select[Any]) -> TextualSelect:
+    # Statements containing the postgresql insert() (ON CONFLICT) are left out
+    # of SQLAlchemy's compiled cache and compiled again on every execution,
+    # which for a large WITH statement costs more than its round trip.
+    # This compiles a statement whose variable parts are all bindparam()s once
+    # into an equivalent text() that is cached, keeping bind and result types.
+    # Build it once (lru_cache) and pass the bindparam values on execute.
+    compiled = statement.compile(dialect=_TEXT_DIALECT)
+    return (
+        text(compiled.string)
+        .bindparams(
+            *(
+                bindparam(
+                    name, value=bind.value, type_=bind.type, required=bind.required
+                )
+                for bind, name in compiled.bind_names.items()
+            )
+        )
+        .columns(
+            *(column(key, c.type) for key, c in statement.selected_columns.items())
+        )
+    )
@@ -0,0 +1,196 @@
+# Transactional email outbox.
+#
+# Endpoints never talk to SMTP. They add EmailOutbox rows in the same
+# transaction as the lead the mail is about, so a mail exists exactly when its
+# lead was committed, and return without waiting for delivery.
+#
+# Every process runs email.outbox_workers delivery tasks (OutboxWorkers,
+# started in the app lifespan). A task:
+# 1. claims up to outbox_batch_size due rows with FOR UPDATE SKIP LOCKED and
+#    marks them SENDING with a lease, in a short transaction of its own, so
+#    workers in any process never claim the same row
+# 2. sends them one after another over its SMTP connection, which is kept
+#    open across batches
+# 3. marks the sent rows SENT and reschedules the failed ones with
+#    exponential backoff, giving up (FAILED) after outbox_max_attempts or on a
+#    permanent (5xx) SMTP error
+# Rows of a worker that died mid batch are claimed again once the lease ran
+# out, delivery is at least once.
+
+import asyncio
+import logging
+import random
+from contextlib import suppress
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+import aiosmtplib
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import database_session
+from app.core.config import Email
+from app.core.send_mail import SMTPConnection, render_email
+from app.models import EMAIL_OUTBOX_UNSENT, EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+# SMTP reply codes from here on are permanent failures, retrying will not help
+PERMANENT_SMTP_CODE = 500
+
+
+def new_lead_email(
+    lead_id: str,
+    attorney_name: str,
+    attorney_email: str,
+    prospect_name: str,
+    prospect_email: str,
+) -> dict[str, Any]:
+    return {
+        "subject": "New Lead Pair",
+        "recipients": [attorney_email, prospect_email],
+        "body": {
+            "title": f"{prospect_name} has a new lead attached to {attorney_name}, id:{lead_id}",
+            "data": f"status for lead {lead_id} is PENDING.",
+        },
+    }
+
+
+async def enqueue_emails(session: AsyncSession, emails: list[dict[str, Any]]) -> None:
+    # Part of the caller's transaction, nothing is sent before it commits
+    if emails:
+        await session.execute(insert(EmailOutbox), emails)
+
+
+def retry_delay_secs(config: Email, attempts: int) -> float:
+    # Exponential backoff with jitter so failed batches do not retry in lockstep
+    delay = min(
+        config.outbox_retry_base_secs * 2.0 ** (attempts - 1),
+        config.outbox_retry_max_secs,
+    )
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _is_permanent(error: Exception) -> bool:
+    if isinstance(error, aiosmtplib.SMTPRecipientsRefused):
+        return all(refused.code >= PERMANENT_SMTP_CODE for refused in error.recipients)
+    return (
+        isinstance(error, aiosmtplib.SMTPResponseException)
+        and error.code >= PERMANENT_SMTP_CODE
+    )
+
+
+async def claim_batch(session: AsyncSession, config: Email) -> list[Any]:
+    due = (
+        select(EmailOutbox.id)
+        .where(EMAIL_OUTBOX_UNSENT, EmailOutbox.next_attempt_time <= func.now())
+        .order_by(EmailOutbox.next_attempt_time)
+        .limit(config.outbox_batch_size)
+        .with_for_update(skip_locked=True)
+        .cte("due")
+    )
+    result = await session.execute(
+        update(EmailOutbox)
+        .where(EmailOutbox.id == due.c.id)
+        .values(
+            status="SENDING",
+            attempts=EmailOutbox.attempts + 1,
+            next_attempt_time=func.now() + timedelta(seconds=config.outbox_lease_secs),
+        )
+        .returning(
+            EmailOutbox.id,
+            EmailOutbox.subject,
+            EmailOutbox.recipients,
+            EmailOutbox.body,
+            EmailOutbox.template,
+            EmailOutbox.attempts,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    claimed = list(result.all())
+    await session.commit()
+    return claimed
+
+
+async def deliver_batch(
+    session: AsyncSession, connection: SMTPConnection, config: Email
+) -> int:
+    # Returns the number of claimed rows, 0 when nothing was due
+    claimed = await claim_batch(session, config)
+    if not claimed:
+        return 0
+
+    sent: list[int] = []
+    failed: list[dict[str, Any]] = []
+    for row in claimed:
+        try:
+            await connection.send(
+                render_email(
+                    config.sender, row.subject, row.recipients, row.body, row.template
+                )
+            )
+        except Exception as error:
+            logger.warning(
+                "email %s attempt %s failed: %r", row.id, row.attempts, error
+            )
+            give_up = _is_permanent(error) or row.attempts >= config.outbox_max_attempts
+            failed.append(
+                {
+                    "id": row.id,
+                    "status": "FAILED" if give_up else "PENDING",
+                    "next_attempt_time": datetime.now(UTC)
+                    + timedelta(seconds=retry_delay_secs(config, row.attempts)),
+                    "last_error": repr(error)[:1000],
+                }
+            )
+        else:
+            sent.append(row.id)
+
+    if sent:
+        await session.execute(
+            update(EmailOutbox)
+            .where(EmailOutbox.id.in_(sent))
+            .values(status="SENT", sent_time=func.now(), last_error=None)
+            .execution_options(synchronize_session=False)
+        )
+    if failed:
+        await session.execute(update(EmailOutbox), failed)
+    await session.commit()
+    return len(claimed)
+
+
+class OutboxWorkers:
+    def __init__(self, config: Email) -> None:
+        self.config = config
+        self._tasks: list[asyncio.Task[None]] = []
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._run())
+                for _ in range(self.config.outbox_workers)
+            ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            with suppress(asyncio.CancelledError):
+                await task
+        self._tasks = []
+
+    async def _run(self) -> None:
+        connection = SMTPConnection(self.config)
+        try:
+            while True:
+                try:
+                    async with database_session.get_async_session() as session:
+                        claimed = await deliver_batch(session, connection, self.config)
+                except Exception:
+                    logger.exception("email outbox delivery failed")
+                    claimed = 0
+                # A full batch means more may be due, keep going without a pause
+                if claimed < self.config.outbox_batch_size:
+                    await asyncio.sleep(self.config.outbox_poll_secs)
+        finally:
+            await connection.close()
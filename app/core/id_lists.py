@@ -0,0 +1,68 @@
+# JSON bytes of the /users/get* id lists.
+#
+# Fetching a million ids as rows costs a Python object per row on the way in
+# (asyncpg record, SQLAlchemy row, str) and again on the way out (IDList,
+# validated once more by FastAPI's response_model, then dumped). Here the ids
+# come back through COPY (SELECT ...) TO STDOUT instead, as one line of uuid
+# text per row, and the lines become {"ids":["...","..."]} with one
+# bytes.replace per chunk. Uuid text needs no JSON escaping, the bytes are the
+# same IDList would dump. benchmarks/id_lists.py compares both.
+#
+# The statement is compiled by SQLAlchemy and sent to the asyncpg connection
+# under the session, in the session's transaction if it has begun one. It is
+# recorded in the request's query stats like any other.
+
+import time
+from typing import Any, cast
+
+import asyncpg
+from sqlalchemy import Select, Uuid
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.query_stats import record_query
+
+
+class _IdListWriter:
+    def __init__(self) -> None:
+        self.body = bytearray(b'{"ids":[')
+        self._rest = b""
+        self._first = True
+
+    async def write(self, data: bytes) -> None:
+        # asyncpg hands over whole rows, the split is only kept to be safe
+        if self._rest:
+            data = self._rest + data
+        end = data.rfind(b"\n") + 1
+        self._rest = data[end:]
+        if not end:
+            return
+        if not self._first:
+            self.body += b","
+        self._first = False
+        self.body += b'"'
+        self.body += data[: end - 1].replace(b"\n", b'","')
+        self.body += b'"'
+
+    def finish(self) -> bytes:
+        self.body += b"]}"
+        return bytes(self.body)
+
+
+async def id_list_json(session: AsyncSession, statement: Select[Any]) -> bytes:
+    # {"ids": [...]} of a statement selecting one uuid column
+    columns = statement.selected_columns
+    if len(columns) != 1 or not isinstance(columns[0].type, Uuid):
+        raise ValueError("id_list_json takes a select of one uuid column")
+
+    connection = await session.connection()
+    compiled = statement.compile(dialect=connection.dialect)
+    sql = str(compiled)
+    args = [compiled.params[name] for name in compiled.positiontup or ()]
+    raw_connection = await connection.get_raw_connection()
+    driver_connection = cast(asyncpg.Connection, raw_connection.driver_connection)
+
+    writer = _IdListWriter()
+    start = time.perf_counter()
+    await driver_connection.copy_from_query(sql, *args, output=writer.write)
+    record_query(sql, time.perf_counter() - start)
+    return writer.finish()
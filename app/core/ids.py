@@ -0,0 +1,70 @@
+# Primary keys of attorneys, prospects and leads.
+#
+# Random UUIDv4 keys land anywhere in the primary key B-tree, under heavy
+# intake every insert touches (and eventually splits) a random leaf page, so
+# the indexes grow larger than the rows need and stop fitting in cache.
+# UUIDv7 (RFC 9562) starts with the Unix time in milliseconds, new keys go to
+# the right edge of the index like a sequence would, and still need no
+# coordination between workers. DATABASE__UUID_VERSION=v7 switches new keys to
+# it, existing v4 keys stay valid, the column type is uuid either way.
+# benchmarks/uuid_keys.py compares insert rate and index size.
+#
+# The creation time is readable from a v7 key, keys handed out to clients
+# tell when the row was created (lead exports carry create_time anyway).
+#
+# https://www.rfc-editor.org/rfc/rfc9562#name-uuid-version-7
+
+import os
+import time
+import uuid
+
+from app.core.config import get_settings
+
+# rand_a is 12 bits
+COUNTER_MAX = 0xFFF
+
+
+class _UUIDv7Clock:
+    # Millisecond and counter of the last key handed out by this process.
+    # The counter is started at a random value every millisecond (RFC 9562
+    # method 1), so the keys of one process sort in creation order within a
+    # millisecond too. When the counter runs out, or the clock steps back,
+    # the last millisecond is carried forward instead.
+
+    def __init__(self) -> None:
+        self.last_ms = 0
+        self.counter = 0
+
+    def tick(self) -> tuple[int, int]:
+        ms = time.time_ns() // 1_000_000
+        if ms > self.last_ms:
+            self.last_ms = ms
+            # Lower half, leaves at least 2048 keys for this millisecond
+            self.counter = int.from_bytes(os.urandom(2)) & 0x7FF
+        else:
+            self.counter += 1
+            if self.counter > COUNTER_MAX:
+                self.last_ms += 1
+                self.counter = int.from_bytes(os.urandom(2)) & 0x7FF
+        return self.last_ms, self.counter
+
+
+_clock = _UUIDv7Clock()
+
+
+def uuid7() -> uuid.UUID:
+    # 48 bits of milliseconds, the 12 bits of rand_a hold the counter, then
+    # 62 random bits
+    ms, counter = _clock.tick()
+    rand_b = int.from_bytes(os.urandom(8)) & 0x3FFF_FFFF_FFFF_FFFF
+    return uuid.UUID(int=ms << 80 | 0x7 << 76 | counter << 64 | 0b10 << 62 | rand_b)
+
+
+def new_uuid() -> uuid.UUID:
+    return uuid7() if get_settings().database.uuid_version == "v7" else uuid.uuid4()
+
+
+def new_id() -> str:
+    # The models keep keys as str (Uuid(as_uuid=False)), asyncpg turns them
+    # into uuid on the way in
+    return str(new_uuid())
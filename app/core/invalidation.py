@@ -0,0 +1,94 @@
+# Cross worker cache invalidation over Postgres LISTEN/NOTIFY.
+#
+# Every uvicorn worker holds its own in-process caches. Writes publish
+# "<namespace>:<key>" on one NOTIFY channel (DB triggers, see migrations) and
+# each worker keeps a dedicated asyncpg connection listening on it, dispatching
+# messages to the handlers registered for the namespace.
+#
+# Postgres only delivers notifications when the publishing transaction commits
+# and a listener that lost its connection may have missed some, so after every
+# (re)connect all registered caches are reset through their reset callbacks.
+#
+# https://www.postgresql.org/docs/16/sql-notify.html
+
+import asyncio
+import logging
+from collections.abc import Callable
+from contextlib import suppress
+
+import asyncpg
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+_handlers: dict[str, list[Callable[[str], None]]] = {}
+_resets: list[Callable[[], None]] = []
+
+
+def register_handler(
+    namespace: str, handler: Callable[[str], None], reset: Callable[[], None]
+) -> None:
+    _handlers.setdefault(namespace, []).append(handler)
+    _resets.append(reset)
+
+
+def dispatch(namespace: str, key: str) -> None:
+    for handler in _handlers.get(namespace, []):
+        handler(key)
+
+
+class InvalidationListener:
+    def __init__(self, reconnect_delay_secs: float = 5.0) -> None:
+        self.reconnect_delay_secs = reconnect_delay_secs
+        self._task: asyncio.Task[None] | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    @staticmethod
+    def _on_notification(
+        connection: asyncpg.Connection, pid: int, channel: str, payload: str
+    ) -> None:
+        namespace, _, key = payload.partition(":")
+        dispatch(namespace, key)
+
+    async def _run(self) -> None:
+        settings = get_settings()
+        dsn = settings.sqlalchemy_database_uri.set(drivername="postgresql")
+        channel = settings.cache.invalidation_channel
+
+        while True:
+            connection: asyncpg.Connection | None = None
+            try:
+                connection = await asyncpg.connect(
+                    dsn.render_as_string(hide_password=False)
+                )
+                await connection.add_listener(channel, self._on_notification)
+                for reset in _resets:
+                    reset()
+
+                closed = asyncio.Event()
+                connection.add_termination_listener(lambda _: closed.set())
+                await closed.wait()
+                logger.warning("cache invalidation listener disconnected")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("cache invalidation listener failed")
+            finally:
+                if connection is not None and not connection.is_closed():
+                    with suppress(Exception):
+                        await asyncio.shield(connection.close(timeout=1))
+
+            for reset in _resets:
+                reset()
+            await asyncio.sleep(self.reconnect_delay_secs)
@@ -0,0 +1,225 @@
+# Single lead intake, used by /users/filelead.
+#
+# A lead is filed with one statement in one transaction. After the attorney
+# pick (no query for the random strategy with a warm directory and attorney
+# cache) a single WITH statement:
+# - old       reads the prospect's current resume digest, if any
+# - upserted  INSERT ... ON CONFLICT (email) DO UPDATE ... RETURNING the prospect
+# - lead      inserts the lead for the returned prospect
+# - released  drops the ref of the old resume blob when the resume changed
+# - acquired  adds a ref to the new resume blob unless it is the old one
+# - counted   bumps the attorney's PENDING lead counter
+# - mailed    writes the new lead email to the outbox
+# These do what ResumeStore.acquire/release, adjust_lead_counts and
+# enqueue_emails do, for a single row without a round trip each.
+#
+# The ON CONFLICT update only applies while the stored resume still is the one
+# "old" read (compare and set). If another request for the same email inserted
+# or changed the prospect in between, nothing is written and no row returned,
+# the statement is then run again. Postgres keeps the conflicting row locked
+# for the rest of the transaction, so the second run always goes through.
+
+from functools import lru_cache
+
+from fastapi import HTTPException, status
+from sqlalchemy import (
+    JSON,
+    BindParameter,
+    Integer,
+    TextualSelect,
+    bindparam,
+    exists,
+    func,
+    literal,
+    select,
+    update,
+)
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api import api_messages
+from app.core.assignment import PENDING, assign_attorney, get_attorney_directory
+from app.core.attorney_cache import get_attorney_cache
+from app.core.database_session import precompile
+from app.core.email_outbox import new_lead_email
+from app.core.ids import new_id
+from app.core.uploads import StagedUpload
+from app.models import AttorneyLeadCount, EmailOutbox, Lead, Prospect, ResumeBlob
+from app.schemas.responses import ProspectResponse
+
+
+@lru_cache(maxsize=1)
+def file_lead_statement() -> TextualSelect:
+    email: BindParameter[str] = bindparam("prospect_email", type_=Prospect.email.type)
+    resume: BindParameter[str] = bindparam(
+        "resume_digest", type_=ResumeBlob.digest.type
+    )
+    attorney_id: BindParameter[str] = bindparam(
+        "attorney_id", type_=Lead.attorney_id.type
+    )
+
+    old = select(Prospect.resume).where(Prospect.email == email).cte("old")
+    old_resume = select(old.c.resume).scalar_subquery()
+
+    prospect = insert(Prospect).values(
+        prospect_id=bindparam("new_prospect_id", type_=Prospect.prospect_id.type),
+        email=email,
+        name=bindparam("prospect_name", type_=Prospect.name.type),
+        resume=resume,
+    )
+    upserted = (
+        prospect.on_conflict_do_update(
+            index_elements=[Prospect.email],
+            set_={
+                "name": prospect.excluded.name,
+                "resume": prospect.excluded.resume,
+                "update_time": func.now(),
+            },
+            where=Prospect.resume == old_resume,
+        )
+        .returning(Prospect.prospect_id)
+        .cte("upserted")
+    )
+    was_upserted = exists(select(upserted.c.prospect_id))
+
+    lead = (
+        insert(Lead)
+        .from_select(
+            ["lead_id", "attorney_id", "prospect_id", "state"],
+            select(
+                bindparam("new_lead_id", type_=Lead.lead_id.type),
+                attorney_id,
+                upserted.c.prospect_id,
+                literal(PENDING),
+            ),
+        )
+        .returning(Lead.lead_id)
+        .cte("lead")
+    )
+
+    released = (
+        update(ResumeBlob)
+        .where(ResumeBlob.digest == old_resume, old_resume != resume, was_upserted)
+        .values(ref_count=func.greatest(ResumeBlob.ref_count - 1, 0))
+        .returning(ResumeBlob.digest)
+        .cte("released")
+    )
+
+    blob = insert(ResumeBlob).from_select(
+        ["digest", "size", "ref_count"],
+        select(
+            resume,
+            bindparam("resume_size", type_=ResumeBlob.size.type),
+            literal(1, Integer),
+        ).where(was_upserted, old_resume.is_distinct_from(resume)),
+    )
+    acquired = (
+        blob.on_conflict_do_update(
+            index_elements=[ResumeBlob.digest],
+            set_={
+                "ref_count": ResumeBlob.ref_count + blob.excluded.ref_count,
+                "update_time": func.now(),
+            },
+        )
+        .returning(ResumeBlob.digest)
+        .cte("acquired")
+    )
+
+    counter = insert(AttorneyLeadCount).from_select(
+        ["attorney_id", "state", "lead_count"],
+        select(attorney_id, literal(PENDING), literal(1, Integer)).select_from(lead),
+    )
+    counted = (
+        counter.on_conflict_do_update(
+            index_elements=[AttorneyLeadCount.attorney_id, AttorneyLeadCount.state],
+            set_={
+                "lead_count": AttorneyLeadCount.lead_count
+                + counter.excluded.lead_count,
+                "update_time": func.now(),
+            },
+        )
+        .returning(AttorneyLeadCount.attorney_id)
+        .cte("counted")
+    )
+
+    # Python side column defaults are only filled in for top level INSERTs,
+    # so every column is given here
+    mailed = (
+        insert(EmailOutbox)
+        .from_select(
+            ["subject", "recipients", "body", "template", "status", "attempts"],
+            select(
+                bindparam("email_subject", type_=EmailOutbox.subject.type),
+                bindparam("email_recipients", type_=JSON),
+                bindparam("email_body", type_=JSON),
+                literal("email.html"),
+                literal("PENDING"),
+                literal(0, Integer),
+            ).select_from(lead),
+            include_defaults=False,
+        )
+        .returning(EmailOutbox.id)
+        .cte("mailed")
+    )
+
+    # Data modifying CTEs always run, whether the final SELECT reads them or not
+    return precompile(
+        select(upserted.c.prospect_id).add_cte(released, acquired, counted, mailed)
+    )
+
+
+async def file_lead(
+    session: AsyncSession, staged: StagedUpload, name: str, email: str
+) -> ProspectResponse:
+    # Commits on success. Acquires the staged blob's ref, persisting or
+    # discarding the staged file is left to the caller.
+    for _ in range(2):
+        attorney = await assign_attorney(session)
+        if attorney is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=api_messages.NO_VALID_ATTORNEY_FOUND,
+            )
+        lead_id = new_id()
+        message = new_lead_email(lead_id, attorney.name, attorney.email, name, email)
+        params = {
+            "prospect_email": email,
+            "prospect_name": name,
+            "new_prospect_id": new_id(),
+            "new_lead_id": lead_id,
+            "attorney_id": attorney.attorney_id,
+            "resume_digest": staged.sha256,
+            "resume_size": staged.size,
+            "email_subject": message["subject"],
+            "email_recipients": message["recipients"],
+            "email_body": message["body"],
+        }
+        try:
+            prospect_id = await session.scalar(file_lead_statement(), params)
+            if prospect_id is None:
+                # Lost the compare and set to a concurrent request, see above
+                prospect_id = await session.scalar(file_lead_statement(), params)
+            if prospect_id is None:
+                break
+            await session.commit()
+        except IntegrityError:
+            # The attorney was removed after it was picked (lead foreign key),
+            # pick again from a reloaded directory
+            await session.rollback()
+            get_attorney_directory().invalidate()
+            get_attorney_cache().pop(attorney.attorney_id)
+            continue
+
+        return ProspectResponse(
+            prospect_id=prospect_id,
+            attorney_id=attorney.attorney_id,
+            lead_id=lead_id,
+            email=email,
+        )
+
+    await session.rollback()
+    raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=api_messages.ERROR_CREATING_LEAD,
+    )
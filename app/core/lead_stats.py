@@ -0,0 +1,150 @@
+# Incrementally maintained lead counters per (attorney, state).
+#
+# Every write path that creates leads or moves them between states reports
+# the change here in the same transaction, so attorney_lead_counts always
+# matches what COUNT(*) on leads would return without ever running it.
+# /leads/stats reads the counters, reconcile_lead_counts (run by the
+# maintenance job) repairs them should they drift anyway, e.g. after leads
+# were changed by hand in the database.
+
+from collections import Counter
+
+from sqlalchemy import and_, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Attorney, AttorneyLeadCount, Lead
+from app.schemas.responses import AttorneyLeadStats, LeadStatsResponse
+
+LeadCountDeltas = Counter[tuple[str, str]]
+
+
+def transition_deltas(
+    attorney_id: str, old_state: str | None, new_state: str
+) -> LeadCountDeltas:
+    deltas: LeadCountDeltas = Counter()
+    if old_state != new_state:
+        if old_state is not None:
+            deltas[(attorney_id, old_state)] -= 1
+        deltas[(attorney_id, new_state)] += 1
+    return deltas
+
+
+async def adjust_lead_counts(session: AsyncSession, deltas: LeadCountDeltas) -> None:
+    # A zero delta still inserts the row, which is how empty counters get created
+    if not deltas:
+        return
+
+    # Sorted so concurrent transactions lock counter rows in the same order
+    stmt = insert(AttorneyLeadCount).values(
+        [
+            {"attorney_id": attorney_id, "state": state, "lead_count": delta}
+            for (attorney_id, state), delta in sorted(deltas.items())
+        ]
+    )
+    await session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[AttorneyLeadCount.attorney_id, AttorneyLeadCount.state],
+            set_={
+                "lead_count": AttorneyLeadCount.lead_count + stmt.excluded.lead_count,
+                "update_time": func.now(),
+            },
+        )
+    )
+
+
+async def read_lead_stats(
+    session: AsyncSession, attorney_id: str | None = None
+) -> LeadStatsResponse:
+    # One row per attorney and state, leads are not read
+    query = select(
+        AttorneyLeadCount.attorney_id,
+        AttorneyLeadCount.state,
+        AttorneyLeadCount.lead_count,
+    ).order_by(AttorneyLeadCount.attorney_id, AttorneyLeadCount.state)
+    if attorney_id is not None:
+        query = query.where(AttorneyLeadCount.attorney_id == attorney_id)
+
+    totals: Counter[str] = Counter()
+    attorneys: dict[str, dict[str, int]] = {}
+    for row_attorney_id, state, lead_count in await session.execute(query):
+        attorneys.setdefault(row_attorney_id, {})[state] = lead_count
+        totals[state] += lead_count
+    return LeadStatsResponse(
+        totals=dict(totals),
+        attorneys=[
+            AttorneyLeadStats(attorney_id=attorney_id, counts=counts)
+            for attorney_id, counts in attorneys.items()
+        ],
+    )
+
+
+async def reconcile_lead_counts(
+    session: AsyncSession, after: str | None, limit: int
+) -> tuple[list[str], int]:
+    # Recounts the leads of the next `limit` attorneys by id after `after` and
+    # overwrites the counters that differ. Returns the attorney ids and the
+    # number of fixed counters, the caller commits.
+    query = select(Attorney.attorney_id).order_by(Attorney.attorney_id).limit(limit)
+    if after is not None:
+        query = query.where(Attorney.attorney_id > after)
+    attorney_ids = list(await session.scalars(query))
+    if not attorney_ids:
+        return [], 0
+
+    # Locked in the order adjust_lead_counts locks them. Writers that bumped
+    # one of these counters have committed once the locks are granted, so the
+    # COUNT(*) below sees their leads, and writers that bump later add their
+    # delta on top of the recounted value.
+    await session.execute(
+        select(AttorneyLeadCount.attorney_id)
+        .where(AttorneyLeadCount.attorney_id.in_(attorney_ids))
+        .order_by(AttorneyLeadCount.attorney_id, AttorneyLeadCount.state)
+        .with_for_update()
+    )
+
+    actual = (
+        select(Lead.attorney_id, Lead.state, func.count().label("lead_count"))
+        .where(Lead.attorney_id.in_(attorney_ids))
+        .group_by(Lead.attorney_id, Lead.state)
+        .subquery("actual")
+    )
+    stored = (
+        select(
+            AttorneyLeadCount.attorney_id,
+            AttorneyLeadCount.state,
+            AttorneyLeadCount.lead_count,
+        )
+        .where(AttorneyLeadCount.attorney_id.in_(attorney_ids))
+        .subquery("stored")
+    )
+    actual_count = func.coalesce(actual.c.lead_count, 0)
+    drifted = (
+        select(
+            func.coalesce(actual.c.attorney_id, stored.c.attorney_id),
+            func.coalesce(actual.c.state, stored.c.state),
+            actual_count,
+        )
+        .select_from(
+            actual.join(
+                stored,
+                and_(
+                    actual.c.attorney_id == stored.c.attorney_id,
+                    actual.c.state == stored.c.state,
+                ),
+                full=True,
+            )
+        )
+        .where(stored.c.lead_count.is_distinct_from(actual_count))
+    )
+
+    stmt = insert(AttorneyLeadCount).from_select(
+        ["attorney_id", "state", "lead_count"], drifted
+    )
+    fixed = await session.scalars(
+        stmt.on_conflict_do_update(
+            index_elements=[AttorneyLeadCount.attorney_id, AttorneyLeadCount.state],
+            set_={"lead_count": stmt.excluded.lead_count, "update_time": func.now()},
+        ).returning(AttorneyLeadCount.attorney_id)
+    )
+    return attorney_ids, len(fixed.all())
@@ -0,0 +1,145 @@
+# Lead state machine, used by /leads/transitions.
+#
+# ALLOWED_TRANSITIONS lists the states a lead may move to from each state.
+# A batch of leads is moved with one WITH statement:
+# - current  locks the requested leads of the attorney (lead_id = ANY(...)),
+#            in lead_id order so overlapping batches cannot deadlock
+# - updated  UPDATE ... RETURNING for the leads whose state may move to the
+#            target
+# - counted  applies the resulting attorney_lead_counts deltas
+# and returns every requested lead with its previous state, from which the
+# per lead outcome is reported. Leads of other attorneys look like missing ones.
+
+from functools import lru_cache
+
+from sqlalchemy import (
+    BindParameter,
+    TextualSelect,
+    any_,
+    bindparam,
+    func,
+    select,
+    union_all,
+    update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database_session import precompile
+from app.models import AttorneyLeadCount, Lead
+from app.schemas.responses import LeadTransitionResult, TransitionOutcome
+
+ALLOWED_TRANSITIONS: dict[str, frozenset[str]] = {
+    "PENDING": frozenset({"REACHED_OUT"}),
+    # lets an attorney undo a lead marked by mistake
+    "REACHED_OUT": frozenset({"PENDING"}),
+}
+
+
+def source_states(target: str) -> list[str]:
+    return sorted(
+        state for state, targets in ALLOWED_TRANSITIONS.items() if target in targets
+    )
+
+
+@lru_cache(maxsize=1)
+def transition_statement() -> TextualSelect:
+    lead_ids = bindparam("lead_ids", type_=ARRAY(Lead.lead_id.type))
+    attorney_id: BindParameter[str] = bindparam(
+        "attorney_id", type_=Lead.attorney_id.type
+    )
+    target: BindParameter[str] = bindparam("target_state", type_=Lead.state.type)
+    sources = bindparam("source_states", type_=ARRAY(Lead.state.type))
+
+    current = (
+        select(Lead.lead_id, Lead.state)
+        .where(Lead.lead_id == any_(lead_ids), Lead.attorney_id == attorney_id)
+        .order_by(Lead.lead_id)
+        .with_for_update()
+        .cte("current")
+    )
+    updated = (
+        update(Lead)
+        .where(Lead.lead_id == current.c.lead_id, current.c.state == any_(sources))
+        .values(state=target)
+        .returning(Lead.lead_id)
+        .cte("updated")
+    )
+
+    # -1 for every source state a lead left, +1 for the target per moved lead
+    moves = union_all(
+        select(current.c.state, (-func.count()).label("delta"))
+        .join(updated, updated.c.lead_id == current.c.lead_id)
+        .group_by(current.c.state),
+        select(target, func.count().label("delta"))
+        .select_from(updated)
+        .having(func.count() > 0),
+    ).subquery("moves")
+    counter = insert(AttorneyLeadCount).from_select(
+        ["attorney_id", "state", "lead_count"],
+        # Sorted like adjust_lead_counts so counter rows are locked in one order
+        select(attorney_id, moves.c.state, moves.c.delta).order_by(moves.c.state),
+    )
+    counted = (
+        counter.on_conflict_do_update(
+            index_elements=[AttorneyLeadCount.attorney_id, AttorneyLeadCount.state],
+            set_={
+                "lead_count": AttorneyLeadCount.lead_count
+                + counter.excluded.lead_count,
+                "update_time": func.now(),
+            },
+        )
+        .returning(AttorneyLeadCount.state)
+        .cte("counted")
+    )
+
+    return precompile(
+        select(
+            current.c.lead_id,
+            current.c.state,
+            (updated.c.lead_id.is_not(None)).label("moved"),
+        )
+        .select_from(current.outerjoin(updated, updated.c.lead_id == current.c.lead_id))
+        .add_cte(counted)
+    )
+
+
+async def transition_leads(
+    session: AsyncSession, attorney_id: str, lead_ids: list[str], target: str
+) -> list[LeadTransitionResult]:
+    # Commits. Results follow the order of lead_ids, duplicates are dropped.
+    lead_ids = list(dict.fromkeys(lead_ids))
+    rows = await session.execute(
+        transition_statement(),
+        {
+            "lead_ids": lead_ids,
+            "attorney_id": attorney_id,
+            "target_state": target,
+            "source_states": source_states(target),
+        },
+    )
+    found = {lead_id: (state, moved) for lead_id, state, moved in rows}
+    await session.commit()
+
+    results = []
+    for lead_id in lead_ids:
+        if lead_id not in found:
+            results.append(LeadTransitionResult(lead_id=lead_id, outcome="not_found"))
+            continue
+        previous_state, moved = found[lead_id]
+        outcome: TransitionOutcome
+        if moved:
+            outcome = "updated"
+        elif previous_state == target:
+            outcome = "unchanged"
+        else:
+            outcome = "invalid_transition"
+        results.append(
+            LeadTransitionResult(
+                lead_id=lead_id,
+                outcome=outcome,
+                previous_state=previous_state,
+                state=target if moved else previous_state,
+            )
+        )
+    return results
@@ -0,0 +1,182 @@
+# Periodic database cleanup.
+#
+# Every process runs a MaintenanceJob (started in the app lifespan) that wakes
+# up every maintenance.interval_secs, it can also be run once by hand:
+# python -m app.core.maintenance
+#
+# - refresh tokens: used and expired tokens are deleted once they are older
+#   than refresh_token_retention_secs. Every login and refresh inserts a row,
+#   without this the table and its unique index only ever grow.
+# - resume blobs: ResumeStore.collect_garbage, and ResumeStore.retry_pending
+#   for uploads whose backend write failed after the response
+# - lead counters: attorney_lead_counts is recounted batch_size attorneys at
+#   a time and drifted counters are fixed, see reconcile_lead_counts
+#
+# Rows are deleted in batches of batch_size, one short transaction each with
+# a pause in between, so row locks are held briefly and autovacuum can reuse
+# the space. Each batch first takes a transaction level advisory lock, when
+# another process holds it that one is already cleaning up and this run stops.
+# Transaction level locks need no dedicated connection and also work behind a
+# transaction pooler.
+
+import asyncio
+import logging
+import random
+import time
+from collections.abc import Awaitable, Callable
+from contextlib import suppress
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+from sqlalchemy import Select, delete, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import database_session
+from app.core.config import Maintenance, get_settings
+from app.core.lead_stats import reconcile_lead_counts
+from app.core.storage.resume_store import get_resume_store
+from app.models import RefreshToken
+
+logger = logging.getLogger(__name__)
+
+# pg_try_advisory_xact_lock key shared by all processes
+MAINTENANCE_LOCK_KEY = 0x6D61696E74
+
+
+def purgeable_refresh_tokens(retention_secs: int, limit: int) -> Select[Any]:
+    # Expired tokens are found through ix_refresh_token_exp, used ones through
+    # the partial ix_refresh_token_used_update_time
+    return (
+        select(RefreshToken.id)
+        .where(
+            or_(
+                RefreshToken.exp < int(time.time()) - retention_secs,
+                RefreshToken.used
+                & (
+                    RefreshToken.update_time
+                    < datetime.now(UTC) - timedelta(seconds=retention_secs)
+                ),
+            )
+        )
+        .limit(limit)
+    )
+
+
+async def _locked_batches(
+    session: AsyncSession, config: Maintenance, run_batch: Callable[[], Awaitable[int]]
+) -> int:
+    # run_batch deletes up to batch_size rows and commits, which also
+    # releases the lock
+    removed = 0
+    while True:
+        if not await session.scalar(
+            select(func.pg_try_advisory_xact_lock(MAINTENANCE_LOCK_KEY))
+        ):
+            await session.rollback()
+            return removed
+        count = await run_batch()
+        removed += count
+        if count < config.batch_size:
+            return removed
+        await asyncio.sleep(config.batch_pause_secs)
+
+
+async def purge_refresh_tokens(session: AsyncSession, config: Maintenance) -> int:
+    async def run_batch() -> int:
+        batch = purgeable_refresh_tokens(
+            config.refresh_token_retention_secs, config.batch_size
+        )
+        result = await session.execute(
+            delete(RefreshToken)
+            .where(RefreshToken.id.in_(batch.with_for_update(skip_locked=True)))
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        return result.rowcount
+
+    return await _locked_batches(session, config, run_batch)
+
+
+async def collect_resume_garbage(session: AsyncSession, config: Maintenance) -> int:
+    store = get_resume_store()
+
+    async def run_batch() -> int:
+        return await store.collect_garbage(session, batch_size=config.batch_size)
+
+    return await _locked_batches(session, config, run_batch)
+
+
+async def reconcile_lead_counters(session: AsyncSession, config: Maintenance) -> int:
+    after: str | None = None
+    fixed = 0
+
+    async def run_batch() -> int:
+        nonlocal after, fixed
+        attorney_ids, drifted = await reconcile_lead_counts(
+            session, after, config.batch_size
+        )
+        await session.commit()
+        if attorney_ids:
+            after = attorney_ids[-1]
+        fixed += drifted
+        return len(attorney_ids)
+
+    await _locked_batches(session, config, run_batch)
+    if fixed:
+        logger.warning("fixed %s drifted lead counters", fixed)
+    return fixed
+
+
+async def run_maintenance(config: Maintenance) -> dict[str, int]:
+    async with database_session.get_async_session() as session:
+        return {
+            "refresh_tokens": await purge_refresh_tokens(session, config),
+            "resume_blobs": await collect_resume_garbage(session, config),
+            "lead_counters": await reconcile_lead_counters(session, config),
+            "pending_resumes": await get_resume_store().retry_pending(),
+        }
+
+
+class MaintenanceJob:
+    def __init__(self, config: Maintenance) -> None:
+        self.config = config
+        self._task: asyncio.Task[None] | None = None
+
+    def start(self) -> None:
+        if self.config.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            # Spread over the interval so workers started together do not all
+            # wake up at once, only one of them gets the lock anyway
+            await asyncio.sleep(self.config.interval_secs * random.uniform(0.5, 1.0))
+            try:
+                removed = await run_maintenance(self.config)
+            except Exception:
+                logger.exception("maintenance run failed")
+            else:
+                logger.info("maintenance removed %s", removed)
+
+
+async def _main() -> None:
+    logger.info(
+        "maintenance removed %s", await run_maintenance(get_settings().maintenance)
+    )
+    await database_session.dispose_async_engine()
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    asyncio.run(_main())
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
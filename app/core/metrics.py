@@ -0,0 +1,214 @@
+# Prometheus metrics, served in the text format at /metrics.
+#
+# Every uvicorn worker is its own process with its own counters. When the
+# PROMETHEUS_MULTIPROC_DIR environment variable points to a directory,
+# prometheus_client keeps the values in mmap'ed files there and the worker
+# answering a scrape adds up the files of all workers. The variable must be
+# set before the app is imported and the directory emptied before the server
+# starts (init.sh does both in the container). Without it a scrape only sees
+# the worker that happened to answer it.
+#
+# Updating a metric is a dict lookup and a float add (an mmap write in
+# multiprocess mode), the request middleware does one histogram observation
+# and two gauge updates per request and nothing else.
+#
+# - http: latency per method, route template and status, requests in flight
+# - db pool: connections checked out and overflow (summed over the live
+#   workers), time a checkout waited, per pool (primary, replica), see
+#   instrumented_pool
+# - bcrypt: time hash/verify calls took including the wait for a pool process,
+#   calls pending in PasswordHasher
+# - uploads: size of every staged resume
+# - email: time each SMTP send took, by result
+# - caches: hits, misses, evictions and entries of every in-process TTLCache
+#   (attorney, jwt, id_list), see app/core/cache.py
+
+import os
+import time
+from functools import lru_cache
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency",
+    ["method", "route", "status"],
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests being handled",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out",
+    "Database connections checked out of the pool",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow",
+    "Database connections open beyond pool_size",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time a checkout waited for a free or new connection",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+PASSWORD_HASH_DURATION = Histogram(
+    "password_hash_duration_seconds",
+    "bcrypt hash and verify calls, including the wait for a pool process",
+    ["operation"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+PASSWORD_HASH_PENDING = Gauge(
+    "password_hash_pending",
+    "bcrypt calls running or queued for the pool",
+    multiprocess_mode="livesum",
+)
+UPLOAD_BYTES = Histogram(
+    "resume_upload_bytes",
+    "Size of staged resume uploads",
+    buckets=(
+        1024,
+        10 * 1024,
+        100 * 1024,
+        1024**2,
+        5 * 1024**2,
+        10 * 1024**2,
+        50 * 1024**2,
+    ),
+)
+EMAIL_SEND_DURATION = Histogram(
+    "email_send_duration_seconds",
+    "SMTP send latency",
+    ["result"],
+)
+CACHE_HITS = Counter(
+    "cache_hits", "In-process cache lookups that found an entry", ["cache"]
+)
+CACHE_MISSES = Counter(
+    "cache_misses", "In-process cache lookups that found no live entry", ["cache"]
+)
+CACHE_EVICTIONS = Counter(
+    "cache_evictions", "Entries evicted to stay within max_entries", ["cache"]
+)
+CACHE_ENTRIES = Gauge(
+    "cache_entries",
+    "Entries held by in-process caches",
+    ["cache"],
+    multiprocess_mode="livesum",
+)
+
+
+def _multiprocess() -> bool:
+    return "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+
+def _render_metrics() -> bytes:
+    registry = REGISTRY
+    if _multiprocess():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)  # type: ignore[no-untyped-call]
+    return generate_latest(registry)
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    # The multiprocess files are read in the threadpool
+    body = await run_in_threadpool(_render_metrics)
+    return Response(body, media_type=CONTENT_TYPE_LATEST)
+
+
+def mark_process_dead() -> None:
+    # Drops this worker's live gauges (in flight, pool, pending bcrypt) on
+    # shutdown, its counters and histograms are kept
+    if _multiprocess():
+        multiprocess.mark_process_dead(os.getpid())  # type: ignore[no-untyped-call]
+
+
+class MetricsMiddleware:
+    # Outermost middleware, so rejected hosts and oversized uploads are
+    # counted too. The route template is read after the router matched it,
+    # requests that matched no route share one label instead of one per path.
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_progress.dec()
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.labels(
+                method, route.path if route is not None else "unmatched", status_code
+            ).observe(time.perf_counter() - start)
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    # _do_get is where a checkout waits for a returned connection or opens an
+    # overflow one, _do_return_conn where it gives it back
+    name = "primary"
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.labels(self.name).observe(time.perf_counter() - start)
+            self._report()
+
+    def _do_return_conn(self, record: ConnectionPoolEntry) -> None:
+        super()._do_return_conn(record)
+        self._report()
+
+    def _report(self) -> None:
+        DB_POOL_CHECKED_OUT.labels(self.name).set(self.checkedout())
+        # overflow() counts up from -pool_size
+        DB_POOL_OVERFLOW.labels(self.name).set(max(0, self.overflow()))
+
+    def dispose(self) -> None:
+        super().dispose()
+        self._report()
+
+
+@lru_cache
+def instrumented_pool(name: str) -> type[InstrumentedQueuePool]:
+    # A class per pool name, engines take a pool class and recreate() on
+    # dispose builds a new instance of the same class
+    return type(
+        f"InstrumentedQueuePool_{name}", (InstrumentedQueuePool,), {"name": name}
+    )
@@ -0,0 +1,115 @@
+# Prebuilt OpenAPI document support.
+#
+# FastAPI builds the schema on the first /openapi.json or docs request, which
+# walks every route and Pydantic model. When OPENAPI_SCHEMA_FILE points at a
+# file written by `python -m app.core.openapi <path>` it is loaded instead.
+# The file carries a hash of everything the schema is built from, a file
+# written for different routes or models is ignored and the schema rebuilt.
+
+import hashlib
+import json
+import re
+import sys
+from collections.abc import Callable, Iterator
+from pathlib import Path
+from typing import Any, get_args
+
+from fastapi import FastAPI
+from fastapi.dependencies.utils import get_flat_dependant
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+
+# reprs of default factories and validators carry their address
+ADDRESS = re.compile(r" at 0x[0-9a-f]+")
+
+
+def _models(annotation: Any) -> Iterator[type[BaseModel]]:
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        yield annotation
+    for arg in get_args(annotation):
+        yield from _models(arg)
+
+
+def routes_hash(app: FastAPI) -> str:
+    # Paths, methods, parameters and the fields of every model they reach.
+    # Only annotations are read, it costs a fraction of building the schema
+    parts = [repr((app.title, app.version, app.description, app.openapi_tags))]
+    pending: list[type[BaseModel]] = []
+    for route in app.routes:
+        if not isinstance(route, APIRoute) or not route.include_in_schema:
+            continue
+        dependant = get_flat_dependant(route.dependant, skip_repeats=True)
+        params = {
+            location: [
+                (param.name, param.field_info.annotation, param.field_info)
+                for param in getattr(dependant, f"{location}_params")
+            ]
+            for location in ("path", "query", "header", "cookie", "body")
+        }
+        parts.append(
+            repr(
+                (
+                    route.path,
+                    sorted(route.methods),
+                    route.name,
+                    route.summary,
+                    route.description,
+                    route.tags,
+                    route.status_code,
+                    route.responses,
+                    route.response_model,
+                    params,
+                )
+            )
+        )
+        pending += _models(route.response_model)
+        for location_params in params.values():
+            for _, annotation, _ in location_params:
+                pending += _models(annotation)
+
+    seen: set[type[BaseModel]] = set()
+    while pending:
+        model = pending.pop()
+        if model in seen:
+            continue
+        seen.add(model)
+        parts.append(repr((model.__module__, model.__qualname__, model.model_fields)))
+        for field in model.model_fields.values():
+            pending += _models(field.annotation)
+
+    fingerprint = ADDRESS.sub("", "\n".join(parts))
+    return hashlib.sha256(fingerprint.encode()).hexdigest()
+
+
+def write_openapi(app: FastAPI, schema_file: Path) -> None:
+    schema_file.write_text(
+        json.dumps({"routes_hash": routes_hash(app), "schema": app.openapi()})
+    )
+
+
+def use_prebuilt_openapi(app: FastAPI, schema_file: Path | None) -> None:
+    build_openapi: Callable[[], dict[str, Any]] = app.openapi
+
+    def openapi() -> dict[str, Any]:
+        if (
+            app.openapi_schema is None
+            and schema_file is not None
+            and schema_file.is_file()
+        ):
+            # hashed on the first request, routes may be added after this call
+            prebuilt = json.loads(schema_file.read_text())
+            if prebuilt.get("routes_hash") == routes_hash(app):
+                app.openapi_schema = prebuilt["schema"]
+        return app.openapi_schema or build_openapi()
+
+    app.openapi = openapi  # type: ignore[method-assign]
+
+
+def main() -> None:  # pragma: no cover
+    from app.main import app
+
+    write_openapi(app, Path(sys.argv[1]))
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -0,0 +1,191 @@
+# Per request SQL statistics (opt-in, QUERY_STATS__ENABLED=true).
+#
+# Cursor execute events of the engine are timed and added to the
+# RequestQueries of the current request, found through a context variable.
+# SQLAlchemy runs the sync events in a greenlet that shares the calling task's
+# context, so the endpoint's queries land in its own request even with many
+# requests interleaved on one event loop. Queries of the background workers
+# (outbox, maintenance) run outside any request and are not collected.
+#
+# QueryStatsMiddleware then
+# - adds "Server-Timing: db;dur=<ms>;desc="<n> queries"" to the response,
+#   shown in the browser's network tab. Queries after the response started
+#   (streamed exports, background tasks) are only in the log.
+# - logs a warning when a request ran more than query_budget statements, or
+#   the same statement (parameter lists collapsed) repeat_threshold times or
+#   more, which usually is a query per row (N+1)
+#
+# assert_max_queries() collects the queries of a block and fails when there
+# were too many, for tests and benchmarks/query_counts.py:
+#
+#     with assert_max_queries(3):
+#         await client.get("/users/leads")
+
+import logging
+import re
+import time
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import QueryStats
+
+logger = logging.getLogger(__name__)
+
+# "$1, $2, $3" of expanded IN lists and VALUES rows, so one statement has one
+# shape whatever the number of parameters
+_PARAMETER_LIST = re.compile(r"\$\d+(?:::\w+)?(?:\s*,\s*\$\d+(?:::\w+)?)*")
+
+
+def statement_shape(statement: str) -> str:
+    return _PARAMETER_LIST.sub("?", " ".join(statement.split()))
+
+
+@dataclass
+class RequestQueries:
+    slowest_kept: int = 3
+    count: int = 0
+    total_secs: float = 0.0
+    shapes: Counter[str] = field(default_factory=Counter)
+    # (secs, statement), slowest first
+    slowest: list[tuple[float, str]] = field(default_factory=list)
+    # collector of an enclosing assert_max_queries, sees the same queries
+    parent: "RequestQueries | None" = None
+
+    def record(self, statement: str, secs: float) -> None:
+        self.count += 1
+        self.total_secs += secs
+        self.shapes[statement_shape(statement)] += 1
+        if len(self.slowest) < self.slowest_kept or secs > self.slowest[-1][0]:
+            self.slowest.append((secs, statement))
+            self.slowest.sort(key=lambda item: item[0], reverse=True)
+            del self.slowest[self.slowest_kept :]
+        if self.parent is not None:
+            self.parent.record(statement, secs)
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        return [
+            (shape, times)
+            for shape, times in self.shapes.most_common()
+            if times >= threshold
+        ]
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.total_secs * 1000:.1f};desc="{self.count} queries"'
+
+
+_current: ContextVar[RequestQueries | None] = ContextVar(
+    "request_queries", default=None
+)
+
+
+def _before_cursor_execute(conn: Connection, *_: Any) -> None:
+    if _current.get() is not None:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(
+    conn: Connection, cursor: Any, statement: str, *_: Any
+) -> None:
+    queries = _current.get()
+    # started is missing when collection began between the two events
+    if queries is not None and (started := conn.info.get("query_start")):
+        queries.record(statement, time.perf_counter() - started.pop())
+
+
+def record_query(statement: str, secs: float) -> None:
+    # For statements sent to the driver directly (COPY, see app/core/id_lists.py),
+    # which the cursor events do not see
+    queries = _current.get()
+    if queries is not None:
+        queries.record(statement, secs)
+
+
+def instrument_engine(engine: AsyncEngine | Engine) -> None:
+    sync_engine = engine.sync_engine if isinstance(engine, AsyncEngine) else engine
+    if not event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+@contextmanager
+def collect_queries(slowest_kept: int = 3) -> Iterator[RequestQueries]:
+    queries = RequestQueries(slowest_kept=slowest_kept, parent=_current.get())
+    token = _current.set(queries)
+    try:
+        yield queries
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def assert_max_queries(max_queries: int) -> Iterator[RequestQueries]:
+    # Needs the listeners even when the middleware is off
+    from app.core.database_session import get_async_engine
+
+    instrument_engine(get_async_engine())
+    with collect_queries() as queries:
+        yield queries
+    if queries.count > max_queries:
+        statements = "\n".join(
+            f"{times}x {shape}" for shape, times in queries.shapes.most_common()
+        )
+        raise AssertionError(
+            f"{queries.count} queries, expected at most {max_queries}:\n{statements}"
+        )
+
+
+class QueryStatsMiddleware:
+    def __init__(self, app: ASGIApp, config: QueryStats) -> None:
+        self.app = app
+        self.config = config
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with collect_queries(self.config.slowest_kept) as queries:
+
+            async def send_with_timing(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    MutableHeaders(scope=message).append(
+                        "Server-Timing", queries.server_timing()
+                    )
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_timing)
+            finally:
+                self._warn(scope, queries)
+
+    def _warn(self, scope: Scope, queries: RequestQueries) -> None:
+        route = scope.get("route")
+        request = (
+            f"{scope['method']} {route.path if route is not None else scope['path']}"
+        )
+        if queries.count > self.config.query_budget:
+            logger.warning(
+                "%s ran %s queries in %.1fms (budget %s), slowest: %s",
+                request,
+                queries.count,
+                queries.total_secs * 1000,
+                self.config.query_budget,
+                [
+                    f"{secs * 1000:.1f}ms {statement_shape(statement)[:200]}"
+                    for secs, statement in queries.slowest
+                ],
+            )
+        for shape, times in queries.repeated(self.config.repeat_threshold):
+            logger.warning(
+                "%s ran the same statement %s times: %s", request, times, shape[:200]
+            )
@@ -0,0 +1,428 @@
+# Cache of the full id list responses (/users/getpendingleads,
+# /getreachedleads, /getattorneys, /getprospects).
+#
+# Dashboards poll these every few seconds and the lists rarely change between
+# two polls. The serialized body is kept with a strong ETag (a hash of the
+# body, the same in every worker), a GET sending it back in If-None-Match is
+# answered with a 304, without a query and without the body.
+#
+# Entries are per table and variant (leads:PENDING, attorneys, ...), looked up
+# in the in-process LRU first, then in the shared backend when
+# CACHE__REDIS_URL is set, then loaded from the database. Concurrent misses of
+# one entry share one load.
+#
+# Invalidation, per table:
+# - the endpoints writing leads, prospects or attorneys call invalidate()
+#   after their commit
+# - the id_list (leads, prospects) and attorney triggers NOTIFY every worker,
+#   see app/core/invalidation.py
+# - entries expire after CACHE__ID_LIST_TTL_SECS. That bounds what the above
+#   miss: writers outside the app, a shared backend unreachable at the write,
+#   other workers' entries with CACHE__LISTEN_FOR_INVALIDATIONS off.
+# A replica within DATABASE__REPLICA_MAX_LAG_SECS may not have replayed the
+# write yet, so for primary_window_secs after an invalidation of a table its
+# loads read from the primary (read_primary), otherwise the reload right
+# after the write could cache the old rows for the whole TTL.
+#
+# Both invalidation paths drop the local entries and bump the table's
+# generation in the shared backend. Shared entries are stored under the
+# generation read before the load, a load that raced with a write stores its
+# result where nobody looks anymore. Local entries are dropped the same way,
+# by comparing the local generation before and after the load.
+
+import abc
+import asyncio
+import hashlib
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, TypeVar
+from urllib.parse import urlsplit
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.core import invalidation
+from app.core.cache import TTLCache
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = "id_list"
+TABLES = ("leads", "prospects", "attorneys")
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    body: bytes
+    etag: str
+
+    @classmethod
+    def for_body(cls, body: bytes) -> "CachedResponse":
+        return cls(body, f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"')
+
+    def encode(self) -> bytes:
+        return self.etag.encode() + b"\n" + self.body
+
+    @classmethod
+    def decode(cls, value: bytes) -> "CachedResponse":
+        etag, _, body = value.partition(b"\n")
+        return cls(body, etag.decode())
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    # If-None-Match uses the weak comparison, W/"x" matches "x"
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(",")
+    )
+
+
+def conditional_response(request: Request, cached: CachedResponse) -> Response:
+    # no-cache: clients may keep the body but revalidate before every use
+    headers = {"ETag": cached.etag, "Cache-Control": "no-cache"}
+    if request.method in ("GET", "HEAD") and _etag_matches(
+        request.headers.get("if-none-match"), cached.etag
+    ):
+        return Response(status_code=304, headers=headers)
+    return Response(cached.body, media_type="application/json", headers=headers)
+
+
+class SharedBackend(abc.ABC):
+    @abc.abstractmethod
+    async def generation(self, table: str) -> int: ...
+
+    @abc.abstractmethod
+    async def bump(self, table: str) -> None: ...
+
+    @abc.abstractmethod
+    async def get(self, key: str, generation: int) -> bytes | None: ...
+
+    @abc.abstractmethod
+    async def set(
+        self, key: str, generation: int, value: bytes, ttl_secs: float
+    ) -> None: ...
+
+    async def close(self) -> None:
+        pass
+
+
+class RedisError(Exception):
+    # An error reply, the connection is still usable
+    pass
+
+
+@dataclass(frozen=True)
+class RedisAuth:
+    # AUTH with a password only uses the default user
+    username: str = ""
+    password: str = ""
+
+
+class RedisBackend(SharedBackend):
+    # Plain RESP2 over one asyncio connection per worker, commands take turns.
+    # Works against Redis and its stand-ins (Valkey, KeyDB, Dragonfly) without
+    # extra deps. Every command, including the wait for its turn and a
+    # reconnect, is bounded by timeout_secs, a connection left mid-reply is
+    # closed and opened again by the next command.
+    # https://redis.io/docs/latest/develop/reference/protocol-spec/
+
+    def __init__(
+        self,
+        url: str,
+        key_prefix: str,
+        timeout_secs: float,
+        auth: RedisAuth = RedisAuth(),
+    ) -> None:
+        parts = urlsplit(url)
+        if parts.scheme not in ("redis", "rediss"):
+            raise ValueError(f"not a redis:// or rediss:// url: {url}")
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or 6379
+        self.db = int(parts.path.lstrip("/") or 0)
+        self.tls = parts.scheme == "rediss"
+        self.auth = auth
+        self.key_prefix = key_prefix
+        self.timeout_secs = timeout_secs
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._lock = asyncio.Lock()
+
+    def _generation_key(self, table: str) -> str:
+        return f"{self.key_prefix}{NAMESPACE}:{table}:generation"
+
+    async def generation(self, table: str) -> int:
+        value = await self.execute("GET", self._generation_key(table))
+        return int(value or 0)
+
+    async def bump(self, table: str) -> None:
+        await self.execute("INCR", self._generation_key(table))
+
+    async def get(self, key: str, generation: int) -> bytes | None:
+        value = await self.execute(
+            "GET", f"{self.key_prefix}{NAMESPACE}:{key}:{generation}"
+        )
+        return value  # type: ignore[no-any-return]
+
+    async def set(
+        self, key: str, generation: int, value: bytes, ttl_secs: float
+    ) -> None:
+        await self.execute(
+            "SET",
+            f"{self.key_prefix}{NAMESPACE}:{key}:{generation}",
+            value,
+            "PX",
+            max(1, int(ttl_secs * 1000)),
+        )
+
+    async def execute(self, *args: str | bytes | int) -> Any:
+        return await asyncio.wait_for(self._execute(args), self.timeout_secs)
+
+    async def _execute(self, args: tuple[str | bytes | int, ...]) -> Any:
+        async with self._lock:
+            try:
+                if self._writer is None:
+                    await self._connect()
+                return await self._command(args)
+            except RedisError:
+                raise
+            except BaseException:
+                # A half read reply would be taken for the next command's
+                self._close()
+                raise
+
+    async def _connect(self) -> None:
+        self._reader, self._writer = await asyncio.open_connection(
+            self.host, self.port, ssl=True if self.tls else None
+        )
+        if self.auth.password:
+            if self.auth.username:
+                await self._command(("AUTH", self.auth.username, self.auth.password))
+            else:
+                await self._command(("AUTH", self.auth.password))
+        if self.db:
+            await self._command(("SELECT", self.db))
+
+    async def _command(self, args: tuple[str | bytes | int, ...]) -> Any:
+        assert self._reader is not None and self._writer is not None
+        self._writer.write(encode_command(args))
+        await self._writer.drain()
+        reply = await read_reply(self._reader)
+        if isinstance(reply, RedisError):
+            raise reply
+        return reply
+
+    def _close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def close(self) -> None:
+        async with self._lock:
+            self._close()
+
+
+def encode_command(args: tuple[str | bytes | int, ...]) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode()
+        parts += (b"$%d\r\n" % len(data), data, b"\r\n")
+    return b"".join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader) -> Any:
+    line = await reader.readuntil(b"\r\n")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b"+":
+        return rest.decode()
+    if kind == b"-":
+        return RedisError(rest.decode())
+    if kind == b":":
+        return int(rest)
+    if kind in (b"$", b"*") and int(rest) < 0:
+        # null bulk string or null array
+        return None
+    if kind == b"$":
+        return (await reader.readexactly(int(rest) + 2))[:-2]
+    if kind == b"*":
+        return [await read_reply(reader) for _ in range(int(rest))]
+    raise ConnectionError(f"unexpected redis reply {line[:50]!r}")
+
+
+class ResponseCache:
+    # After a failed shared backend call reads skip it for retry_secs, so an
+    # unreachable backend does not add its timeout to every miss. Generation
+    # bumps are always tried.
+    retry_secs = 5.0
+
+    def __init__(
+        self,
+        ttl_secs: float,
+        shared: SharedBackend | None = None,
+        primary_window_secs: float = 0.0,
+    ) -> None:
+        self.ttl_secs = ttl_secs
+        self.shared = shared
+        self.primary_window_secs = primary_window_secs
+        # A few entries per table
+        self._local: TTLCache[str, CachedResponse] = TTLCache(
+            name="id_list", max_entries=64, ttl_secs=ttl_secs
+        )
+        self._keys: dict[str, set[str]] = {table: set() for table in TABLES}
+        self._generations = dict.fromkeys(TABLES, 0)
+        self._dropped_at = dict.fromkeys(TABLES, float("-inf"))
+        self._loading: dict[tuple[str, int], asyncio.Task[CachedResponse]] = {}
+        self._shared_ok = True
+        self._retry_at = 0.0
+        self._unbumped: set[str] = set()
+        self._bumper: asyncio.Task[None] | None = None
+
+    async def get(
+        self, table: str, variant: str, load: Callable[[], Awaitable[bytes]]
+    ) -> CachedResponse:
+        key = f"{table}:{variant}" if variant else table
+        cached = self._local.get(key)
+        if cached is not None:
+            return cached
+
+        generation = self._generations[table]
+        task = self._loading.get((key, generation))
+        if task is None:
+            task = asyncio.create_task(self._load(table, key, generation, load))
+            self._loading[key, generation] = task
+            task.add_done_callback(lambda _: self._loading.pop((key, generation), None))
+        # A poll that gives up does not cancel the load the others wait for
+        return await asyncio.shield(task)
+
+    async def _load(
+        self,
+        table: str,
+        key: str,
+        generation: int,
+        load: Callable[[], Awaitable[bytes]],
+    ) -> CachedResponse:
+        cached = None
+        shared_generation = None
+        if self.shared is not None and time.monotonic() >= self._retry_at:
+            shared_generation = await self._call_shared(self.shared.generation, table)
+            if shared_generation is not None:
+                value = await self._call_shared(self.shared.get, key, shared_generation)
+                if value is not None:
+                    cached = CachedResponse.decode(value)
+
+        if cached is None:
+            cached = CachedResponse.for_body(await load())
+            if self.shared is not None and shared_generation is not None:
+                await self._call_shared(
+                    self.shared.set,
+                    key,
+                    shared_generation,
+                    cached.encode(),
+                    self.ttl_secs,
+                )
+
+        if self._generations[table] == generation:
+            self._local.set(key, cached)
+            self._keys[table].add(key)
+        return cached
+
+    async def _call_shared(
+        self, method: Callable[..., Awaitable[T]], *args: Any
+    ) -> T | None:
+        try:
+            result = await method(*args)
+        except (OSError, TimeoutError, RedisError) as error:
+            self._retry_at = time.monotonic() + self.retry_secs
+            if self._shared_ok:
+                logger.warning("shared response cache unavailable: %r", error)
+            self._shared_ok = False
+            return None
+        if not self._shared_ok:
+            logger.warning("shared response cache available again")
+        self._shared_ok = True
+        return result
+
+    def read_primary(self, table: str) -> bool:
+        return time.monotonic() - self._dropped_at[table] < self.primary_window_secs
+
+    def _drop_local(self, table: str) -> None:
+        self._generations[table] += 1
+        self._dropped_at[table] = time.monotonic()
+        for key in self._keys[table]:
+            self._local.pop(key)
+        self._keys[table].clear()
+
+    async def invalidate(self, *tables: str) -> None:
+        # After the write committed, a load in between would cache the old rows
+        for table in tables:
+            self._drop_local(table)
+            if self.shared is not None:
+                await self._call_shared(self.shared.bump, table)
+
+    def on_notification(self, table: str) -> None:
+        if table not in self._generations:
+            return
+        self._drop_local(table)
+        if self.shared is not None:
+            # Bumped by the writer too, but that may land after another
+            # worker reloaded the old generation on this notification.
+            # Bumps of a burst of notifications are folded together.
+            self._unbumped.add(table)
+            if self._bumper is None or self._bumper.done():
+                self._bumper = asyncio.get_running_loop().create_task(
+                    self._bump_unbumped()
+                )
+
+    async def _bump_unbumped(self) -> None:
+        assert self.shared is not None
+        while self._unbumped:
+            await self._call_shared(self.shared.bump, self._unbumped.pop())
+
+    def clear(self) -> None:
+        for table in TABLES:
+            self._drop_local(table)
+
+    async def close(self) -> None:
+        if self.shared is not None:
+            await self.shared.close()
+
+
+@lru_cache(maxsize=1)
+def get_response_cache() -> ResponseCache:
+    settings = get_settings().cache
+    shared = None
+    if settings.redis_url is not None:
+        shared = RedisBackend(
+            settings.redis_url,
+            key_prefix=settings.redis_key_prefix,
+            timeout_secs=settings.redis_timeout_secs,
+            auth=RedisAuth(
+                settings.redis_username, settings.redis_password.get_secret_value()
+            ),
+        )
+    database = get_settings().database
+    primary_window_secs = 0.0
+    if database.replica_hostname is not None:
+        # the lag is measured every replica_check_secs, it may have grown since
+        primary_window_secs = (
+            database.replica_max_lag_secs + database.replica_check_secs
+        )
+    cache = ResponseCache(settings.id_list_ttl_secs, shared, primary_window_secs)
+    invalidation.register_handler(NAMESPACE, cache.on_notification, cache.clear)
+    # Sent for every attorney insert, update and delete
+    invalidation.register_handler(
+        "attorney", lambda _: cache.on_notification("attorneys"), cache.clear
+    )
+    return cache
+
+
+async def close_response_cache() -> None:
+    if get_response_cache.cache_info().currsize:
+        await get_response_cache().close()
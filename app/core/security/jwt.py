@@ -1,9 +1,12 @@
+import hashlib
 import time
+from functools import lru_cache
 
 import jwt
 from fastapi import HTTPException, status
 from pydantic import BaseModel
 
+from app.core.cache import TTLCache
 from app.core.config import get_settings
 
 JWT_ALGORITHM = "HS256"
@@ -23,12 +26,25 @@ class JWTToken(BaseModel):
     access_token: str
 
 
+# Verified payloads keyed by the SHA-256 of the token string, so raw tokens
+# are never kept in memory. Entries never outlive the token's own "exp".
+@lru_cache(maxsize=1)
+def get_verified_token_cache() -> TTLCache[bytes, JWTTokenPayload]:
+    security = get_settings().security
+    return TTLCache(
+        name="jwt",
+        max_entries=security.jwt_cache_max_entries,
+        ttl_secs=security.jwt_cache_ttl_secs,
+    )
+
+
 def create_jwt_token(user_id: str) -> JWTToken:
+    security = get_settings().security
     iat = int(time.time())
-    exp = iat + get_settings().security.jwt_access_token_expire_secs
+    exp = iat + security.jwt_access_token_expire_secs
 
     token_payload = JWTTokenPayload(
-        iss=get_settings().security.jwt_issuer,
+        iss=security.jwt_issuer,
         sub=user_id,
         exp=exp,
         iat=iat,
@@ -36,7 +52,7 @@ def create_jwt_token(user_id: str) -> JWTToken:
 
     access_token = jwt.encode(
         token_payload.model_dump(),
-        key=get_settings().security.jwt_secret_key.get_secret_value(),
+        key=security.jwt_secret_key.get_secret_value(),
         algorithm=JWT_ALGORITHM,
     )
 
@@ -52,13 +68,20 @@ def verify_jwt_token(token: str) -> JWTTokenPayload:
     # If unsure, jump into jwt.decode code, make sure tests are passing
     # https://pyjwt.readthedocs.io/en/stable/usage.html#encoding-decoding-tokens-with-hs256
 
+    cache = get_verified_token_cache()
+    cache_key = hashlib.sha256(token.encode()).digest()
+    cached_payload = cache.get(cache_key)
+    if cached_payload is not None:
+        return cached_payload
+
+    security = get_settings().security
     try:
         raw_payload = jwt.decode(
             token,
-            get_settings().security.jwt_secret_key.get_secret_value(),
+            security.jwt_secret_key.get_secret_value(),
             algorithms=[JWT_ALGORITHM],
             options={"verify_signature": True},
-            issuer=get_settings().security.jwt_issuer,
+            issuer=security.jwt_issuer,
         )
     except jwt.InvalidTokenError as e:
         raise HTTPException(
@@ -66,4 +89,7 @@ def verify_jwt_token(token: str) -> JWTTokenPayload:
             detail=f"Token invalid: {e}",
         )
 
-    return JWTTokenPayload(**raw_payload)
+    token_payload = JWTTokenPayload(**raw_payload)
+    # pyjwt rejects tokens once exp <= now, the cache drops them at the same moment
+    cache.set(cache_key, token_payload, expires_at=token_payload.exp)
+    return token_payload
@@ -1,6 +1,27 @@
+# Password hashing with bcrypt.
+#
+# bcrypt is deliberately slow (~250ms at 12 rounds) and would block the event
+# loop, so async code goes through PasswordHasher, which runs the sync
+# functions below in a bounded ProcessPoolExecutor. Calls beyond the configured
+# number of pending jobs fail fast with 503 instead of queueing without limit.
+
+import asyncio
+import multiprocessing
+import time
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Any, TypeVar
+
 import bcrypt
+from fastapi import HTTPException, status
 
+from app.api import api_messages
 from app.core.config import get_settings
+from app.core.metrics import PASSWORD_HASH_DURATION, PASSWORD_HASH_PENDING
+
+T = TypeVar("T")
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(
@@ -9,9 +30,91 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 
 def get_password_hash(password: str) -> str:
-    return bcrypt.hashpw(
-        password.encode(),
-        bcrypt.gensalt(get_settings().security.password_bcrypt_rounds),
-    ).decode()
+    return _hash_password(password, get_settings().security.password_bcrypt_rounds)
+
+
+def _hash_password(password: str, rounds: int) -> str:
+    # rounds are passed in so pool workers never need to load settings
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds)).decode()
+
+
+class PasswordHasher:
+    def __init__(self, max_workers: int, max_pending: int, rounds: int) -> None:
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self.pending = 0
+        self._executor: ProcessPoolExecutor | None = None
+        self._dummy_password: str | None = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn, not fork, the parent runs an event loop and threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    async def _run(self, operation: str, func: Callable[..., T], *args: Any) -> T:
+        if self.pending >= self.max_pending:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=api_messages.PASSWORD_HASHER_BUSY,
+                headers={"Retry-After": "1"},
+            )
+        self.pending += 1
+        PASSWORD_HASH_PENDING.inc()
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self.pending -= 1
+            PASSWORD_HASH_PENDING.dec()
+            PASSWORD_HASH_DURATION.labels(operation).observe(time.perf_counter() - start)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run("verify", verify_password, plain_password, hashed_password)
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", _hash_password, password, self.rounds)
+
+    async def dummy_password(self) -> str:
+        # Hashed in the pool on first use instead of at import time,
+        # a concurrent first call at worst hashes it twice
+        if self._dummy_password is None:
+            self._dummy_password = await self.hash("")
+        return self._dummy_password
+
+    async def verify_dummy(self, plain_password: str) -> None:
+        # Unknown users still pay for one bcrypt check so response times
+        # do not reveal which emails are registered
+        await self.verify(plain_password, await self.dummy_password())
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+@lru_cache(maxsize=1)
+def get_password_hasher() -> PasswordHasher:
+    security = get_settings().security
+    return PasswordHasher(
+        max_workers=security.password_hash_workers,
+        max_pending=security.password_hash_max_pending,
+        rounds=security.password_bcrypt_rounds,
+    )
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await get_password_hasher().verify(plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await get_password_hasher().hash(password)
+
 
-DUMMY_PASSWORD = get_password_hash("")
+async def verify_dummy_password_async(plain_password: str) -> None:
+    await get_password_hasher().verify_dummy(plain_password)
@@ -0,0 +1,137 @@
+# Refresh tokens are opaque random strings, handed to the client once.
+# Only their SHA-256 is stored (RefreshToken.token_hash): 32 fixed bytes in the
+# unique index instead of the token text, and a copy of the table holds no
+# usable tokens. A plain hash is enough, the tokens carry 256 random bits.
+#
+# Rotation (/auth/refresh-token) is one statement: the UPDATE flags the
+# presented token used only while it is unused and unexpired, and the INSERT
+# issues the new token for the attorney it returned. Concurrent rotations of
+# the same token queue on its row lock, Postgres re-checks the WHERE for the
+# ones that waited, so exactly one wins. Only when nothing was rotated the
+# token is read again to tell which check failed.
+
+import hashlib
+import secrets
+import time
+from functools import lru_cache
+from typing import Any, NamedTuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import (
+    BigInteger,
+    LargeBinary,
+    Select,
+    bindparam,
+    false,
+    insert,
+    select,
+    true,
+    update,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api import api_messages
+from app.core.config import get_settings
+from app.models import RefreshToken
+
+
+class IssuedRefreshToken(NamedTuple):
+    attorney_id: str
+    token: str
+    exp: int
+
+
+def generate_refresh_token() -> str:
+    return secrets.token_urlsafe(32)
+
+
+def hash_refresh_token(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+
+def refresh_token_exp() -> int:
+    return int(time.time() + get_settings().security.refresh_token_expire_secs)
+
+
+@lru_cache(maxsize=1)
+def rotation_statement() -> Select[Any]:
+    # Bind names must differ from column names, UPDATE would take a
+    # "token_hash" parameter as a SET value
+    rotated = (
+        update(RefreshToken)
+        .where(
+            RefreshToken.token_hash == bindparam("presented_hash", type_=LargeBinary),
+            RefreshToken.used.is_(False),
+            RefreshToken.exp > bindparam("now_secs", type_=BigInteger),
+        )
+        .values(used=true())
+        .returning(RefreshToken.attorney_id)
+        .cte("rotated")
+    )
+    # Python side column defaults are only filled in for top level INSERTs
+    issued = (
+        insert(RefreshToken)
+        .from_select(
+            ["token_hash", "used", "exp", "attorney_id"],
+            select(
+                bindparam("new_token_hash", type_=LargeBinary),
+                false(),
+                bindparam("new_exp", type_=BigInteger),
+                rotated.c.attorney_id,
+            ),
+            include_defaults=False,
+        )
+        .returning(RefreshToken.attorney_id)
+        .cte("issued")
+    )
+    return select(issued.c.attorney_id)
+
+
+async def _rotation_error(
+    session: AsyncSession, token_hash: bytes, now: int
+) -> HTTPException:
+    token = (
+        await session.execute(
+            select(RefreshToken.used, RefreshToken.exp).where(
+                RefreshToken.token_hash == token_hash
+            )
+        )
+    ).one_or_none()
+    if token is None:
+        return HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=api_messages.REFRESH_TOKEN_NOT_FOUND,
+        )
+    if now >= token.exp:
+        return HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=api_messages.REFRESH_TOKEN_EXPIRED,
+        )
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=api_messages.REFRESH_TOKEN_ALREADY_USED,
+    )
+
+
+async def rotate_refresh_token(session: AsyncSession, token: str) -> IssuedRefreshToken:
+    # Commits on success
+    now = int(time.time())
+    token_hash = hash_refresh_token(token)
+    new_token = generate_refresh_token()
+    new_exp = refresh_token_exp()
+    attorney_id = await session.scalar(
+        rotation_statement(),
+        {
+            "presented_hash": token_hash,
+            "now_secs": now,
+            "new_token_hash": hash_refresh_token(new_token),
+            "new_exp": new_exp,
+        },
+    )
+    if attorney_id is None:
+        error = await _rotation_error(session, token_hash, now)
+        await session.rollback()
+        raise error
+
+    await session.commit()
+    return IssuedRefreshToken(attorney_id=attorney_id, token=new_token, exp=new_exp)
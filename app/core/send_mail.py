@@ -1,10 +1,88 @@
-# Simple async send email function using fastapi-mail 
+# Email rendering and delivery over a reusable SMTP connection.
+#
+# Nothing in a request sends mail, endpoints add rows to the outbox (see
+# app/core/email_outbox.py) and the outbox workers deliver them through
+# SMTPConnection, which stays open across messages and batches.
 
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
+import logging
+import time
+from email.message import EmailMessage
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
 
-enable_email = False
-async def send_email_async(subject: str, attorney_email: str, prospect_email: str, body: dict):
-    if enable_email:
-        fm = FastMail(ConnectionConfig(MAIL_USERNAME = "username", MAIL_PASSWORD = "**********", MAIL_PORT = 587, MAIL_SERVER = "mail server", MAIL_SSL_TLS = False, TEMPLATE_FOLDER="./templates/"))
-        await fm.send_message(MessageSchema(subject=subject, recipients=[attorney_email, prospect_email], body=body,subtype='html'), template_name="email.html")
-    print(f"debug: sending email to {attorney_email} and {prospect_email}")
+import aiosmtplib
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+from app.core.config import Email
+from app.core.metrics import EMAIL_SEND_DURATION
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_DIR = Path(__file__).parent / "templates"
+
+
+@lru_cache(maxsize=1)
+def _template_environment() -> Environment:
+    return Environment(loader=FileSystemLoader(TEMPLATE_DIR), autoescape=select_autoescape())
+
+
+def render_email(
+    sender: str, subject: str, recipients: list[str], body: dict[str, Any], template: str
+) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = sender
+    message["To"] = ", ".join(recipients)
+    message["Subject"] = subject
+    message.set_content(str(body.get("data", "")))
+    message.add_alternative(
+        _template_environment().get_template(template).render(body=body), subtype="html"
+    )
+    return message
+
+
+class SMTPConnection:
+    # One connection, opened on first send and reopened after it broke.
+    # Not safe for concurrent use, every outbox worker task owns one.
+    def __init__(self, config: Email) -> None:
+        self.config = config
+        self._smtp: aiosmtplib.SMTP | None = None
+
+    async def _connected(self) -> aiosmtplib.SMTP:
+        if self._smtp is None or not self._smtp.is_connected:
+            smtp = aiosmtplib.SMTP(
+                hostname=self.config.server,
+                port=self.config.port,
+                use_tls=self.config.use_tls,
+                start_tls=self.config.start_tls,
+                timeout=self.config.timeout_secs,
+            )
+            await smtp.connect()
+            if self.config.username:
+                await smtp.login(self.config.username, self.config.password.get_secret_value())
+            self._smtp = smtp
+        return self._smtp
+
+    async def send(self, message: EmailMessage) -> None:
+        if not self.config.enabled:
+            logger.info("email disabled, not sending %r to %s", message["Subject"], message["To"])
+            return
+        start = time.perf_counter()
+        result = "error"
+        try:
+            smtp = await self._connected()
+            await smtp.send_message(message)
+            result = "sent"
+        except aiosmtplib.SMTPServerDisconnected:
+            self._smtp = None
+            raise
+        finally:
+            EMAIL_SEND_DURATION.labels(result).observe(time.perf_counter() - start)
+
+    async def close(self) -> None:
+        if self._smtp is not None and self._smtp.is_connected:
+            try:
+                await self._smtp.quit()
+            except aiosmtplib.SMTPException:
+                self._smtp.close()
+        self._smtp = None
@@ -0,0 +1,16 @@
+from app.core.storage.backends import (
+    BlobBackend,
+    LocalBlobBackend,
+    S3BlobBackend,
+    S3Bucket,
+)
+from app.core.storage.resume_store import ResumeStore, get_resume_store
+
+__all__ = [
+    "BlobBackend",
+    "LocalBlobBackend",
+    "ResumeStore",
+    "S3BlobBackend",
+    "S3Bucket",
+    "get_resume_store",
+]
@@ -0,0 +1,184 @@
+# Blob storage backends used by the resume store.
+#
+# Blobs are addressed by the SHA-256 hex digest of their content, backends only
+# need to know how to check, store and remove a blob for a digest. Every method
+# is async, blocking IO runs in the threadpool.
+#
+# S3BlobBackend speaks plain S3 REST with AWS Signature V4 over urllib3, so it
+# works against AWS S3 as well as local stand-ins like MinIO without extra deps.
+# https://docs.aws.amazon.com/AmazonS3/latest/API/sig-v4-header-based-auth.html
+
+import abc
+import datetime
+import hashlib
+import hmac
+import os
+import shutil
+from contextlib import suppress
+from dataclasses import dataclass
+from http import HTTPStatus
+from pathlib import Path
+from typing import BinaryIO
+from urllib.parse import quote, urlsplit
+
+import urllib3
+from starlette.concurrency import run_in_threadpool
+
+EMPTY_PAYLOAD_SHA256 = hashlib.sha256(b"").hexdigest()
+
+
+class BlobBackend(abc.ABC):
+    @abc.abstractmethod
+    async def exists(self, digest: str) -> bool: ...
+
+    # Moves the staged file at source into the store, source is consumed
+    @abc.abstractmethod
+    async def put(self, digest: str, source: Path) -> None: ...
+
+    @abc.abstractmethod
+    async def delete(self, digest: str) -> None: ...
+
+
+class LocalBlobBackend(BlobBackend):
+    # Blobs live at root/ab/cd/abcd..., two levels of 256 shards keep
+    # directories small even with millions of resumes
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+
+    def path_for(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest[2:4] / digest
+
+    async def exists(self, digest: str) -> bool:
+        return await run_in_threadpool(self.path_for(digest).is_file)
+
+    async def put(self, digest: str, source: Path) -> None:
+        def move() -> None:
+            destination = self.path_for(digest)
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            # os.replace is atomic only within one filesystem, shutil.move
+            # falls back to copy + delete when staging lives elsewhere
+            try:
+                os.replace(source, destination)
+            except OSError:
+                shutil.move(source, destination)
+
+        await run_in_threadpool(move)
+
+    async def delete(self, digest: str) -> None:
+        def remove() -> None:
+            with suppress(FileNotFoundError):
+                self.path_for(digest).unlink()
+
+        await run_in_threadpool(remove)
+
+
+@dataclass(frozen=True)
+class S3Bucket:
+    endpoint_url: str
+    name: str
+    region: str
+    key_prefix: str = ""
+
+
+class S3BlobBackend(BlobBackend):
+    def __init__(self, bucket: S3Bucket, access_key: str, secret_key: str) -> None:
+        self.endpoint_url = bucket.endpoint_url.rstrip("/")
+        self.host = urlsplit(self.endpoint_url).netloc
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self._http = urllib3.PoolManager()
+
+    def _object_path(self, digest: str) -> str:
+        # Path style addressing, virtual hosted buckets are not needed for
+        # MinIO and keep the signing logic simple
+        return "/" + quote(f"{self.bucket.name}/{self.bucket.key_prefix}{digest}")
+
+    def _sign(self, method: str, path: str, payload_sha256: str) -> dict[str, str]:
+        now = datetime.datetime.now(datetime.UTC)
+        amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+        date_stamp = now.strftime("%Y%m%d")
+        scope = f"{date_stamp}/{self.bucket.region}/s3/aws4_request"
+
+        headers = {
+            "host": self.host,
+            "x-amz-content-sha256": payload_sha256,
+            "x-amz-date": amz_date,
+        }
+        signed_headers = ";".join(headers)
+        canonical_request = "\n".join(
+            [
+                method,
+                path,
+                "",
+                "".join(f"{name}:{value}\n" for name, value in headers.items()),
+                signed_headers,
+                payload_sha256,
+            ]
+        )
+        string_to_sign = "\n".join(
+            [
+                "AWS4-HMAC-SHA256",
+                amz_date,
+                scope,
+                hashlib.sha256(canonical_request.encode()).hexdigest(),
+            ]
+        )
+
+        key = f"AWS4{self.secret_key}".encode()
+        for part in (date_stamp, self.bucket.region, "s3", "aws4_request"):
+            key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+        signature = hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+
+        headers["authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+            f"SignedHeaders={signed_headers}, Signature={signature}"
+        )
+        return headers
+
+    def _request(
+        self, method: str, digest: str, body: BinaryIO | None = None
+    ) -> urllib3.BaseHTTPResponse:
+        path = self._object_path(digest)
+        if body is None:
+            headers = self._sign(method, path, EMPTY_PAYLOAD_SHA256)
+        else:
+            # blobs are content addressed, so the digest doubles as the
+            # signed payload hash S3 verifies on arrival
+            headers = self._sign(method, path, digest)
+            headers["content-length"] = str(os.fstat(body.fileno()).st_size)
+        return self._http.request(
+            method,
+            self.endpoint_url + path,
+            body=body,
+            headers=headers,
+            preload_content=True,
+        )
+
+    @staticmethod
+    def _raise_for_status(response: urllib3.BaseHTTPResponse, *allowed: int) -> None:
+        if response.status >= HTTPStatus.MULTIPLE_CHOICES and (
+            response.status not in allowed
+        ):
+            raise OSError(
+                f"S3 request failed with {response.status}: {response.data[:512]!r}"
+            )
+
+    async def exists(self, digest: str) -> bool:
+        response = await run_in_threadpool(self._request, "HEAD", digest)
+        self._raise_for_status(response, HTTPStatus.NOT_FOUND)
+        return response.status == HTTPStatus.OK
+
+    async def put(self, digest: str, source: Path) -> None:
+        def upload() -> None:
+            with open(source, "rb") as body:
+                response = self._request("PUT", digest, body)
+            self._raise_for_status(response)
+            source.unlink()
+
+        await run_in_threadpool(upload)
+
+    async def delete(self, digest: str) -> None:
+        response = await run_in_threadpool(self._request, "DELETE", digest)
+        self._raise_for_status(response, HTTPStatus.NOT_FOUND)
@@ -0,0 +1,208 @@
+# Content addressed, deduplicating resume store.
+#
+# Flow for an upload:
+# 1. stage()   streams the upload into a staging file, hashing it on the way
+# 2. acquire() bumps the blob ref count inside the caller's DB transaction,
+#    release() drops the count for a resume that is no longer referenced
+# 3. persist() moves the staged file into the backend, or just drops it when
+#    identical content is already stored. It is meant to run as a background
+#    task so backend writes (possibly S3) stay off the request critical path.
+#    The DB row already points at the digest by then, so the staged file is
+#    only dropped once the backend has the blob. After persist_attempts
+#    failures it is parked under pending_dir, named by its digest, and
+#    retry_pending() (run by the maintenance job) tries again later.
+# 4. discard() removes a staged file when the request fails before persist
+#
+# Blobs are never deleted inline, collect_garbage() removes rows that stayed at
+# zero references for longer than the grace period along with their files.
+
+import asyncio
+import datetime
+import logging
+import os
+from collections import Counter
+from collections.abc import Iterable
+from contextlib import suppress
+from functools import lru_cache
+from pathlib import Path
+from typing import BinaryIO
+
+from fastapi import UploadFile
+from sqlalchemy import BigInteger, String, column, delete, func, select, update, values
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import get_settings
+from app.core.storage.backends import (
+    BlobBackend,
+    LocalBlobBackend,
+    S3BlobBackend,
+    S3Bucket,
+)
+from app.core.uploads import StagedUpload, stage_fileobj, stage_upload
+from app.models import ResumeBlob
+
+logger = logging.getLogger(__name__)
+
+
+class ResumeStore:
+    def __init__(self, backend: BlobBackend) -> None:
+        self.backend = backend
+
+    async def stage(self, file: UploadFile) -> StagedUpload:
+        return await stage_upload(file, get_settings().resume.staging_dir)
+
+    async def stage_fileobj(self, source: BinaryIO) -> StagedUpload:
+        return await run_in_threadpool(
+            stage_fileobj, source, get_settings().resume.staging_dir
+        )
+
+    async def acquire(
+        self, session: AsyncSession, staged: Iterable[StagedUpload]
+    ) -> None:
+        refs: Counter[str] = Counter()
+        sizes: dict[str, int] = {}
+        for upload in staged:
+            refs[upload.sha256] += 1
+            sizes[upload.sha256] = upload.size
+        if not refs:
+            return
+
+        stmt = insert(ResumeBlob).values(
+            [
+                {"digest": digest, "size": sizes[digest], "ref_count": count}
+                for digest, count in refs.items()
+            ]
+        )
+        await session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[ResumeBlob.digest],
+                set_={
+                    "ref_count": ResumeBlob.ref_count + stmt.excluded.ref_count,
+                    "update_time": func.now(),
+                },
+            )
+        )
+
+    async def release(self, session: AsyncSession, digests: Iterable[str]) -> None:
+        refs = Counter(digests)
+        if not refs:
+            return
+
+        released = values(
+            column("digest", String), column("count", BigInteger), name="released"
+        ).data(list(refs.items()))
+        await session.execute(
+            update(ResumeBlob)
+            .where(ResumeBlob.digest == released.c.digest)
+            .values(ref_count=func.greatest(ResumeBlob.ref_count - released.c.count, 0))
+        )
+
+    async def persist(self, staged: StagedUpload) -> None:
+        settings = get_settings().resume
+        error: Exception | None = None
+        for attempt in range(settings.persist_attempts):
+            if attempt:
+                await asyncio.sleep(settings.persist_retry_secs * 2 ** (attempt - 1))
+            try:
+                await self._put(staged.sha256, staged.path)
+            except Exception as exc:
+                error = exc
+            else:
+                await self.discard(staged)
+                return
+
+        logger.error(
+            "storing resume %s failed, parking it for a retry",
+            staged.sha256,
+            exc_info=error,
+        )
+        await run_in_threadpool(self._park, staged)
+
+    async def retry_pending(self) -> int:
+        # Blobs parked by persist, their rows already reference the digest
+        pending_dir = get_settings().resume.pending_dir
+        paths = await run_in_threadpool(
+            lambda: sorted(pending_dir.iterdir()) if pending_dir.is_dir() else []
+        )
+        stored = 0
+        for path in paths:
+            try:
+                await self._put(path.name, path)
+            except FileNotFoundError:
+                # taken by another worker on this host
+                continue
+            with suppress(FileNotFoundError):
+                await run_in_threadpool(path.unlink)
+            stored += 1
+        return stored
+
+    async def _put(self, digest: str, path: Path) -> None:
+        # put consumes path, when the blob is already stored path stays
+        if not await self.backend.exists(digest):
+            await self.backend.put(digest, path)
+
+    @staticmethod
+    def _park(staged: StagedUpload) -> None:
+        pending_dir = get_settings().resume.pending_dir
+        pending_dir.mkdir(parents=True, exist_ok=True)
+        os.replace(staged.path, pending_dir / staged.sha256)
+
+    async def discard(self, staged: StagedUpload) -> None:
+        def remove() -> None:
+            with suppress(FileNotFoundError):
+                staged.path.unlink()
+
+        await run_in_threadpool(remove)
+
+    async def collect_garbage(
+        self, session: AsyncSession, batch_size: int = 1000
+    ) -> int:
+        # The rows stay locked until their objects are gone. A concurrent
+        # acquire() of the same digest waits on the lock and inserts a fresh
+        # row afterwards, so its persist() finds the object missing and puts
+        # it again instead of trusting an object that is about to be deleted.
+        expired_before = datetime.datetime.now(datetime.UTC) - datetime.timedelta(
+            seconds=get_settings().resume.gc_grace_secs
+        )
+        digests = (
+            await session.scalars(
+                select(ResumeBlob.digest)
+                .where(
+                    ResumeBlob.ref_count == 0,
+                    ResumeBlob.update_time < expired_before,
+                )
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+            )
+        ).all()
+
+        for digest in digests:
+            await self.backend.delete(digest)
+        if digests:
+            await session.execute(
+                delete(ResumeBlob).where(ResumeBlob.digest.in_(digests))
+            )
+        await session.commit()
+        return len(digests)
+
+
+@lru_cache(maxsize=1)
+def get_resume_store() -> ResumeStore:
+    settings = get_settings().resume
+    backend: BlobBackend
+    if settings.backend == "s3":
+        backend = S3BlobBackend(
+            S3Bucket(
+                endpoint_url=settings.s3_endpoint_url,
+                name=settings.s3_bucket,
+                region=settings.s3_region,
+                key_prefix=settings.s3_key_prefix,
+            ),
+            access_key=settings.s3_access_key,
+            secret_key=settings.s3_secret_key.get_secret_value(),
+        )
+    else:
+        backend = LocalBlobBackend(settings.storage_dir)
+    return ResumeStore(backend)
@@ -0,0 +1,152 @@
+# Streaming helpers for multipart file uploads.
+#
+# Uploads are copied chunk by chunk into a temporary staging file and hashed
+# with SHA-256 on the way through. Blocking file IO and hashing are pushed to
+# the threadpool so the event loop never waits on disk, and the configured size
+# limit is enforced while reading. Staged files are handed over to the resume
+# store (see app/core/storage) which moves them to their final location.
+
+import hashlib
+import os
+import tempfile
+from contextlib import suppress
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO
+
+from fastapi import HTTPException, UploadFile, status
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.api import api_messages
+from app.core.config import get_settings
+from app.core.metrics import UPLOAD_BYTES
+
+# Slack on top of the file size limit for multipart boundaries and form fields
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+@dataclass(frozen=True)
+class StagedUpload:
+    path: Path
+    size: int
+    sha256: str
+
+
+class ResumeTooLarge(HTTPException):
+    # A 413 unless caught, bulk intake reports it per row instead
+    def __init__(self) -> None:
+        super().__init__(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=api_messages.RESUME_TOO_LARGE,
+        )
+
+
+def _raise_too_large() -> None:
+    raise ResumeTooLarge()
+
+
+async def stage_upload(file: UploadFile, staging_dir: Path) -> StagedUpload:
+    settings = get_settings().resume
+
+    if file.size is not None and file.size > settings.max_upload_bytes:
+        _raise_too_large()
+
+    await run_in_threadpool(staging_dir.mkdir, parents=True, exist_ok=True)
+    fd, tmp_name = await run_in_threadpool(
+        tempfile.mkstemp, dir=staging_dir, prefix=".upload-"
+    )
+
+    hasher = hashlib.sha256()
+    written = 0
+    try:
+        with os.fdopen(fd, "wb") as tmp_file:
+
+            def write_chunk(chunk: bytes) -> None:
+                hasher.update(chunk)
+                tmp_file.write(chunk)
+
+            while chunk := await file.read(settings.upload_chunk_bytes):
+                written += len(chunk)
+                if written > settings.max_upload_bytes:
+                    _raise_too_large()
+                await run_in_threadpool(write_chunk, chunk)
+    except BaseException:
+        with suppress(FileNotFoundError):
+            os.unlink(tmp_name)
+        raise
+
+    UPLOAD_BYTES.observe(written)
+    return StagedUpload(path=Path(tmp_name), size=written, sha256=hasher.hexdigest())
+
+
+def stage_fileobj(source: BinaryIO, staging_dir: Path) -> StagedUpload:
+    # Blocking twin of stage_upload for files that are already local, like
+    # members of an uploaded zip archive. Call it through run_in_threadpool.
+    settings = get_settings().resume
+    staging_dir.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=staging_dir, prefix=".upload-")
+
+    hasher = hashlib.sha256()
+    written = 0
+    try:
+        with os.fdopen(fd, "wb") as tmp_file:
+            while chunk := source.read(settings.upload_chunk_bytes):
+                written += len(chunk)
+                if written > settings.max_upload_bytes:
+                    _raise_too_large()
+                hasher.update(chunk)
+                tmp_file.write(chunk)
+    except BaseException:
+        with suppress(FileNotFoundError):
+            os.unlink(tmp_name)
+        raise
+
+    UPLOAD_BYTES.observe(written)
+    return StagedUpload(path=Path(tmp_name), size=written, sha256=hasher.hexdigest())
+
+
+class UploadSizeLimitMiddleware:
+    # FastAPI parses the whole form before any dependency runs, so the body
+    # limit has to live in front of the router. Requests announcing a larger
+    # Content-Length are refused before a single byte is read, chunked ones are
+    # cut off with a 413 as soon as the running total crosses the limit.
+
+    def __init__(self, app: ASGIApp, limits: dict[str, int]) -> None:
+        self.app = app
+        self.limits = {
+            path: limit + MULTIPART_OVERHEAD_BYTES for path, limit in limits.items()
+        }
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope["headers"]:
+            if name == b"content-length" and value.isdigit() and int(value) > limit:
+                await self._reject(scope, receive, send)
+                return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    _raise_too_large()
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    @staticmethod
+    async def _reject(scope: Scope, receive: Receive, send: Send) -> None:
+        response = JSONResponse(
+            {"detail": api_messages.RESUME_TOO_LARGE},
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        )
+        await response(scope, receive, send)
@@ -1,9 +1,48 @@
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 
 from app.api.api_router import api_router, auth_router
 from app.core.config import get_settings
+from app.core.database_session import dispose_async_engine
+from app.core.email_outbox import OutboxWorkers
+from app.core.invalidation import InvalidationListener
+from app.core.maintenance import MaintenanceJob
+from app.core.metrics import MetricsMiddleware, mark_process_dead, metrics_endpoint
+from app.core.openapi import use_prebuilt_openapi
+from app.core.query_stats import QueryStatsMiddleware
+from app.core.response_cache import close_response_cache
+from app.core.security.password import get_password_hasher
+from app.core.uploads import UploadSizeLimitMiddleware
+
+settings = get_settings()
+
+
+# Nothing expensive happens at import, the DB engine, bcrypt pool and OpenAPI
+# schema are all created on first use and torn down here
+# The email outbox workers deliver mail written by the endpoints, the
+# maintenance job purges used refresh tokens and unreferenced resume blobs
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    invalidation_listener = InvalidationListener()
+    if settings.cache.listen_for_invalidations:
+        invalidation_listener.start()
+    outbox_workers = OutboxWorkers(settings.email)
+    outbox_workers.start()
+    maintenance_job = MaintenanceJob(settings.maintenance)
+    maintenance_job.start()
+    yield
+    await maintenance_job.stop()
+    await outbox_workers.stop()
+    await invalidation_listener.stop()
+    await close_response_cache()
+    get_password_hasher().shutdown()
+    await dispose_async_engine()
+    mark_process_dead()
+
 
 app = FastAPI(
     title="Take Home Assignment",
@@ -11,17 +50,21 @@ app = FastAPI(
     description="https://github.com/Brandon-mg/Python_API_Project",
     openapi_url="/openapi.json",
     docs_url="/",
+    lifespan=lifespan,
 )
 
 app.include_router(auth_router)
 app.include_router(api_router)
 
+if settings.metrics.enabled:
+    app.add_api_route("/metrics", metrics_endpoint, include_in_schema=False)
+
+use_prebuilt_openapi(app, settings.openapi_schema_file)
+
 # Sets all CORS enabled origins
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=[
-        str(origin) for origin in get_settings().security.backend_cors_origins
-    ],
+    allow_origins=[str(origin) for origin in settings.security.backend_cors_origins],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
@@ -30,5 +73,24 @@ app.add_middleware(
 # Guards against HTTP Host Header attacks
 app.add_middleware(
     TrustedHostMiddleware,
-    allowed_hosts=get_settings().security.allowed_hosts,
+    allowed_hosts=settings.security.allowed_hosts,
+)
+
+# Refuses resume uploads above the configured size before the body is parsed
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    limits={
+        "/users/filelead": settings.resume.max_upload_bytes,
+        "/users/fileleads": settings.resume.max_bulk_upload_bytes,
+    },
 )
+
+# Query count and database time per request, Server-Timing header and
+# warnings for requests over the query budget
+if settings.query_stats.enabled:
+    app.add_middleware(QueryStatsMiddleware, config=settings.query_stats)
+
+# Request latency and in flight requests for /metrics, added last so it wraps
+# all of the above
+if settings.metrics.enabled:
+    app.add_middleware(MetricsMiddleware)
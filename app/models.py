@@ -13,12 +13,32 @@
 # alembic upgrade head
 
 
-import uuid
 from datetime import datetime
-
-from sqlalchemy import BigInteger, Boolean, DateTime, ForeignKey, String, Uuid, func
+from typing import Any
+
+from sqlalchemy import (
+    JSON,
+    BigInteger,
+    Boolean,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    Sequence,
+    String,
+    Text,
+    Uuid,
+    func,
+    text,
+)
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
+from app.core.ids import new_id
+
+# Keys of rows inserted outside the app, the app sends its own (app/core/ids.py)
+UUID_DEFAULT = text("uuid_generate_v7()")
+
 
 class Base(DeclarativeBase):
     create_time: Mapped[datetime] = mapped_column(
@@ -31,9 +51,13 @@ class Base(DeclarativeBase):
 
 class Attorney(Base):
     __tablename__ = "attorneys"
+    __table_args__ = (
+        # keyset pagination, see app/api/pagination.py
+        Index("ix_attorneys_create_time_attorney_id", "create_time", "attorney_id"),
+    )
 
     attorney_id: Mapped[str] = mapped_column(
-        Uuid(as_uuid=False), primary_key=True, default=lambda _: str(uuid.uuid4())
+        Uuid(as_uuid=False), primary_key=True, default=lambda _: new_id(), server_default=UUID_DEFAULT
     )
     name: Mapped[str] =mapped_column(String(128), nullable=False)
     email: Mapped[str] = mapped_column(
@@ -45,22 +69,36 @@ class Attorney(Base):
 
 class Prospect(Base):
     __tablename__ = "prospects"
+    __table_args__ = (
+        Index("ix_prospects_create_time_prospect_id", "create_time", "prospect_id"),
+    )
 
     prospect_id: Mapped[str] = mapped_column(
-        Uuid(as_uuid=False), primary_key=True, default=lambda _: str(uuid.uuid4())
+        Uuid(as_uuid=False), primary_key=True, default=lambda _: new_id(), server_default=UUID_DEFAULT
     )
     email: Mapped[str] = mapped_column(
         String(256), nullable=False, unique=True, index=True
     )
     name: Mapped[str] = mapped_column(String(128), nullable=False)
+    # SHA-256 hex digest of the resume blob, see ResumeBlob
     resume: Mapped[str] = mapped_column(String(128), nullable=False)
     leads: Mapped[list["Lead"]] = relationship(back_populates="prospect")
 
 
+# Lead indexes serve the list, pagination and export queries and the foreign
+# key cascades from attorneys and prospects. benchmarks/query_plans.py checks
+# that the hot queries keep using them.
 class Lead(Base):
     __tablename__ = "leads"
+    __table_args__ = (
+        Index("ix_leads_state_create_time_lead_id", "state", "create_time", "lead_id"),
+        Index("ix_leads_create_time_lead_id", "create_time", "lead_id"),
+        Index("ix_leads_attorney_id_state", "attorney_id", "state"),
+        Index("ix_leads_attorney_id_create_time_lead_id", "attorney_id", "create_time", "lead_id"),
+        Index("ix_leads_prospect_id", "prospect_id"),
+    )
     lead_id: Mapped[str] = mapped_column(
-        Uuid(as_uuid=False), primary_key=True, default=lambda _: str(uuid.uuid4())
+        Uuid(as_uuid=False), primary_key=True, default=lambda _: new_id(), server_default=UUID_DEFAULT
     )
     attorney_id: Mapped[str] = mapped_column(
         ForeignKey("attorneys.attorney_id", ondelete="CASCADE"),
@@ -74,12 +112,19 @@ class Lead(Base):
     attorney: Mapped["Attorney"] = relationship(back_populates="leads")
     prospect: Mapped["Prospect"] = relationship(back_populates="leads")
 
+# Only the SHA-256 of a refresh token is stored, see app/core/security/refresh_token.py
+# Used and expired rows are purged by app/core/maintenance.py
 class RefreshToken(Base):
     __tablename__ = "refresh_token"
+    __table_args__ = (
+        Index("ix_refresh_token_exp", "exp"),
+        Index("ix_refresh_token_attorney_id", "attorney_id"),
+        Index("ix_refresh_token_used_update_time", "update_time", postgresql_where=text("used")),
+    )
 
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
-    refresh_token: Mapped[str] = mapped_column(
-        String(512), nullable=False, unique=True, index=True
+    token_hash: Mapped[bytes] = mapped_column(
+        LargeBinary(32), nullable=False, unique=True, index=True
     )
     used: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
     exp: Mapped[int] = mapped_column(BigInteger, nullable=False)
@@ -87,3 +132,72 @@ class RefreshToken(Base):
         ForeignKey("attorneys.attorney_id", ondelete="CASCADE"),
     )
     attorney: Mapped["Attorney"] = relationship(back_populates="refresh_tokens")
+
+
+# Content addressed resume blobs, one row per distinct file content.
+# ref_count tracks how many prospects point at the blob, rows dropping to zero
+# are garbage collected together with the stored file after a grace period.
+class ResumeBlob(Base):
+    __tablename__ = "resume_blobs"
+    __table_args__ = (
+        # garbage collection candidates only, see ResumeStore.collect_garbage
+        Index(
+            "ix_resume_blobs_unreferenced_update_time",
+            "update_time",
+            postgresql_where=text("ref_count = 0"),
+        ),
+    )
+
+    digest: Mapped[str] = mapped_column(String(64), primary_key=True)
+    size: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    ref_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+# Number of leads per attorney and state, kept current by every code path that
+# creates leads or changes their state (see app/core/lead_stats.py).
+# Used by the least loaded assignment strategy instead of COUNT(*) on leads.
+class AttorneyLeadCount(Base):
+    __tablename__ = "attorney_lead_counts"
+    __table_args__ = (
+        Index("ix_attorney_lead_counts_state_lead_count", "state", "lead_count"),
+    )
+
+    attorney_id: Mapped[str] = mapped_column(
+        ForeignKey("attorneys.attorney_id", ondelete="CASCADE"), primary_key=True
+    )
+    state: Mapped[str] = mapped_column(String(64), primary_key=True)
+    lead_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+# Shared by all workers for round robin attorney assignment
+ATTORNEY_ASSIGNMENT_SEQ = Sequence("attorney_assignment_seq", metadata=Base.metadata)
+
+
+# Emails waiting for delivery, written in the same transaction as the lead
+# they are about and sent by the outbox workers (see app/core/email_outbox.py).
+# status: PENDING -> SENDING (claimed) -> SENT, or FAILED after max attempts.
+EMAIL_OUTBOX_UNSENT = text("status IN ('PENDING', 'SENDING')")
+
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+    __table_args__ = (
+        Index(
+            "ix_email_outbox_unsent_next_attempt_time",
+            "next_attempt_time",
+            postgresql_where=EMAIL_OUTBOX_UNSENT,
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    subject: Mapped[str] = mapped_column(String(256), nullable=False)
+    recipients: Mapped[list[str]] = mapped_column(JSON, nullable=False)
+    body: Mapped[dict[str, Any]] = mapped_column(JSON, nullable=False)
+    template: Mapped[str] = mapped_column(String(128), nullable=False, default="email.html")
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default="PENDING")
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    next_attempt_time: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+    last_error: Mapped[str | None] = mapped_column(Text)
+    sent_time: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
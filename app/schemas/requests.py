@@ -1,5 +1,9 @@
+import uuid
+from dataclasses import dataclass
+from typing import Annotated, Literal
+
 from fastapi import UploadFile, Form
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 
 class BaseRequest(BaseModel):
     pass
@@ -17,9 +21,19 @@ class ProspectCreateRequest(BaseRequest):
     lname: str = Form(...)
     email: EmailStr = Form(...)
     file: UploadFile = Form(...)
+
+# Form fields of /users/filelead next to the file, endpoints take it with Depends()
+@dataclass(frozen=True)
+class ProspectForm:
+    fname: Annotated[str, Form()]
+    lname: Annotated[str, Form()]
+    email: Annotated[str, Form()]
     
 class LeadUpdate(BaseRequest):
     email: EmailStr
     password: str
     lead_id: str
 
+class LeadTransitionRequest(BaseRequest):
+    lead_ids: list[uuid.UUID] = Field(min_length=1, max_length=1000)
+    state: Literal["PENDING", "REACHED_OUT"]
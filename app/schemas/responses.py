@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic import BaseModel, ConfigDict, EmailStr
 
 class BaseResponse(BaseModel):
@@ -20,11 +22,54 @@ class ProspectResponse(BaseResponse):
     email: EmailStr
     lead_id: str
 
+class BulkLeadResult(BaseResponse):
+    # position of the row in the manifest, starting at 1
+    row: int
+    email: str
+    created: bool
+    prospect_id: str | None = None
+    attorney_id: str | None = None
+    lead_id: str | None = None
+    detail: str | None = None
+
+class BulkLeadResponse(BaseResponse):
+    created: int
+    failed: int
+    results: list[BulkLeadResult]
+
 class IDList(BaseResponse):
     ids: list[str]
 
+class IDPage(BaseResponse):
+    ids: list[str]
+    # pass back as "cursor" to get the next page, null on the last page
+    next_cursor: str | None
+
 class LeadInfo(BaseResponse):
     prospect_id: str
     attorney_id: str
     lead_id: str
-    state: str
\ No newline at end of file
+    state: str
+
+TransitionOutcome = Literal["updated", "unchanged", "not_found", "invalid_transition"]
+
+class LeadTransitionResult(BaseResponse):
+    lead_id: str
+    # updated, unchanged (already in the state), not_found (no such lead of
+    # this attorney) or invalid_transition (not allowed from previous_state)
+    outcome: TransitionOutcome
+    previous_state: str | None = None
+    state: str | None = None
+
+class LeadTransitionResponse(BaseResponse):
+    updated: int
+    results: list[LeadTransitionResult]
+
+class AttorneyLeadStats(BaseResponse):
+    attorney_id: str
+    # leads per state, states the attorney never had a lead in are left out
+    counts: dict[str, int]
+
+class LeadStatsResponse(BaseResponse):
+    totals: dict[str, int]
+    attorneys: list[AttorneyLeadStats]
@@ -0,0 +1,133 @@
+# Test setup.
+#
+# Every pytest-xdist worker gets a database of its own (test_db_gw0, ...),
+# created next to the configured DATABASE__DB and migrated to head with
+# alembic, so the triggers, functions and sequences of the migrations exist
+# as well. The code under test commits, so instead of rolling back, all
+# tables are truncated after each test. Engines and cached attorneys are
+# tied to the test's event loop and data, they are dropped after each test.
+
+import asyncio
+import os
+import subprocess
+import sys
+from collections.abc import AsyncIterator, Iterator
+
+import httpx
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app.core import database_session
+from app.core.assignment import get_attorney_directory
+from app.core.attorney_cache import get_attorney_cache
+from app.core.config import PROJECT_DIR, get_settings
+from app.core.response_cache import get_response_cache
+from app.core.security.jwt import create_jwt_token, get_verified_token_cache
+from app.core.security.password import get_password_hash
+from app.main import app
+from app.models import Attorney, Base, Lead, Prospect
+
+
+async def _recreate_database(name: str) -> None:
+    engine = create_async_engine(
+        get_settings().sqlalchemy_database_uri, isolation_level="AUTOCOMMIT"
+    )
+    async with engine.connect() as connection:
+        await connection.execute(text(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)'))
+        await connection.execute(text(f'CREATE DATABASE "{name}"'))
+    await engine.dispose()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def test_database(tmp_path_factory: pytest.TempPathFactory) -> Iterator[str]:
+    name = f"test_db_{os.getenv('PYTEST_XDIST_WORKER', 'gw0')}"
+    asyncio.run(_recreate_database(name))
+
+    session_mpatch = pytest.MonkeyPatch()
+    session_mpatch.setenv("DATABASE__DB", name)
+    session_mpatch.setenv("SECURITY__PASSWORD_BCRYPT_ROUNDS", "4")
+    session_mpatch.setenv("RESUME__STORAGE_DIR", str(tmp_path_factory.mktemp("resume")))
+    # nothing listens for NOTIFY in tests, caches are cleared after each test
+    session_mpatch.setenv("CACHE__LISTEN_FOR_INVALIDATIONS", "false")
+    session_mpatch.setenv("MAINTENANCE__ENABLED", "false")
+    session_mpatch.setenv("EMAIL__OUTBOX_WORKERS", "0")
+    get_settings.cache_clear()
+
+    # alembic's env.py runs its own event loop and logging setup, so it gets
+    # a process of its own
+    subprocess.run(
+        [sys.executable, "-m", "alembic", "upgrade", "head"],
+        cwd=PROJECT_DIR,
+        env=os.environ.copy(),
+        check=True,
+    )
+    yield name
+
+    session_mpatch.undo()
+    get_settings.cache_clear()
+
+
+@pytest.fixture(autouse=True)
+async def clean_database() -> AsyncIterator[None]:
+    yield
+
+    tables = ", ".join(f'"{table.name}"' for table in Base.metadata.sorted_tables)
+    async with database_session.get_async_session() as session:
+        await session.execute(text(f"TRUNCATE {tables} RESTART IDENTITY CASCADE"))
+        await session.commit()
+    await database_session.dispose_async_engine()
+    get_attorney_directory().invalidate()
+    get_attorney_cache().clear()
+    get_verified_token_cache().clear()
+    get_response_cache().clear()
+
+
+@pytest.fixture
+async def session() -> AsyncIterator[AsyncSession]:
+    async with database_session.get_async_session() as session:
+        yield session
+
+
+@pytest.fixture
+async def client() -> AsyncIterator[httpx.AsyncClient]:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://localhost"
+    ) as client:
+        yield client
+
+
+@pytest.fixture
+async def attorney(session: AsyncSession) -> Attorney:
+    attorney = Attorney(
+        name="Attorney",
+        email="attorney@example.com",
+        hashed_password=get_password_hash("attorney-password"),
+    )
+    session.add(attorney)
+    await session.commit()
+    return attorney
+
+
+@pytest.fixture
+def auth_headers(attorney: Attorney) -> dict[str, str]:
+    access_token = create_jwt_token(attorney.attorney_id).access_token
+    return {"Authorization": f"Bearer {access_token}"}
+
+
+@pytest.fixture
+async def lead(session: AsyncSession, attorney: Attorney) -> Lead:
+    prospect = Prospect(
+        name="Prospect", email="prospect@example.com", resume="resume.pdf"
+    )
+    session.add(prospect)
+    await session.flush()
+    lead = Lead(
+        attorney_id=attorney.attorney_id,
+        prospect_id=prospect.prospect_id,
+        state="PENDING",
+    )
+    session.add(lead)
+    await session.commit()
+    return lead
@@ -0,0 +1,199 @@
+import asyncio
+import time
+import uuid
+from collections import Counter
+
+import httpx
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api import api_messages
+from app.core.attorney_cache import get_attorney_cache
+from app.core.security.password import get_password_hasher
+from app.core.security.refresh_token import (
+    generate_refresh_token,
+    hash_refresh_token,
+    refresh_token_exp,
+)
+from app.models import Attorney, Lead, RefreshToken
+
+NO_LEAD = str(uuid.UUID(int=0))
+
+
+async def test_register_and_login(client: httpx.AsyncClient) -> None:
+    response = await client.post(
+        "/auth/register",
+        json={
+            "name": "Attorney",
+            "email": "new@example.com",
+            "password": "new-password",
+        },
+    )
+    assert response.status_code == 201
+
+    response = await client.post(
+        "/auth/access-token",
+        data={"username": "new@example.com", "password": "new-password"},
+    )
+    assert response.status_code == 200
+    assert response.json()["access_token"]
+    assert response.json()["refresh_token"]
+
+
+async def test_login_with_wrong_password(
+    client: httpx.AsyncClient, attorney: Attorney
+) -> None:
+    response = await client.post(
+        "/auth/access-token",
+        data={"username": attorney.email, "password": "wrong-password"},
+    )
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": api_messages.PASSWORD_INVALID}
+
+
+async def test_concurrent_refreshes_rotate_a_token_once(
+    client: httpx.AsyncClient, session: AsyncSession, attorney: Attorney
+) -> None:
+    token = generate_refresh_token()
+    session.add(
+        RefreshToken(
+            attorney_id=attorney.attorney_id,
+            token_hash=hash_refresh_token(token),
+            exp=refresh_token_exp(),
+        )
+    )
+    await session.commit()
+
+    responses = await asyncio.gather(
+        *(
+            client.post("/auth/refresh-token", json={"refresh_token": token})
+            for _ in range(20)
+        )
+    )
+
+    outcomes = Counter(
+        "rotated" if response.status_code == 200 else response.json()["detail"]
+        for response in responses
+    )
+    assert outcomes == {"rotated": 1, api_messages.REFRESH_TOKEN_ALREADY_USED: 19}
+    assert await session.scalar(select(func.count()).select_from(RefreshToken)) == 2
+
+
+async def test_login_with_an_unknown_email(client: httpx.AsyncClient) -> None:
+    response = await client.post(
+        "/auth/access-token",
+        data={"username": "nobody@example.com", "password": "password"},
+    )
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": api_messages.PASSWORD_INVALID}
+
+
+async def test_login_fails_fast_while_the_password_hasher_is_busy(
+    client: httpx.AsyncClient, attorney: Attorney, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(get_password_hasher(), "max_pending", 0)
+
+    response = await client.post(
+        "/auth/access-token",
+        data={"username": attorney.email, "password": "attorney-password"},
+    )
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    assert response.json() == {"detail": api_messages.PASSWORD_HASHER_BUSY}
+
+
+async def test_register_an_email_twice(
+    client: httpx.AsyncClient, attorney: Attorney
+) -> None:
+    response = await client.post(
+        "/auth/register",
+        json={"name": "Again", "email": attorney.email, "password": "password"},
+    )
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": api_messages.EMAIL_ADDRESS_ALREADY_USED}
+
+
+@pytest.mark.parametrize(
+    ("changes", "detail"),
+    [
+        ({"email": "nobody@example.com"}, api_messages.PASSWORD_INVALID),
+        ({"password": "wrong-password"}, api_messages.NO_VALID_ATTORNEY_FOUND),
+        ({"lead_id": NO_LEAD}, api_messages.ERROR_CREATING_LEAD),
+    ],
+)
+async def test_updatelead_rejects(
+    client: httpx.AsyncClient, lead: Lead, changes: dict[str, str], detail: str
+) -> None:
+    update = {
+        "email": "attorney@example.com",
+        "password": "attorney-password",
+        "lead_id": lead.lead_id,
+    }
+
+    response = await client.post("/auth/updatelead", json={**update, **changes})
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": detail}
+
+
+async def test_tokens_of_removed_attorneys_are_refused(
+    client: httpx.AsyncClient,
+    session: AsyncSession,
+    attorney: Attorney,
+    auth_headers: dict[str, str],
+) -> None:
+    transition = {"lead_ids": [NO_LEAD], "state": "REACHED_OUT"}
+    response = await client.post(
+        "/leads/transitions", json=transition, headers=auth_headers
+    )
+    assert response.status_code == 200
+    # cached now, the delete evicts it
+    assert get_attorney_cache().get(attorney.attorney_id) is not None
+
+    await session.delete(attorney)
+    await session.commit()
+
+    assert get_attorney_cache().get(attorney.attorney_id) is None
+    response = await client.post(
+        "/leads/transitions", json=transition, headers=auth_headers
+    )
+    assert response.status_code == 401
+    assert response.json() == {"detail": api_messages.JWT_ERROR_USER_REMOVED}
+
+
+async def test_invalid_access_tokens_are_refused(client: httpx.AsyncClient) -> None:
+    response = await client.get(
+        "/exports/leads", headers={"Authorization": "Bearer not-a-jwt"}
+    )
+
+    assert response.status_code == 401
+    assert response.json()["detail"].startswith("Token invalid:")
+
+
+async def test_refresh_unknown_and_expired_tokens(
+    client: httpx.AsyncClient, session: AsyncSession, attorney: Attorney
+) -> None:
+    expired = generate_refresh_token()
+    session.add(
+        RefreshToken(
+            attorney_id=attorney.attorney_id,
+            token_hash=hash_refresh_token(expired),
+            exp=int(time.time()) - 1,
+        )
+    )
+    await session.commit()
+
+    for token, status_code, detail in [
+        (generate_refresh_token(), 404, api_messages.REFRESH_TOKEN_NOT_FOUND),
+        (expired, 400, api_messages.REFRESH_TOKEN_EXPIRED),
+    ]:
+        response = await client.post(
+            "/auth/refresh-token", json={"refresh_token": token}
+        )
+        assert response.status_code == status_code
+        assert response.json() == {"detail": detail}
@@ -0,0 +1,59 @@
+import gzip
+import json
+
+import httpx
+
+from app.models import Lead
+
+FIELDS = [
+    "lead_id",
+    "state",
+    "create_time",
+    "update_time",
+    "prospect_id",
+    "prospect_name",
+    "prospect_email",
+    "attorney_id",
+    "attorney_name",
+    "attorney_email",
+]
+
+
+async def test_export_leads_ndjson(
+    client: httpx.AsyncClient,
+    lead: Lead,
+    auth_headers: dict[str, str],
+) -> None:
+    response = await client.get("/exports/leads", headers=auth_headers)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert (
+        response.headers["content-disposition"] == 'attachment; filename="leads.ndjson"'
+    )
+    (line,) = response.text.splitlines()
+    row = json.loads(line)
+    assert list(row) == FIELDS
+    assert row["lead_id"] == lead.lead_id
+    assert row["state"] == "PENDING"
+
+
+async def test_export_leads_gzip_is_a_gz_download(
+    client: httpx.AsyncClient,
+    lead: Lead,
+    auth_headers: dict[str, str],
+) -> None:
+    response = await client.get(
+        "/exports/leads", params={"format": "csv", "gzip": "true"}, headers=auth_headers
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/gzip"
+    assert "content-encoding" not in response.headers
+    assert (
+        response.headers["content-disposition"] == 'attachment; filename="leads.csv.gz"'
+    )
+    # the body is the gzip file itself, httpx left it as it is
+    header, row = gzip.decompress(response.content).decode().splitlines()
+    assert header == ",".join(FIELDS)
+    assert "PENDING" in row
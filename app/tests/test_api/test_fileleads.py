@@ -0,0 +1,366 @@
+import io
+import json
+import zipfile
+from typing import Any
+
+import httpx
+import pytest
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api import api_messages
+from app.api.endpoints import users
+from app.core import bulk_intake
+from app.core.assignment import get_attorney_directory
+from app.core.config import get_settings
+from app.models import Attorney, EmailOutbox, Lead, Prospect, ResumeBlob
+
+RESUME = b"%PDF-1.4 resume"
+
+
+def _csv(*rows: str) -> bytes:
+    return "\n".join(["fname,lname,email,file", *rows]).encode()
+
+
+def _zip(members: dict[str, bytes]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+async def _file_leads(
+    client: httpx.AsyncClient, files: list[tuple[str, Any]]
+) -> httpx.Response:
+    return await client.post("/users/fileleads", files=files)
+
+
+def _staged_files() -> list[str]:
+    staging_dir = get_settings().resume.staging_dir
+    return [path.name for path in staging_dir.glob("*")] if staging_dir.exists() else []
+
+
+async def _count(session: AsyncSession, model: Any) -> int:
+    return await session.scalar(select(func.count()).select_from(model)) or 0
+
+
+async def test_manifest_with_files_reports_every_row(
+    client: httpx.AsyncClient,
+    session: AsyncSession,
+    attorney: Attorney,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(get_settings().resume, "max_upload_bytes", len(RESUME))
+    manifest = _csv(
+        "Ada,Lovelace,ada@example.com,ada.pdf",
+        "Bad,Email,not-an-email,ada.pdf",
+        "Dup,One,dup@example.com,ada.pdf",
+        "Dup,Two,DUP@example.com,ada.pdf",
+        "No,File,nofile@example.com,missing.pdf",
+        "Too,Large,large@example.com,large.pdf",
+        # several rows may share one upload
+        "Grace,Hopper,grace@example.com,dir/ada.pdf",
+    )
+
+    response = await _file_leads(
+        client,
+        [
+            ("manifest", ("manifest.csv", manifest, "text/csv")),
+            ("files", ("ada.pdf", RESUME, "application/pdf")),
+            ("files", ("large.pdf", RESUME + b"!", "application/pdf")),
+        ],
+    )
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["created"], body["failed"]) == (2, 5)
+    details = {result["row"]: result["detail"] for result in body["results"]}
+    assert details == {
+        1: None,
+        2: api_messages.INVALID_EMAIL,
+        3: api_messages.DUPLICATE_EMAIL_IN_BATCH,
+        4: api_messages.DUPLICATE_EMAIL_IN_BATCH,
+        5: api_messages.MISSING_RESUME_FILE,
+        6: api_messages.RESUME_TOO_LARGE,
+        7: None,
+    }
+    created = body["results"][0]
+    assert created["attorney_id"] == attorney.attorney_id
+    lead = await session.get(Lead, created["lead_id"])
+    assert lead is not None and lead.state == "PENDING"
+    # one blob referenced twice, one outbox email per lead
+    blob = (await session.scalars(select(ResumeBlob))).one()
+    assert blob.ref_count == 2
+    assert await _count(session, EmailOutbox) == 2
+    # persisted or discarded after the response
+    assert _staged_files() == []
+
+
+async def test_json_manifest_updates_existing_prospects(
+    client: httpx.AsyncClient, session: AsyncSession, attorney: Attorney
+) -> None:
+    manifest = json.dumps(
+        [{"fname": "Ada", "lname": "Lovelace", "email": "ada@example.com", "file": "a"}]
+    ).encode()
+    for resume in (b"first resume", b"second resume"):
+        response = await _file_leads(
+            client,
+            [
+                ("manifest", ("manifest.json", manifest, "application/json")),
+                ("files", ("a", resume, "application/pdf")),
+            ],
+        )
+        assert response.json()["created"] == 1
+
+    assert await _count(session, Prospect) == 1
+    assert await _count(session, Lead) == 2
+    refs = dict(
+        (await session.execute(select(ResumeBlob.digest, ResumeBlob.ref_count)))
+        .tuples()
+        .all()
+    )
+    assert sorted(refs.values()) == [0, 1]
+
+
+async def test_zip_archive(
+    client: httpx.AsyncClient,
+    session: AsyncSession,
+    attorney: Attorney,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(get_settings().resume, "max_upload_bytes", len(RESUME))
+    archive = _zip(
+        {
+            "batch/manifest.csv": _csv(
+                "Ada,Lovelace,ada@example.com,ada.pdf",
+                "No,File,nofile@example.com,missing.pdf",
+                "Too,Large,large@example.com,large.pdf",
+                "Bad,Email,not-an-email,ada.pdf",
+            ),
+            "batch/ada.pdf": RESUME,
+            "batch/large.pdf": RESUME + b"!",
+        }
+    )
+
+    response = await _file_leads(
+        client, [("archive", ("batch.zip", archive, "application/zip"))]
+    )
+
+    assert response.status_code == 200
+    assert [result["detail"] for result in response.json()["results"]] == [
+        None,
+        api_messages.MISSING_RESUME_FILE,
+        api_messages.RESUME_TOO_LARGE,
+        api_messages.INVALID_EMAIL,
+    ]
+    assert await _count(session, Lead) == 1
+    assert _staged_files() == []
+
+
+async def test_big_batches_copy_the_leads(
+    client: httpx.AsyncClient,
+    session: AsyncSession,
+    attorney: Attorney,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    count = 5
+    monkeypatch.setattr(bulk_intake, "COPY_THRESHOLD", count)
+    manifest = _csv(
+        *(f"Lead,{number},lead-{number}@example.com,r.pdf" for number in range(count))
+    )
+    archive = _zip({"manifest.csv": manifest, "r.pdf": RESUME})
+
+    response = await _file_leads(
+        client, [("archive", ("batch.zip", archive, "application/zip"))]
+    )
+
+    assert response.json()["created"] == count
+    lead_ids = {result["lead_id"] for result in response.json()["results"]}
+    stored = set(await session.scalars(select(Lead.lead_id)))
+    assert stored == lead_ids
+    # server defaults filled in by COPY
+    assert (
+        await session.scalar(select(func.count()).where(Lead.create_time.is_(None)))
+        == 0
+    )
+
+
+async def test_retries_with_a_fresh_directory_after_an_attorney_was_removed(
+    client: httpx.AsyncClient, session: AsyncSession, attorney: Attorney
+) -> None:
+    # Removed by "another worker": a Core delete skips the ORM events that
+    # invalidate this worker's directory, which still lists the attorney, so
+    # the lead insert fails on the foreign key
+    await get_attorney_directory().get_ids(session)
+    await session.execute(
+        delete(Attorney).where(Attorney.attorney_id == attorney.attorney_id)
+    )
+    replacement = Attorney(name="New", email="new@example.com", hashed_password="x")
+    session.add(replacement)
+    await session.commit()
+
+    response = await _file_leads(
+        client,
+        [
+            (
+                "manifest",
+                ("manifest.csv", _csv("A,B,ab@example.com,a.pdf"), "text/csv"),
+            ),
+            ("files", ("a.pdf", RESUME, "application/pdf")),
+        ],
+    )
+
+    assert response.status_code == 200
+    assert response.json()["results"][0]["attorney_id"] == replacement.attorney_id
+
+
+async def test_rows_fail_without_attorneys(
+    client: httpx.AsyncClient, session: AsyncSession
+) -> None:
+    response = await _file_leads(
+        client,
+        [
+            (
+                "manifest",
+                ("manifest.csv", _csv("A,B,ab@example.com,a.pdf"), "text/csv"),
+            ),
+            ("files", ("a.pdf", RESUME, "application/pdf")),
+        ],
+    )
+
+    assert (
+        response.json()["results"][0]["detail"] == api_messages.NO_VALID_ATTORNEY_FOUND
+    )
+    assert await _count(session, Prospect) == 0
+    assert _staged_files() == []
+
+
+async def test_batch_without_valid_rows(
+    client: httpx.AsyncClient, attorney: Attorney
+) -> None:
+    response = await _file_leads(
+        client,
+        [("manifest", ("manifest.csv", _csv("A,B,invalid,a.pdf"), "text/csv"))],
+    )
+
+    assert response.json() == {
+        "created": 0,
+        "failed": 1,
+        "results": [
+            {
+                "row": 1,
+                "email": "invalid",
+                "created": False,
+                "prospect_id": None,
+                "attorney_id": None,
+                "lead_id": None,
+                "detail": api_messages.INVALID_EMAIL,
+            }
+        ],
+    }
+
+
+@pytest.mark.parametrize(
+    ("files", "detail"),
+    [
+        ([], api_messages.MISSING_MANIFEST),
+        (
+            [("manifest", ("manifest.json", b'{"not": "a list"}', "application/json"))],
+            api_messages.INVALID_MANIFEST,
+        ),
+        (
+            [
+                (
+                    "manifest",
+                    (
+                        "manifest.json",
+                        b'[{"fname": null, "lname": "B", "email": "a@b.c", "file": "f"}]',
+                        "application/json",
+                    ),
+                )
+            ],
+            api_messages.INVALID_MANIFEST,
+        ),
+        (
+            # short row, DictReader fills the missing columns with None
+            [("manifest", ("manifest.csv", _csv("A,B"), "text/csv"))],
+            api_messages.INVALID_MANIFEST,
+        ),
+        (
+            [("manifest", ("manifest.csv", b"\xff\xfe", "text/csv"))],
+            api_messages.INVALID_MANIFEST,
+        ),
+        (
+            [("archive", ("batch.zip", b"not a zip", "application/zip"))],
+            api_messages.INVALID_MANIFEST,
+        ),
+        (
+            [("archive", ("batch.zip", _zip({"a.pdf": RESUME}), "application/zip"))],
+            api_messages.MISSING_MANIFEST,
+        ),
+    ],
+)
+async def test_rejected_batches(
+    client: httpx.AsyncClient, files: list[tuple[str, Any]], detail: str
+) -> None:
+    response = await _file_leads(client, files)
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": detail}
+
+
+async def test_too_many_rows(
+    client: httpx.AsyncClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(get_settings().resume, "max_bulk_rows", 1)
+    manifest = _csv("A,B,a@example.com,a.pdf", "C,D,c@example.com,a.pdf")
+
+    response = await _file_leads(
+        client, [("manifest", ("manifest.csv", manifest, "text/csv"))]
+    )
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": api_messages.TOO_MANY_ROWS}
+
+
+async def test_manifest_size_is_checked_before_decompressing(
+    client: httpx.AsyncClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(get_settings().resume, "max_manifest_bytes", 1024)
+    # compresses to a few hundred bytes
+    manifest = _csv(*["A,B,a@example.com,a.pdf"] * 1000)
+    archive = _zip({"manifest.csv": manifest})
+    assert len(archive) < 1024
+
+    for files in (
+        [("archive", ("batch.zip", archive, "application/zip"))],
+        [("manifest", ("manifest.csv", manifest, "text/csv"))],
+    ):
+        response = await _file_leads(client, files)
+
+        assert response.status_code == 400
+        assert response.json() == {"detail": api_messages.MANIFEST_TOO_LARGE}
+
+
+async def test_staged_resumes_are_discarded_when_filing_fails(
+    client: httpx.AsyncClient, attorney: Attorney, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    async def fail(*_: Any) -> None:
+        raise RuntimeError("database gone")
+
+    monkeypatch.setattr(users, "file_leads", fail)
+
+    with pytest.raises(RuntimeError, match="database gone"):
+        await _file_leads(
+            client,
+            [
+                (
+                    "manifest",
+                    ("manifest.csv", _csv("A,B,a@example.com,a.pdf"), "text/csv"),
+                ),
+                ("files", ("a.pdf", RESUME, "application/pdf")),
+            ],
+        )
+
+    assert _staged_files() == []
@@ -0,0 +1,146 @@
+from collections.abc import Awaitable, Callable
+
+import httpx
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import database_session
+from app.core.config import get_settings
+from app.core.query_stats import assert_max_queries
+from app.core.response_cache import get_response_cache
+from app.models import Attorney, Lead
+
+RESUME = b"%PDF-1.4 resume"
+
+
+async def _file_lead(client: httpx.AsyncClient) -> None:
+    response = await client.post(
+        "/users/filelead",
+        data={"fname": "Ada", "lname": "Lovelace", "email": "ada@example.com"},
+        files={"file": ("ada.pdf", RESUME, "application/pdf")},
+    )
+    response.raise_for_status()
+
+
+async def _file_leads(client: httpx.AsyncClient) -> None:
+    response = await client.post(
+        "/users/fileleads",
+        files=[
+            (
+                "manifest",
+                (
+                    "manifest.csv",
+                    b"fname,lname,email,file\nAda,Lovelace,ada@example.com,a.pdf",
+                    "text/csv",
+                ),
+            ),
+            ("files", ("a.pdf", RESUME, "application/pdf")),
+        ],
+    )
+    assert response.json()["created"] == 1
+
+
+async def test_etag_revalidation_skips_the_database(
+    client: httpx.AsyncClient, lead: Lead
+) -> None:
+    response = await client.get("/users/getpendingleads")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    # strong, a hash of the body
+    assert etag.startswith('"')
+    assert response.headers["cache-control"] == "no-cache"
+
+    with assert_max_queries(0):
+        response = await client.get(
+            "/users/getpendingleads", headers={"If-None-Match": etag}
+        )
+        weak = await client.get(
+            "/users/getpendingleads", headers={"If-None-Match": f'"x", W/{etag}'}
+        )
+        any_etag = await client.get(
+            "/users/getpendingleads", headers={"If-None-Match": "*"}
+        )
+        cached = await client.get("/users/getpendingleads")
+
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+    assert weak.status_code == any_etag.status_code == 304
+    assert cached.status_code == 200
+    assert cached.json() == {"ids": [lead.lead_id]}
+
+
+@pytest.mark.parametrize("write", [_file_lead, _file_leads])
+async def test_filing_leads_invalidates_the_lists(
+    client: httpx.AsyncClient,
+    attorney: Attorney,
+    write: Callable[[httpx.AsyncClient], Awaitable[None]],
+) -> None:
+    pending = await client.get("/users/getpendingleads")
+    prospects = await client.get("/users/getprospects")
+    assert pending.json() == prospects.json() == {"ids": []}
+
+    await write(client)
+
+    for before in (pending, prospects):
+        response = await client.get(
+            str(before.url), headers={"If-None-Match": before.headers["etag"]}
+        )
+        assert response.status_code == 200
+        assert len(response.json()["ids"]) == 1
+
+
+async def test_transitions_invalidate_the_lead_lists(
+    client: httpx.AsyncClient, lead: Lead, auth_headers: dict[str, str]
+) -> None:
+    pending = await client.get("/users/getpendingleads")
+    reached = await client.get("/users/getreachedleads")
+
+    response = await client.post(
+        "/leads/transitions",
+        json={"lead_ids": [lead.lead_id], "state": "REACHED_OUT"},
+        headers=auth_headers,
+    )
+    response.raise_for_status()
+
+    assert pending.json() == {"ids": [lead.lead_id]}
+    assert (await client.get("/users/getpendingleads")).json() == {"ids": []}
+    assert reached.json() == {"ids": []}
+    assert (await client.get("/users/getreachedleads")).json() == {
+        "ids": [lead.lead_id]
+    }
+
+
+async def test_reloads_right_after_a_write_read_the_primary(
+    client: httpx.AsyncClient, attorney: Attorney, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # A replica within the allowed lag may still return the rows from before
+    # the write, the reload would cache them for the whole TTL
+    database = get_settings().database
+    monkeypatch.setattr(database, "replica_hostname", database.hostname)
+    get_response_cache.cache_clear()
+    replica_reads = 0
+    get_read_session = database_session.get_read_session
+
+    async def counted_read_session() -> AsyncSession:
+        nonlocal replica_reads
+        replica_reads += 1
+        return await get_read_session()
+
+    monkeypatch.setattr(database_session, "get_read_session", counted_read_session)
+    try:
+        assert get_response_cache().primary_window_secs > 0
+        await client.get("/users/getpendingleads")
+        assert replica_reads == 1
+
+        await _file_lead(client)
+        response = await client.get("/users/getpendingleads")
+        assert len(response.json()["ids"]) == 1
+        assert replica_reads == 1
+
+        get_response_cache().primary_window_secs = 0
+        get_response_cache().clear()
+        await client.get("/users/getpendingleads")
+        assert replica_reads == 2
+    finally:
+        get_response_cache.cache_clear()
@@ -0,0 +1,172 @@
+import logging
+
+import httpx
+import pytest
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import maintenance
+from app.core.config import Maintenance
+from app.core.lead_stats import reconcile_lead_counts
+from app.models import Attorney, AttorneyLeadCount, Lead
+
+RESUME = b"%PDF-1.4 resume"
+
+
+async def _stats(client: httpx.AsyncClient, **params: str) -> dict[str, dict[str, int]]:
+    # counts per attorney, zero counters left out like COUNT(*) leaves them out
+    response = await client.get("/leads/stats", params=params)
+    assert response.status_code == 200
+    counts: dict[str, dict[str, int]] = {}
+    for stats in response.json()["attorneys"]:
+        for state, count in stats["counts"].items():
+            if count:
+                counts.setdefault(stats["attorney_id"], {})[state] = count
+    return counts
+
+
+async def _counted(session: AsyncSession) -> dict[str, dict[str, int]]:
+    counts: dict[str, dict[str, int]] = {}
+    for attorney_id, state, count in await session.execute(
+        select(Lead.attorney_id, Lead.state, func.count()).group_by(
+            Lead.attorney_id, Lead.state
+        )
+    ):
+        counts.setdefault(attorney_id, {})[state] = count
+    return counts
+
+
+async def test_counters_follow_filed_and_transitioned_leads(
+    client: httpx.AsyncClient,
+    session: AsyncSession,
+    attorney: Attorney,
+    auth_headers: dict[str, str],
+) -> None:
+    response = await client.post(
+        "/users/filelead",
+        data={"fname": "Ada", "lname": "Lovelace", "email": "ada@example.com"},
+        files={"file": ("ada.pdf", RESUME, "application/pdf")},
+    )
+    response.raise_for_status()
+    assert await _stats(client) == {attorney.attorney_id: {"PENDING": 1}}
+
+    response = await client.post(
+        "/users/fileleads",
+        files=[
+            (
+                "manifest",
+                (
+                    "manifest.csv",
+                    b"fname,lname,email,file\n"
+                    b"Grace,Hopper,grace@example.com,a.pdf\n"
+                    b"Alan,Turing,alan@example.com,a.pdf",
+                    "text/csv",
+                ),
+            ),
+            ("files", ("a.pdf", RESUME, "application/pdf")),
+        ],
+    )
+    assert response.json()["created"] == 2
+    assert await _stats(client) == {attorney.attorney_id: {"PENDING": 3}}
+
+    lead_ids = list(await session.scalars(select(Lead.lead_id).order_by(Lead.lead_id)))
+    response = await client.post(
+        "/leads/transitions",
+        json={"lead_ids": lead_ids[:2], "state": "REACHED_OUT"},
+        headers=auth_headers,
+    )
+    response.raise_for_status()
+    # a repeated transition moves nothing
+    response = await client.post(
+        "/leads/transitions",
+        json={"lead_ids": lead_ids[:1], "state": "REACHED_OUT"},
+        headers=auth_headers,
+    )
+    response.raise_for_status()
+    expected = {attorney.attorney_id: {"PENDING": 1, "REACHED_OUT": 2}}
+    assert await _stats(client) == expected
+
+    # the deprecated single lead update moves the counters as well, once
+    response = await client.post(
+        "/auth/updatelead",
+        json={
+            "email": attorney.email,
+            "password": "attorney-password",
+            "lead_id": lead_ids[2],
+        },
+    )
+    response.raise_for_status()
+    response = await client.post(
+        "/auth/updatelead",
+        json={
+            "email": attorney.email,
+            "password": "attorney-password",
+            "lead_id": lead_ids[2],
+        },
+    )
+    response.raise_for_status()
+
+    stats = await _stats(client, attorney_id=attorney.attorney_id)
+    assert stats == {attorney.attorney_id: {"REACHED_OUT": 3}}
+    assert stats == await _counted(session)
+    totals = (await client.get("/leads/stats")).json()["totals"]
+    assert totals == {"PENDING": 0, "REACHED_OUT": 3}
+
+
+@pytest.fixture
+async def drifted(session: AsyncSession, lead: Lead) -> list[str]:
+    # the lead fixture writes no counters, one attorney is missing a counter,
+    # the other has one for a lead that does not exist
+    other = Attorney(name="Other", email="other@example.com", hashed_password="x")
+    session.add(other)
+    await session.flush()
+    session.add_all(
+        [
+            AttorneyLeadCount(
+                attorney_id=other.attorney_id, state="PENDING", lead_count=5
+            ),
+            AttorneyLeadCount(
+                attorney_id=lead.attorney_id, state="REACHED_OUT", lead_count=0
+            ),
+        ]
+    )
+    await session.commit()
+    return sorted([lead.attorney_id, other.attorney_id])
+
+
+async def test_reconcile_lead_counts_repairs_drift(
+    client: httpx.AsyncClient, session: AsyncSession, lead: Lead, drifted: list[str]
+) -> None:
+    assert await _stats(client) != await _counted(session)
+
+    # one attorney per batch
+    attorney_ids, fixed = await reconcile_lead_counts(session, None, 1)
+    assert (attorney_ids, fixed) == (drifted[:1], 1)
+    attorney_ids, fixed = await reconcile_lead_counts(session, drifted[0], 1)
+    assert (attorney_ids, fixed) == (drifted[1:], 1)
+    assert await reconcile_lead_counts(session, drifted[1], 1) == ([], 0)
+    await session.commit()
+
+    assert await _stats(client) == await _counted(session)
+    assert await _stats(client) == {lead.attorney_id: {"PENDING": 1}}
+    assert await reconcile_lead_counts(session, None, 10) == (drifted, 0)
+
+
+async def test_maintenance_reconciles_and_logs_drifted_counters(
+    client: httpx.AsyncClient,
+    session: AsyncSession,
+    drifted: list[str],
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    config = Maintenance(batch_size=1, batch_pause_secs=0)
+
+    with caplog.at_level(logging.WARNING, logger=maintenance.__name__):
+        assert await maintenance.reconcile_lead_counters(session, config) == 2
+    assert caplog.messages == ["fixed 2 drifted lead counters"]
+    assert await _stats(client) == await _counted(session)
+
+    # all three counters drift again, by hand as in the database
+    await session.execute(update(AttorneyLeadCount).values(lead_count=7))
+    await session.commit()
+    assert (await maintenance.run_maintenance(config))["lead_counters"] == 3
+    assert await _stats(client) == await _counted(session)
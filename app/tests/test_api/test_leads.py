@@ -0,0 +1,77 @@
+import uuid
+
+import httpx
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Lead
+
+
+async def test_transitions_report_an_outcome_per_lead(
+    client: httpx.AsyncClient, lead: Lead, auth_headers: dict[str, str]
+) -> None:
+    missing = str(uuid.uuid4())
+
+    response = await client.post(
+        "/leads/transitions",
+        json={"lead_ids": [lead.lead_id, missing], "state": "REACHED_OUT"},
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "updated": 1,
+        "results": [
+            {
+                "lead_id": lead.lead_id,
+                "outcome": "updated",
+                "previous_state": "PENDING",
+                "state": "REACHED_OUT",
+            },
+            {
+                "lead_id": missing,
+                "outcome": "not_found",
+                "previous_state": None,
+                "state": None,
+            },
+        ],
+    }
+
+
+async def test_transitions_leave_leads_already_in_the_state(
+    client: httpx.AsyncClient, lead: Lead, auth_headers: dict[str, str]
+) -> None:
+    response = await client.post(
+        "/leads/transitions",
+        json={"lead_ids": [lead.lead_id], "state": "PENDING"},
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 200
+    assert response.json()["updated"] == 0
+    assert response.json()["results"][0]["outcome"] == "unchanged"
+
+
+async def test_transitions_refuse_moves_the_state_machine_does_not_allow(
+    client: httpx.AsyncClient,
+    session: AsyncSession,
+    lead: Lead,
+    auth_headers: dict[str, str],
+) -> None:
+    # a state with no way out, e.g. one set by hand in the database
+    lead.state = "ARCHIVED"
+    await session.commit()
+
+    response = await client.post(
+        "/leads/transitions",
+        json={"lead_ids": [lead.lead_id], "state": "PENDING"},
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 200
+    assert response.json()["updated"] == 0
+    assert response.json()["results"][0] == {
+        "lead_id": lead.lead_id,
+        "outcome": "invalid_transition",
+        "previous_state": "ARCHIVED",
+        "state": "ARCHIVED",
+    }
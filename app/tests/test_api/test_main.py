@@ -0,0 +1,38 @@
+import runpy
+
+import pytest
+
+from app import main
+from app.core.config import get_settings
+from app.core.metrics import MetricsMiddleware
+from app.core.query_stats import QueryStatsMiddleware
+from app.core.security.password import get_password_hasher
+
+
+async def test_lifespan_starts_and_stops_the_background_work(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    settings = get_settings()
+    monkeypatch.setattr(main, "settings", settings)
+    monkeypatch.setattr(settings.cache, "listen_for_invalidations", True)
+    await get_password_hasher().hash("warm up the pool")
+
+    async with main.lifespan(main.app):
+        pass
+
+    assert get_password_hasher()._executor is None
+
+
+def test_optional_middleware_follows_the_settings(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(get_settings().query_stats, "enabled", True)
+    monkeypatch.setattr(get_settings().metrics, "enabled", False)
+
+    # a fresh copy of the module, app.main itself is left as it is
+    app = runpy.run_module("app.main")["app"]
+
+    middleware = [entry.cls for entry in app.user_middleware]
+    assert QueryStatsMiddleware in middleware
+    assert MetricsMiddleware not in middleware
+    assert "/metrics" not in {route.path for route in app.routes}
@@ -0,0 +1,60 @@
+import os
+from pathlib import Path
+
+import httpx
+import pytest
+from starlette.types import Message, Receive, Scope, Send
+
+from app.core import metrics
+from app.models import Lead
+
+
+async def test_metrics_export_cache_counters(
+    client: httpx.AsyncClient, lead: Lead, auth_headers: dict[str, str]
+) -> None:
+    # the first request misses the attorney and token caches, the second hits
+    for _ in range(2):
+        response = await client.get("/exports/leads", headers=auth_headers)
+        assert response.status_code == 200
+
+    response = await client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    for cache in ("attorney", "jwt"):
+        assert f'cache_hits_total{{cache="{cache}"}}' in response.text
+        assert f'cache_misses_total{{cache="{cache}"}}' in response.text
+
+
+async def test_metrics_add_up_the_multiprocess_files(
+    client: httpx.AsyncClient, monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    # no worker wrote a file yet, the in-process counters are not served
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+
+    response = await client.get("/metrics")
+
+    assert response.status_code == 200
+    assert "cache_hits_total" not in response.text
+
+    (tmp_path / f"gauge_livesum_{os.getpid()}.db").touch()
+    metrics.mark_process_dead()
+    assert not list(tmp_path.iterdir())
+
+
+async def test_metrics_middleware_passes_other_scopes_through() -> None:
+    scopes: list[Scope] = []
+
+    async def app(scope: Scope, receive: Receive, send: Send) -> None:
+        scopes.append(scope)
+
+    async def receive() -> Message:
+        return {"type": "lifespan.startup"}
+
+    async def send(message: Message) -> None:
+        pass
+
+    scope: Scope = {"type": "lifespan"}
+    await metrics.MetricsMiddleware(app)(scope, receive, send)
+
+    assert scopes == [scope]
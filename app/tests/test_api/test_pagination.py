@@ -0,0 +1,175 @@
+import base64
+import datetime
+from typing import Any
+
+import httpx
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api import api_messages
+from app.models import Attorney, Lead, Prospect
+
+START = datetime.datetime(2026, 1, 1, tzinfo=datetime.UTC)
+
+
+def _at(minutes: int) -> datetime.datetime:
+    return START + datetime.timedelta(minutes=minutes)
+
+
+async def _walk(
+    client: httpx.AsyncClient, path: str, **params: Any
+) -> tuple[list[str], int]:
+    ids: list[str] = []
+    pages = 0
+    cursor = None
+    while True:
+        query = {**params, **({"cursor": cursor} if cursor else {})}
+        response = await client.get(path, params=query)
+        assert response.status_code == 200
+        pages += 1
+        ids += response.json()["ids"]
+        cursor = response.json()["next_cursor"]
+        if cursor is None:
+            return ids, pages
+
+
+@pytest.fixture
+async def rows(session: AsyncSession) -> dict[str, Any]:
+    # create_time ties within every table, the id breaks them
+    attorneys = [
+        Attorney(
+            name=f"Attorney {number}",
+            email=f"attorney-{number}@example.com",
+            hashed_password="x",
+            create_time=_at(number // 2),
+        )
+        for number in range(3)
+    ]
+    prospects = [
+        Prospect(
+            name=f"Prospect {number}",
+            email=f"prospect-{number}@example.com",
+            resume="resume.pdf",
+            create_time=_at(number // 3),
+        )
+        for number in range(7)
+    ]
+    session.add_all([*attorneys, *prospects])
+    await session.flush()
+    leads = [
+        Lead(
+            attorney_id=attorneys[number % 2].attorney_id,
+            prospect_id=prospect.prospect_id,
+            state="PENDING" if number % 3 else "REACHED_OUT",
+            create_time=prospect.create_time,
+        )
+        for number, prospect in enumerate(prospects)
+    ]
+    session.add_all(leads)
+    await session.commit()
+    return {"attorneys": attorneys, "prospects": prospects, "leads": leads}
+
+
+def _ordered(items: list[Any], id_attr: str) -> list[str]:
+    return [
+        getattr(item, id_attr)
+        for item in sorted(
+            items, key=lambda item: (item.create_time, getattr(item, id_attr))
+        )
+    ]
+
+
+@pytest.mark.parametrize(
+    ("path", "table", "id_attr"),
+    [
+        ("/users/leads", "leads", "lead_id"),
+        ("/users/attorneys", "attorneys", "attorney_id"),
+        ("/users/prospects", "prospects", "prospect_id"),
+    ],
+)
+async def test_pages_walk_every_row_once_in_order(
+    client: httpx.AsyncClient, rows: dict[str, Any], path: str, table: str, id_attr: str
+) -> None:
+    ids, pages = await _walk(client, path, limit=2)
+
+    assert ids == _ordered(rows[table], id_attr)
+    assert pages == (len(rows[table]) + 1) // 2
+
+    # the last page is full without a next page
+    ids, pages = await _walk(client, path, limit=len(rows[table]))
+    assert pages == 1
+
+
+async def test_lead_pages_filter_on_state_attorney_and_time(
+    client: httpx.AsyncClient, rows: dict[str, Any]
+) -> None:
+    leads: list[Lead] = rows["leads"]
+    attorney_id = rows["attorneys"][1].attorney_id
+    since = _at(1)
+
+    for params, expected in [
+        ({"state": "PENDING"}, [lead for lead in leads if lead.state == "PENDING"]),
+        (
+            {"attorney_id": attorney_id},
+            [lead for lead in leads if lead.attorney_id == attorney_id],
+        ),
+        (
+            {"created_since": since.isoformat()},
+            [lead for lead in leads if lead.create_time >= since],
+        ),
+        (
+            {"state": "REACHED_OUT", "attorney_id": attorney_id},
+            [
+                lead
+                for lead in leads
+                if lead.state == "REACHED_OUT" and lead.attorney_id == attorney_id
+            ],
+        ),
+    ]:
+        ids, _ = await _walk(client, "/users/leads", limit=2, **params)
+        assert ids == _ordered(expected, "lead_id"), params
+        assert ids
+
+
+@pytest.mark.parametrize(
+    ("path", "table", "id_attr"),
+    [
+        ("/users/attorneys", "attorneys", "attorney_id"),
+        ("/users/prospects", "prospects", "prospect_id"),
+    ],
+)
+async def test_pages_filter_on_creation_time(
+    client: httpx.AsyncClient, rows: dict[str, Any], path: str, table: str, id_attr: str
+) -> None:
+    since = _at(1)
+
+    ids, _ = await _walk(client, path, limit=2, created_since=since.isoformat())
+
+    expected = [item for item in rows[table] if item.create_time >= since]
+    assert ids == _ordered(expected, id_attr)
+    assert 0 < len(ids) < len(rows[table])
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not base64!",
+        base64.urlsafe_b64encode(b"not json").decode(),
+        base64.urlsafe_b64encode(b'["2026-01-01T00:00:00", "not-a-uuid"]').decode(),
+        base64.urlsafe_b64encode(b'{"not": "a pair"}').decode(),
+    ],
+)
+async def test_invalid_cursors_are_rejected(
+    client: httpx.AsyncClient, cursor: str
+) -> None:
+    response = await client.get("/users/leads", params={"cursor": cursor})
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": api_messages.INVALID_CURSOR}
+
+
+@pytest.mark.parametrize("limit", [0, 1001])
+async def test_page_size_is_bounded(client: httpx.AsyncClient, limit: int) -> None:
+    response = await client.get("/users/leads", params={"limit": limit})
+
+    assert response.status_code == 422
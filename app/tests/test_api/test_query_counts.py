@@ -0,0 +1,26 @@
+# Query budget per endpoint, the checks of benchmarks/query_counts.py. The
+# calls before the checked one set up what it needs (attorney, tokens, lead),
+# it then runs once to warm the caches and once more inside
+# assert_max_queries.
+
+import httpx
+import pytest
+
+from app.core.query_stats import assert_max_queries
+from benchmarks.query_counts import CHECKS, Context
+
+
+@pytest.mark.parametrize(
+    "position", range(len(CHECKS)), ids=[name for name, _, _ in CHECKS]
+)
+async def test_endpoint_stays_within_query_budget(
+    client: httpx.AsyncClient, position: int
+) -> None:
+    ctx = Context(client=client)
+    for _, _, call in CHECKS[:position]:
+        (await call(ctx)).raise_for_status()
+    _, budget, call = CHECKS[position]
+    (await call(ctx)).raise_for_status()
+
+    with assert_max_queries(budget):
+        (await call(ctx)).raise_for_status()
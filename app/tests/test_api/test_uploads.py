@@ -0,0 +1,144 @@
+from collections.abc import AsyncIterator
+from pathlib import Path
+
+import httpx
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api import api_messages
+from app.core.config import get_settings
+from app.core.uploads import MULTIPART_OVERHEAD_BYTES, UploadSizeLimitMiddleware
+from app.main import app
+from app.models import Attorney, Prospect
+
+LIMIT = 1024
+FORM = {"fname": "Ada", "lname": "Lovelace", "email": "ada@example.com"}
+TOO_LARGE = {"detail": api_messages.RESUME_TOO_LARGE}
+
+
+@pytest.fixture(autouse=True)
+def staging_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    monkeypatch.setattr(get_settings().resume, "storage_dir", tmp_path)
+    return get_settings().resume.staging_dir
+
+
+@pytest.fixture
+async def limited_client() -> AsyncIterator[httpx.AsyncClient]:
+    # the app's own limits are read at import, wrap it with a small one
+    limited = UploadSizeLimitMiddleware(app, {"/users/filelead": LIMIT})
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=limited), base_url="http://localhost"
+    ) as client:
+        yield client
+
+
+def _multipart(resume: bytes) -> tuple[bytes, str]:
+    request = httpx.Request(
+        "POST",
+        "http://localhost/users/filelead",
+        data=FORM,
+        files={"file": ("ada.pdf", resume, "application/pdf")},
+    )
+    return request.read(), request.headers["content-type"]
+
+
+async def _prospects(session: AsyncSession) -> int:
+    return await session.scalar(select(func.count()).select_from(Prospect)) or 0
+
+
+def _staged(staging_dir: Path) -> list[Path]:
+    return list(staging_dir.glob("*")) if staging_dir.exists() else []
+
+
+async def test_a_content_length_over_the_limit_is_refused_unread(
+    limited_client: httpx.AsyncClient, session: AsyncSession, staging_dir: Path
+) -> None:
+    body, content_type = _multipart(b"x" * (LIMIT + MULTIPART_OVERHEAD_BYTES))
+
+    response = await limited_client.post(
+        "/users/filelead", content=body, headers={"content-type": content_type}
+    )
+
+    assert response.status_code == 413
+    assert response.json() == TOO_LARGE
+    assert await _prospects(session) == 0
+    assert _staged(staging_dir) == []
+
+
+async def test_a_chunked_body_over_the_limit_is_cut_off(
+    limited_client: httpx.AsyncClient, session: AsyncSession, staging_dir: Path
+) -> None:
+    body, content_type = _multipart(b"x" * 2 * (LIMIT + MULTIPART_OVERHEAD_BYTES))
+    chunks_sent = 0
+
+    async def chunks() -> AsyncIterator[bytes]:
+        nonlocal chunks_sent
+        for start in range(0, len(body), LIMIT):
+            chunks_sent += 1
+            yield body[start : start + LIMIT]
+
+    # no Content-Length, the middleware has to count
+    response = await limited_client.post(
+        "/users/filelead", content=chunks(), headers={"content-type": content_type}
+    )
+
+    assert response.status_code == 413
+    assert response.json() == TOO_LARGE
+    # cut off right after the limit, the rest of the body was never pulled
+    assert chunks_sent * LIMIT < len(body) // 2 + LIMIT
+    assert await _prospects(session) == 0
+    assert _staged(staging_dir) == []
+
+
+async def test_a_small_body_passes_the_middleware(
+    limited_client: httpx.AsyncClient, attorney: Attorney, session: AsyncSession
+) -> None:
+    body, content_type = _multipart(b"%PDF-1.4 resume")
+
+    response = await limited_client.post(
+        "/users/filelead", content=body, headers={"content-type": content_type}
+    )
+
+    assert response.status_code == 201
+    assert await _prospects(session) == 1
+    # other paths are not limited
+    assert (await limited_client.get("/users/getprospects")).status_code == 200
+
+
+async def test_a_file_over_max_upload_bytes_is_not_staged(
+    client: httpx.AsyncClient,
+    attorney: Attorney,
+    session: AsyncSession,
+    staging_dir: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    # under the body limit of the middleware, over the file limit
+    monkeypatch.setattr(get_settings().resume, "max_upload_bytes", 8)
+
+    response = await client.post(
+        "/users/filelead",
+        data=FORM,
+        files={"file": ("ada.pdf", b"%PDF-1.4 resume", "application/pdf")},
+    )
+
+    assert response.status_code == 413
+    assert response.json() == TOO_LARGE
+    assert await _prospects(session) == 0
+    assert _staged(staging_dir) == []
+
+
+async def test_the_staged_file_is_discarded_when_filing_fails(
+    client: httpx.AsyncClient, session: AsyncSession, staging_dir: Path
+) -> None:
+    # no attorney to assign the lead to
+    response = await client.post(
+        "/users/filelead",
+        data=FORM,
+        files={"file": ("ada.pdf", b"%PDF-1.4 resume", "application/pdf")},
+    )
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": api_messages.NO_VALID_ATTORNEY_FOUND}
+    assert await _prospects(session) == 0
+    assert _staged(staging_dir) == []
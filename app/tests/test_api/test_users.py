@@ -0,0 +1,17 @@
+import httpx
+
+from app.models import Attorney, Lead
+
+
+async def test_id_lists(
+    client: httpx.AsyncClient, attorney: Attorney, lead: Lead
+) -> None:
+    response = await client.get("/users/getattorneys")
+    assert response.status_code == 200
+    assert response.json() == {"ids": [attorney.attorney_id]}
+
+    response = await client.get("/users/getpendingleads")
+    assert response.json() == {"ids": [lead.lead_id]}
+
+    response = await client.get("/users/getreachedleads")
+    assert response.json() == {"ids": []}
@@ -0,0 +1,142 @@
+import asyncio
+import uuid
+from collections import Counter
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import assignment, database_session
+from app.core.assignment import (
+    AssignmentStrategy,
+    AttorneyDirectory,
+    LeastLoadedStrategy,
+    RandomStrategy,
+    RoundRobinStrategy,
+    assign_attorney,
+    get_assignment_strategy,
+)
+from app.core.attorney_cache import get_attorney_cache
+from app.core.config import get_settings
+from app.models import Attorney, AttorneyLeadCount
+
+REMOVED = str(uuid.UUID(int=0))
+
+
+class ScriptedStrategy(AssignmentStrategy):
+    # picks the given ids in turn, like a directory that still lists
+    # attorneys removed by another worker
+    def __init__(self, *picks: str) -> None:
+        self.picks = list(picks)
+
+    async def pick_many(self, session: AsyncSession, count: int) -> list[str]:
+        return [self.picks.pop(0)]
+
+
+async def _add_attorneys(session: AsyncSession, pending_counts: list[int]) -> list[str]:
+    attorneys = [
+        Attorney(
+            name="Attorney", email=f"attorney-{number}@example.com", hashed_password="x"
+        )
+        for number in range(len(pending_counts))
+    ]
+    session.add_all(attorneys)
+    await session.flush()
+    session.add_all(
+        AttorneyLeadCount(
+            attorney_id=attorney.attorney_id, state="PENDING", lead_count=count
+        )
+        for attorney, count in zip(attorneys, pending_counts, strict=True)
+    )
+    await session.commit()
+    return [attorney.attorney_id for attorney in attorneys]
+
+
+async def test_round_robin_is_fair_across_concurrent_sessions(
+    session: AsyncSession,
+) -> None:
+    attorney_ids = await _add_attorneys(session, [0, 0, 0, 0])
+    strategy = RoundRobinStrategy(AttorneyDirectory(refresh_secs=60))
+
+    async def pick() -> str | None:
+        async with database_session.get_async_session() as pick_session:
+            return await strategy.pick(pick_session)
+
+    picks = await asyncio.gather(*(pick() for _ in range(40)))
+
+    assert Counter(picks) == {attorney_id: 10 for attorney_id in attorney_ids}
+
+
+async def test_least_loaded_fills_up_the_least_loaded_attorneys(
+    session: AsyncSession,
+) -> None:
+    idle, busy, busiest = await _add_attorneys(session, [0, 2, 10])
+
+    picked = await LeastLoadedStrategy().pick_many(session, 6)
+
+    # both end up with 4 PENDING leads
+    assert Counter(picked) == {idle: 4, busy: 2}
+    assert busiest not in picked
+
+
+async def test_strategies_pick_nobody_without_attorneys(session: AsyncSession) -> None:
+    directory = AttorneyDirectory(refresh_secs=60)
+
+    for strategy in (
+        RandomStrategy(directory),
+        RoundRobinStrategy(directory),
+        LeastLoadedStrategy(),
+    ):
+        assert await strategy.pick(session) is None
+
+
+@pytest.mark.parametrize(
+    ("name", "strategy"),
+    [
+        ("random", RandomStrategy),
+        ("round_robin", RoundRobinStrategy),
+        ("least_loaded", LeastLoadedStrategy),
+    ],
+)
+def test_the_configured_strategy_is_used(
+    monkeypatch: pytest.MonkeyPatch, name: str, strategy: type[AssignmentStrategy]
+) -> None:
+    monkeypatch.setattr(get_settings().assignment, "strategy", name)
+    get_assignment_strategy.cache_clear()
+    try:
+        assert type(get_assignment_strategy()) is strategy
+    finally:
+        get_assignment_strategy.cache_clear()
+
+
+async def test_assign_attorney_reads_the_cache_and_skips_removed_attorneys(
+    session: AsyncSession, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    (attorney_id,) = await _add_attorneys(session, [0])
+
+    monkeypatch.setattr(
+        assignment,
+        "get_assignment_strategy",
+        lambda: ScriptedStrategy(REMOVED, attorney_id),
+    )
+    attorney = await assign_attorney(session)
+    assert attorney is not None and attorney.attorney_id == attorney_id
+
+    # loaded once, served from the cache after
+    cached = get_attorney_cache().get(attorney_id)
+    assert cached is not None
+    monkeypatch.setattr(
+        assignment, "get_assignment_strategy", lambda: ScriptedStrategy(attorney_id)
+    )
+    assert await assign_attorney(session) is cached
+
+    # removed twice in a row, nobody is assigned
+    monkeypatch.setattr(
+        assignment,
+        "get_assignment_strategy",
+        lambda: ScriptedStrategy(REMOVED, REMOVED),
+    )
+    assert await assign_attorney(session) is None
+
+
+async def test_assign_attorney_without_attorneys(session: AsyncSession) -> None:
+    assert await assign_attorney(session) is None
@@ -0,0 +1,65 @@
+import io
+import zipfile
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import pytest
+from fastapi import UploadFile
+
+from app.core.bulk_intake import stage_archive, stage_uploaded_files
+from app.core.storage import get_resume_store
+from app.core.uploads import StagedUpload
+
+MANIFEST = b"fname,lname,email,file\nA,B,a@example.com,a.pdf\nC,D,c@example.com,c.pdf"
+
+
+def _fail_second_call(
+    stage: Callable[[Any], Awaitable[StagedUpload]], staged: list[StagedUpload]
+) -> Callable[[Any], Awaitable[StagedUpload]]:
+    async def stage_once(source: Any) -> StagedUpload:
+        if staged:
+            raise OSError("disk full")
+        staged.append(await stage(source))
+        return staged[-1]
+
+    return stage_once
+
+
+async def test_stage_uploaded_files_discards_staged_rows_on_failure(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    store = get_resume_store()
+    staged: list[StagedUpload] = []
+    monkeypatch.setattr(store, "stage", _fail_second_call(store.stage, staged))
+    files = [
+        UploadFile(io.BytesIO(b"a"), filename="a.pdf"),
+        UploadFile(io.BytesIO(b"c"), filename="c.pdf"),
+    ]
+
+    with pytest.raises(OSError, match="disk full"):
+        await stage_uploaded_files(
+            UploadFile(io.BytesIO(MANIFEST), filename="manifest.csv"), files, store
+        )
+
+    assert not staged[0].path.exists()
+
+
+async def test_stage_archive_discards_staged_rows_on_failure(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    store = get_resume_store()
+    staged: list[StagedUpload] = []
+    monkeypatch.setattr(
+        store, "stage_fileobj", _fail_second_call(store.stage_fileobj, staged)
+    )
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("manifest.csv", MANIFEST)
+        archive.writestr("a.pdf", b"a")
+        archive.writestr("c.pdf", b"c")
+    buffer.seek(0)
+
+    with pytest.raises(OSError, match="disk full"):
+        await stage_archive(UploadFile(buffer, filename="batch.zip"), store)
+
+    assert not staged[0].path.exists()
@@ -0,0 +1,44 @@
+import time
+
+import pytest
+
+from app.core.cache import CacheStats, TTLCache
+
+
+def test_entries_expire_after_ttl_or_earlier(monkeypatch: pytest.MonkeyPatch) -> None:
+    now = 1000.0
+    monkeypatch.setattr(time, "time", lambda: now)
+    cache: TTLCache[str, int] = TTLCache("test", max_entries=10, ttl_secs=60)
+    cache.set("ttl", 1)
+    cache.set("early", 2, expires_at=now + 10)
+    # capped at the ttl
+    cache.set("late", 3, expires_at=now + 600)
+
+    now += 30
+    assert (cache.get("ttl"), cache.get("early"), cache.get("late")) == (1, None, 3)
+    now += 30
+    assert (cache.get("ttl"), cache.get("late")) == (None, None)
+
+    assert cache.stats() == CacheStats(hits=2, misses=3, evictions=0, size=0)
+
+
+def test_the_least_recently_used_entry_is_evicted() -> None:
+    cache: TTLCache[str, int] = TTLCache("test", max_entries=2, ttl_secs=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+
+    cache.set("c", 3)
+
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+    assert cache.stats().as_dict() == {
+        "hits": 3,
+        "misses": 1,
+        "evictions": 1,
+        "size": 2,
+    }
+    cache.pop("a")
+    cache.pop("missing")
+    assert cache.stats().size == 1
+    cache.clear()
+    assert cache.stats().size == 0
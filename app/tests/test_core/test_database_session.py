@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import socket
+from collections.abc import AsyncIterator
+
+import pytest
+from sqlalchemy import bindparam, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core import database_session
+from app.core.config import Database, get_settings
+from app.core.database_session import ReplicaRouter, precompile
+from app.models import Attorney
+
+
+async def test_precompile_keeps_binds_and_result_columns(
+    session: AsyncSession, attorney: Attorney
+) -> None:
+    statement = precompile(
+        select(Attorney.attorney_id, Attorney.email).where(
+            Attorney.email == bindparam("email", type_=Attorney.email.type)
+        )
+    )
+
+    assert "::" not in str(statement)
+    result = await session.execute(statement, {"email": attorney.email})
+    assert list(result.keys()) == ["attorney_id", "email"]
+    assert result.one() == (attorney.attorney_id, attorney.email)
+
+
+@pytest.fixture
+async def replica(monkeypatch: pytest.MonkeyPatch) -> AsyncIterator[Database]:
+    # The test server stands in for the replica, it is not in recovery, so
+    # its lag reads as 0
+    database = get_settings().database
+    monkeypatch.setattr(database, "replica_hostname", database.hostname)
+    await database_session.dispose_async_engine()
+    yield database
+    await database_session.dispose_async_engine()
+
+
+def _router() -> ReplicaRouter:
+    router = database_session.get_replica_router()
+    assert router is not None
+    return router
+
+
+def _closed_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return int(sock.getsockname()[1])
+
+
+async def _read_from_replica() -> bool:
+    async with await database_session.get_read_session() as session:
+        return session.bind is database_session.get_replica_engine()
+
+
+async def test_reads_follow_the_replica_lag(
+    replica: Database,
+    monkeypatch: pytest.MonkeyPatch,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    assert await _read_from_replica()
+    assert await _router().lag_secs() == 0
+
+    lag = replica.replica_max_lag_secs + 1
+    checks = 0
+
+    async def lagging(_: ReplicaRouter) -> float:
+        nonlocal checks
+        checks += 1
+        return lag
+
+    monkeypatch.setattr(ReplicaRouter, "lag_secs", lagging)
+    # the previous answer holds until check_secs passed
+    assert await _read_from_replica()
+    assert checks == 0
+
+    _router()._checked_at = float("-inf")
+    caplog.clear()
+    with caplog.at_level(logging.WARNING):
+        assert not await _read_from_replica()
+        lag = replica.replica_max_lag_secs
+        _router()._checked_at = float("-inf")
+        assert await _read_from_replica()
+    assert checks == 2
+    assert caplog.messages == [
+        f"reads go to the primary, replica {replica.replica_max_lag_secs + 1:.1f}s behind",
+        f"reads go to the replica, replica {replica.replica_max_lag_secs:.1f}s behind",
+    ]
+
+
+async def test_reads_go_to_the_primary_while_the_replica_is_unreachable(
+    replica: Database,
+    monkeypatch: pytest.MonkeyPatch,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    monkeypatch.setattr(replica, "replica_port", _closed_port())
+
+    with caplog.at_level(logging.WARNING):
+        assert not await _read_from_replica()
+    assert not caplog.messages
+
+    async def hanging(_: ReplicaRouter) -> float:
+        await asyncio.sleep(10)
+        raise AssertionError("not cancelled")
+
+    monkeypatch.setattr(ReplicaRouter, "lag_secs", hanging)
+    router = _router()
+    router.check_timeout_secs = 0.05
+    router.use_replica = True
+    router._checked_at = float("-inf")
+    with caplog.at_level(logging.WARNING):
+        assert not await _read_from_replica()
+    assert caplog.messages == [
+        "reads go to the primary, replica unreachable (TimeoutError)"
+    ]
+
+
+async def test_a_replica_failing_between_checks_falls_back_to_the_primary(
+    replica: Database, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    assert await _read_from_replica()
+
+    # gone since the last check, which still routes reads to it
+    monkeypatch.setattr(replica, "replica_port", _closed_port())
+    router = _router()
+    router.replica = async_sessionmaker(
+        database_session.new_async_engine(
+            get_settings().sqlalchemy_replica_uri,  # type: ignore[arg-type]
+            pool="replica",
+        )
+    )
+
+    assert not await _read_from_replica()
+    assert not router.use_replica
+    await router.replica.kw["bind"].dispose()
+
+
+async def test_pgbouncer_mode_names_every_prepared_statement(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(get_settings().database, "pgbouncer", True)
+    engine = database_session.new_async_engine(get_settings().sqlalchemy_database_uri)
+    statement = text("SELECT name FROM pg_prepared_statements")
+    try:
+        async with engine.connect() as connection:
+            names = [list(await connection.scalars(statement)) for _ in range(2)]
+    finally:
+        await engine.dispose()
+
+    # prepared again under a new name, none cached on the server connection
+    assert len(names[0]) == len(names[1]) == 1
+    assert names[0] != names[1]
+    assert all(name.startswith("__asyncpg_") for name in names[0] + names[1])
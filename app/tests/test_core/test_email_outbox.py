@@ -0,0 +1,385 @@
+import asyncio
+import socket
+from collections.abc import Awaitable, Callable, Iterator
+from datetime import UTC, datetime
+from typing import Any
+
+import aiosmtplib
+import pytest
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import SMTP, AuthResult, Envelope, LoginPassword, Session
+from pydantic import SecretStr
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import email_outbox
+from app.core.config import Email
+from app.core.email_outbox import (
+    OutboxWorkers,
+    _is_permanent,
+    deliver_batch,
+    enqueue_emails,
+    new_lead_email,
+)
+from app.core.send_mail import SMTPConnection, render_email
+from app.models import EmailOutbox
+
+
+class RecordingHandler:
+    # aiosmtpd handler keeping what it received
+    def __init__(self) -> None:
+        self.envelopes: list[Envelope] = []
+        self.peers: set[Any] = set()
+        self.logins: list[tuple[bytes, bytes]] = []
+        # answer every RCPT with this instead of accepting it
+        self.rcpt_reply: str | None = None
+
+    async def handle_RCPT(  # noqa: PLR0913, aiosmtpd's hook signature
+        self,
+        server: SMTP,
+        session: Session,
+        envelope: Envelope,
+        address: str,
+        rcpt_options: list[str],
+    ) -> str:
+        if self.rcpt_reply is not None:
+            return self.rcpt_reply
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(
+        self, server: SMTP, session: Session, envelope: Envelope
+    ) -> str:
+        self.envelopes.append(envelope)
+        self.peers.add(session.peer)
+        return "250 Message accepted for delivery"
+
+    def authenticate(  # noqa: PLR0913, aiosmtpd's authenticator signature
+        self,
+        server: SMTP,
+        session: Session,
+        envelope: Envelope,
+        mechanism: str,
+        auth_data: LoginPassword,
+    ) -> AuthResult:
+        self.logins.append((auth_data.login, auth_data.password))
+        return AuthResult(success=True)
+
+
+@pytest.fixture
+def smtp_server() -> Iterator[tuple[RecordingHandler, int]]:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    handler = RecordingHandler()
+    controller = Controller(
+        handler,
+        hostname="127.0.0.1",
+        port=port,
+        authenticator=handler.authenticate,
+        auth_require_tls=False,
+    )
+    controller.start()
+    yield handler, port
+    controller.stop()
+
+
+@pytest.fixture
+def smtp_handler(smtp_server: tuple[RecordingHandler, int]) -> RecordingHandler:
+    return smtp_server[0]
+
+
+@pytest.fixture
+def email_config(smtp_server: tuple[RecordingHandler, int]) -> Email:
+    return Email(
+        enabled=True,
+        server="127.0.0.1",
+        port=smtp_server[1],
+        start_tls=False,
+        sender="leads@example.com",
+        outbox_batch_size=10,
+    )
+
+
+async def _enqueue(session: AsyncSession, count: int) -> None:
+    await enqueue_emails(
+        session,
+        [
+            new_lead_email(
+                f"lead-{number}",
+                "Attorney",
+                "attorney@example.com",
+                "Prospect",
+                f"prospect-{number}@example.com",
+            )
+            for number in range(count)
+        ],
+    )
+    await session.commit()
+
+
+async def _outbox(session: AsyncSession) -> list[EmailOutbox]:
+    session.expire_all()
+    return list(await session.scalars(select(EmailOutbox).order_by(EmailOutbox.id)))
+
+
+async def test_deliver_batch_sends_due_emails_over_one_connection(
+    session: AsyncSession, smtp_handler: RecordingHandler, email_config: Email
+) -> None:
+    await _enqueue(session, 3)
+    connection = SMTPConnection(email_config)
+    try:
+        assert await deliver_batch(session, connection, email_config) == 3
+        assert await deliver_batch(session, connection, email_config) == 0
+    finally:
+        await connection.close()
+
+    assert len(smtp_handler.envelopes) == 3
+    assert len(smtp_handler.peers) == 1
+    assert smtp_handler.envelopes[0].mail_from == "leads@example.com"
+    assert smtp_handler.envelopes[0].rcpt_tos == [
+        "attorney@example.com",
+        "prospect-0@example.com",
+    ]
+    assert b"Subject: New Lead Pair" in smtp_handler.envelopes[0].original_content  # type: ignore[operator]
+
+    for row in await _outbox(session):
+        assert row.status == "SENT"
+        assert row.attempts == 1
+        assert row.sent_time is not None
+        assert row.last_error is None
+
+
+async def test_deliver_batch_claims_at_most_batch_size(
+    session: AsyncSession, smtp_handler: RecordingHandler, email_config: Email
+) -> None:
+    await _enqueue(session, 15)
+    connection = SMTPConnection(email_config)
+    try:
+        assert await deliver_batch(session, connection, email_config) == 10
+        assert await deliver_batch(session, connection, email_config) == 5
+    finally:
+        await connection.close()
+
+    assert len(smtp_handler.envelopes) == 15
+
+
+async def test_deliver_batch_reschedules_temporary_failures(
+    session: AsyncSession, smtp_handler: RecordingHandler, email_config: Email
+) -> None:
+    smtp_handler.rcpt_reply = "451 Try again later"
+    await _enqueue(session, 1)
+    connection = SMTPConnection(email_config)
+    try:
+        assert await deliver_batch(session, connection, email_config) == 1
+        # not due yet
+        assert await deliver_batch(session, connection, email_config) == 0
+    finally:
+        await connection.close()
+
+    (row,) = await _outbox(session)
+    assert row.status == "PENDING"
+    assert row.attempts == 1
+    assert row.last_error is not None and "451" in row.last_error
+    assert row.next_attempt_time > datetime.now(UTC)
+    assert not smtp_handler.envelopes
+
+
+async def test_deliver_batch_gives_up_on_permanent_failures(
+    session: AsyncSession, smtp_handler: RecordingHandler, email_config: Email
+) -> None:
+    smtp_handler.rcpt_reply = "550 No such user"
+    await _enqueue(session, 1)
+    connection = SMTPConnection(email_config)
+    try:
+        assert await deliver_batch(session, connection, email_config) == 1
+    finally:
+        await connection.close()
+
+    (row,) = await _outbox(session)
+    assert row.status == "FAILED"
+    assert row.attempts == 1
+
+
+async def test_deliver_batch_gives_up_after_max_attempts(
+    session: AsyncSession, smtp_handler: RecordingHandler, email_config: Email
+) -> None:
+    smtp_handler.rcpt_reply = "451 Try again later"
+    config = email_config.model_copy(update={"outbox_max_attempts": 1})
+    await _enqueue(session, 1)
+    connection = SMTPConnection(config)
+    try:
+        assert await deliver_batch(session, connection, config) == 1
+    finally:
+        await connection.close()
+
+    (row,) = await _outbox(session)
+    assert row.status == "FAILED"
+
+
+async def _wait_for(condition: Callable[[], Awaitable[bool]]) -> None:
+    async with asyncio.timeout(10):
+        while not await condition():
+            await asyncio.sleep(0.01)
+
+
+def _message(config: Email) -> Any:
+    return render_email(
+        config.sender,
+        "Subject",
+        ["prospect@example.com"],
+        {"data": "body"},
+        "email.html",
+    )
+
+
+@pytest.mark.parametrize(
+    ("error", "permanent"),
+    [
+        (aiosmtplib.SMTPResponseException(550, "No such user"), True),
+        (aiosmtplib.SMTPResponseException(451, "Try again later"), False),
+        (
+            aiosmtplib.SMTPRecipientsRefused(
+                [
+                    aiosmtplib.SMTPRecipientRefused(
+                        550, "No such user", "a@example.com"
+                    ),
+                    aiosmtplib.SMTPRecipientRefused(451, "Try again", "b@example.com"),
+                ]
+            ),
+            False,
+        ),
+        (aiosmtplib.SMTPServerDisconnected("gone"), False),
+        (RuntimeError("boom"), False),
+    ],
+)
+def test_only_5xx_replies_are_permanent(error: Exception, permanent: bool) -> None:
+    assert _is_permanent(error) is permanent
+
+
+async def test_outbox_workers_deliver_until_stopped(
+    session: AsyncSession, smtp_handler: RecordingHandler, email_config: Email
+) -> None:
+    config = email_config.model_copy(
+        update={"outbox_workers": 2, "outbox_poll_secs": 0.01}
+    )
+    workers = OutboxWorkers(config)
+    workers.start()
+    tasks = workers._tasks
+    # starting twice keeps the running workers
+    workers.start()
+    assert workers._tasks == tasks and len(tasks) == 2
+
+    try:
+        await _enqueue(session, 3)
+
+        async def all_sent() -> bool:
+            return [row.status for row in await _outbox(session)] == ["SENT"] * 3
+
+        await _wait_for(all_sent)
+    finally:
+        await workers.stop()
+
+    assert workers._tasks == []
+    assert all(task.done() for task in tasks)
+    assert len(smtp_handler.envelopes) == 3
+
+
+async def test_outbox_workers_survive_failed_batches(
+    monkeypatch: pytest.MonkeyPatch,
+    caplog: pytest.LogCaptureFixture,
+    email_config: Email,
+) -> None:
+    async def failing_deliver_batch(*args: Any) -> int:
+        raise RuntimeError("database is gone")
+
+    monkeypatch.setattr(email_outbox, "deliver_batch", failing_deliver_batch)
+    config = email_config.model_copy(update={"outbox_poll_secs": 0.01})
+    workers = OutboxWorkers(config)
+    workers.start()
+    try:
+
+        async def failed_twice() -> bool:
+            return caplog.text.count("email outbox delivery failed") >= 2
+
+        await _wait_for(failed_twice)
+    finally:
+        await workers.stop()
+
+
+async def test_connection_logs_in_when_configured(
+    smtp_handler: RecordingHandler, email_config: Email
+) -> None:
+    config = email_config.model_copy(
+        update={"username": "outbox", "password": SecretStr("secret")}
+    )
+    connection = SMTPConnection(config)
+    try:
+        await connection.send(_message(config))
+    finally:
+        await connection.close()
+
+    assert smtp_handler.logins == [(b"outbox", b"secret")]
+    assert len(smtp_handler.envelopes) == 1
+
+
+async def test_disabled_connection_logs_instead_of_sending(
+    caplog: pytest.LogCaptureFixture,
+    smtp_handler: RecordingHandler,
+    email_config: Email,
+) -> None:
+    config = email_config.model_copy(update={"enabled": False})
+    connection = SMTPConnection(config)
+    with caplog.at_level("INFO"):
+        await connection.send(_message(config))
+
+    assert (
+        "email disabled, not sending 'Subject' to prospect@example.com" in caplog.text
+    )
+    assert not smtp_handler.envelopes
+    assert connection._smtp is None
+
+
+async def test_connection_reopens_after_disconnect(
+    monkeypatch: pytest.MonkeyPatch, smtp_handler: RecordingHandler, email_config: Email
+) -> None:
+    connection = SMTPConnection(email_config)
+    await connection.send(_message(email_config))
+    broken = connection._smtp
+    assert broken is not None
+    try:
+
+        async def disconnected(*args: Any, **kwargs: Any) -> None:
+            raise aiosmtplib.SMTPServerDisconnected("connection lost")
+
+        monkeypatch.setattr(broken, "send_message", disconnected)
+        with pytest.raises(aiosmtplib.SMTPServerDisconnected):
+            await connection.send(_message(email_config))
+        assert connection._smtp is None
+
+        await connection.send(_message(email_config))
+        assert connection._smtp is not broken
+    finally:
+        await connection.close()
+        broken.close()
+
+    assert len(smtp_handler.envelopes) == 2
+    assert len(smtp_handler.peers) == 2
+
+
+async def test_close_drops_the_connection_when_quit_fails(
+    monkeypatch: pytest.MonkeyPatch, email_config: Email
+) -> None:
+    connection = SMTPConnection(email_config)
+    await connection.send(_message(email_config))
+    smtp = connection._smtp
+    assert smtp is not None
+
+    async def failing_quit(*args: Any, **kwargs: Any) -> None:
+        raise aiosmtplib.SMTPResponseException(421, "closing")
+
+    monkeypatch.setattr(smtp, "quit", failing_quit)
+    await connection.close()
+
+    assert connection._smtp is None
+    assert not smtp.is_connected
@@ -0,0 +1,29 @@
+from typing import Any
+
+import pytest
+from sqlalchemy import Select, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.id_lists import _IdListWriter, id_list_json
+from app.models import Lead, Prospect
+
+
+async def test_rows_split_across_writes_are_joined() -> None:
+    writer = _IdListWriter()
+
+    for data in [b"a\nb", b"", b"b\n", b"c\nd\n"]:
+        await writer.write(data)
+
+    assert writer.finish() == b'{"ids":["a","bb","c","d"]}'
+
+
+async def test_id_list_json_takes_one_uuid_column(session: AsyncSession) -> None:
+    assert await id_list_json(session, select(Lead.lead_id)) == b'{"ids":[]}'
+
+    statements: list[Select[Any]] = [
+        select(Lead.lead_id, Lead.state),
+        select(Prospect.email),
+    ]
+    for statement in statements:
+        with pytest.raises(ValueError, match="one uuid column"):
+            await id_list_json(session, statement)
@@ -0,0 +1,44 @@
+import time
+
+import pytest
+
+from app.core import ids
+
+
+def test_uuid7_layout() -> None:
+    before = time.time_ns() // 1_000_000
+    key = ids.uuid7()
+
+    assert key.version == 7
+    assert key.variant == "specified in RFC 4122"
+    assert key.int >> 80 >= before
+
+
+def test_uuid7_keys_of_one_process_sort_in_creation_order() -> None:
+    keys = [ids.uuid7() for _ in range(10_000)]
+
+    assert keys == sorted(keys)
+    assert len(set(keys)) == len(keys)
+
+
+def test_uuid7_carries_the_millisecond_when_the_clock_steps_back(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    first = ids.uuid7()
+    monkeypatch.setattr(time, "time_ns", lambda: 0)
+
+    assert ids.uuid7() > first
+
+
+def test_uuid7_carries_the_millisecond_when_the_counter_runs_out(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    clock = ids._UUIDv7Clock()
+    monkeypatch.setattr(time, "time_ns", lambda: 5_000_000)
+    clock.tick()
+    clock.counter = ids.COUNTER_MAX
+
+    ms, counter = clock.tick()
+
+    assert ms == 6
+    assert counter <= ids.COUNTER_MAX // 2
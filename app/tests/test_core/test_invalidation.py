@@ -0,0 +1,95 @@
+import asyncio
+import logging
+
+import pytest
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import invalidation
+from app.core.config import get_settings
+from app.core.invalidation import InvalidationListener
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.keys: asyncio.Queue[str] = asyncio.Queue()
+        self.resets = 0
+        self.reset_event = asyncio.Event()
+
+    def handle(self, key: str) -> None:
+        self.keys.put_nowait(key)
+
+    def reset(self) -> None:
+        self.resets += 1
+        self.reset_event.set()
+
+    async def wait_for_reset(self) -> None:
+        await asyncio.wait_for(self.reset_event.wait(), timeout=5)
+        self.reset_event.clear()
+
+
+@pytest.fixture
+def recorder(monkeypatch: pytest.MonkeyPatch) -> Recorder:
+    # handlers of this test only, the app's caches stay registered elsewhere
+    monkeypatch.setattr(invalidation, "_handlers", {})
+    monkeypatch.setattr(invalidation, "_resets", [])
+    recorder = Recorder()
+    invalidation.register_handler("test", recorder.handle, recorder.reset)
+    return recorder
+
+
+async def _notify(session: AsyncSession, payload: str) -> None:
+    channel = get_settings().cache.invalidation_channel
+    await session.execute(select(func.pg_notify(channel, payload)))
+    await session.commit()
+
+
+async def test_notifications_reach_the_handlers_and_reconnects_reset(
+    session: AsyncSession, recorder: Recorder, caplog: pytest.LogCaptureFixture
+) -> None:
+    listener = InvalidationListener(reconnect_delay_secs=0)
+    listener.start()
+    listener.start()
+    await recorder.wait_for_reset()
+
+    await _notify(session, "other:ignored")
+    await _notify(session, "test:key")
+    assert await asyncio.wait_for(recorder.keys.get(), timeout=5) == "key"
+
+    # a dropped connection may have missed notifications, caches are reset
+    # on the disconnect and again once listening
+    with caplog.at_level(logging.WARNING, logger=invalidation.__name__):
+        await session.execute(
+            text(
+                "SELECT pg_terminate_backend(pid) FROM pg_stat_activity"
+                " WHERE datname = current_database() AND query LIKE 'LISTEN %'"
+                " AND pid <> pg_backend_pid()"
+            )
+        )
+        await session.commit()
+        await recorder.wait_for_reset()
+        await recorder.wait_for_reset()
+    assert caplog.messages == ["cache invalidation listener disconnected"]
+    assert recorder.resets == 3
+
+    await _notify(session, "test:again")
+    assert await asyncio.wait_for(recorder.keys.get(), timeout=5) == "again"
+    await listener.stop()
+    await listener.stop()
+
+
+async def test_a_failed_connect_is_retried(
+    recorder: Recorder,
+    monkeypatch: pytest.MonkeyPatch,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    monkeypatch.setattr(get_settings().database, "port", 1)
+    listener = InvalidationListener(reconnect_delay_secs=0)
+
+    with caplog.at_level(logging.ERROR, logger=invalidation.__name__):
+        listener.start()
+        await recorder.wait_for_reset()
+        await recorder.wait_for_reset()
+        await listener.stop()
+
+    assert caplog.messages[:2] == ["cache invalidation listener failed"] * 2
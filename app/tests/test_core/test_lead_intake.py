@@ -0,0 +1,101 @@
+import asyncio
+import hashlib
+import uuid
+from pathlib import Path
+from typing import Any
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api import api_messages
+from app.core import database_session, lead_intake
+from app.core.attorney_cache import detached_copy, get_attorney_cache
+from app.core.lead_intake import file_lead, file_lead_statement
+from app.core.uploads import StagedUpload
+from app.models import Attorney, Lead, Prospect
+
+EMAIL = "ada@example.com"
+
+
+def _staged(content: bytes) -> StagedUpload:
+    return StagedUpload(
+        Path("unused"), len(content), hashlib.sha256(content).hexdigest()
+    )
+
+
+async def test_a_prospect_written_concurrently_is_filed_on_the_second_run(
+    session: AsyncSession, attorney: Attorney
+) -> None:
+    # The other request inserted the prospect and holds it until it commits,
+    # the first run then finds a row its compare and set did not read
+    async with database_session.get_async_session() as other:
+        other_staged = _staged(b"other")
+        await other.scalar(
+            file_lead_statement(),
+            {
+                "prospect_email": EMAIL,
+                "prospect_name": "Other",
+                "new_prospect_id": str(uuid.uuid4()),
+                "new_lead_id": str(uuid.uuid4()),
+                "attorney_id": attorney.attorney_id,
+                "resume_digest": other_staged.sha256,
+                "resume_size": other_staged.size,
+                "email_subject": "subject",
+                "email_recipients": [attorney.email],
+                "email_body": {},
+            },
+        )
+        filing = asyncio.create_task(
+            file_lead(session, _staged(b"mine"), "Ada Lovelace", EMAIL)
+        )
+        await asyncio.sleep(0.2)
+        assert not filing.done()
+        await other.commit()
+
+    response = await filing
+
+    assert response.email == EMAIL
+    prospect = await session.scalar(select(Prospect).where(Prospect.email == EMAIL))
+    assert prospect is not None and prospect.name == "Ada Lovelace"
+    assert await session.scalar(select(func.count()).select_from(Lead)) == 2
+
+
+async def test_an_attorney_removed_after_the_pick_is_picked_again(
+    session: AsyncSession, attorney: Attorney, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    removed = Attorney(
+        attorney_id=str(uuid.uuid4()), name="Removed", email="removed@example.com"
+    )
+    get_attorney_cache().set(removed.attorney_id, removed)
+    # detached like the copies assign_attorney hands out, the rollback
+    # expires what the session holds
+    picks = [removed, detached_copy(attorney)]
+    attorney_id = attorney.attorney_id
+
+    async def assign_attorney(_: AsyncSession) -> Attorney:
+        return picks.pop(0)
+
+    monkeypatch.setattr(lead_intake, "assign_attorney", assign_attorney)
+
+    response = await file_lead(session, _staged(b"resume"), "Ada Lovelace", EMAIL)
+
+    assert response.attorney_id == attorney_id
+    assert get_attorney_cache().get(removed.attorney_id) is None
+
+
+async def test_filing_gives_up_when_the_compare_and_set_keeps_losing(
+    session: AsyncSession, attorney: Attorney, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # Postgres lets the second run through, this is the guard should it not
+    async def lost(*_: Any) -> None:
+        return None
+
+    monkeypatch.setattr(session, "scalar", lost)
+
+    with pytest.raises(HTTPException) as raised:
+        await file_lead(session, _staged(b"resume"), "Ada Lovelace", EMAIL)
+
+    assert raised.value.status_code == 400
+    assert raised.value.detail == api_messages.ERROR_CREATING_LEAD
@@ -0,0 +1,132 @@
+import asyncio
+import hashlib
+import logging
+import time
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import maintenance
+from app.core.config import Maintenance
+from app.models import Attorney, RefreshToken
+
+
+async def _add_tokens(session: AsyncSession, attorney: Attorney) -> None:
+    now = int(time.time())
+    for name, exp in [(b"expired", now - 2 * 24 * 3600), (b"live", now + 3600)]:
+        session.add(
+            RefreshToken(
+                token_hash=hashlib.sha256(name).digest(),
+                exp=exp,
+                attorney_id=attorney.attorney_id,
+            )
+        )
+    await session.commit()
+
+
+async def test_run_maintenance_purges_expired_refresh_tokens(
+    session: AsyncSession, attorney: Attorney
+) -> None:
+    await _add_tokens(session, attorney)
+
+    removed = await maintenance.run_maintenance(
+        Maintenance(batch_size=1, batch_pause_secs=0)
+    )
+
+    assert removed["refresh_tokens"] == 1
+    exps = list(await session.scalars(select(RefreshToken.exp)))
+    assert len(exps) == 1 and exps[0] > time.time()
+
+
+async def test_main_logs_what_it_removed(
+    session: AsyncSession, attorney: Attorney, caplog: pytest.LogCaptureFixture
+) -> None:
+    await _add_tokens(session, attorney)
+
+    with caplog.at_level(logging.INFO, logger=maintenance.__name__):
+        await maintenance._main()
+
+    assert "'refresh_tokens': 1" in caplog.text
+
+
+async def test_run_maintenance_skips_while_another_run_holds_the_lock(
+    session: AsyncSession, attorney: Attorney
+) -> None:
+    await _add_tokens(session, attorney)
+    await session.execute(
+        select(func.pg_advisory_xact_lock(maintenance.MAINTENANCE_LOCK_KEY))
+    )
+
+    removed = await maintenance.run_maintenance(Maintenance(batch_pause_secs=0))
+    await session.rollback()
+
+    assert removed["refresh_tokens"] == 0
+    assert len(list(await session.scalars(select(RefreshToken.exp)))) == 2
+
+
+async def _wait_for_log(caplog: pytest.LogCaptureFixture, text: str) -> None:
+    async with asyncio.timeout(10):
+        while text not in caplog.text:
+            await asyncio.sleep(0.01)
+
+
+async def test_maintenance_job_runs_until_stopped(
+    session: AsyncSession, attorney: Attorney, caplog: pytest.LogCaptureFixture
+) -> None:
+    await _add_tokens(session, attorney)
+    job = maintenance.MaintenanceJob(
+        Maintenance(interval_secs=0.01, batch_pause_secs=0)
+    )
+
+    with caplog.at_level(logging.INFO, logger=maintenance.__name__):
+        job.start()
+        task = job._task
+        # starting twice keeps the running job
+        job.start()
+        assert job._task is task
+        try:
+            await _wait_for_log(caplog, "'refresh_tokens': 1")
+        finally:
+            await job.stop()
+
+    assert job._task is None
+    assert task is not None and task.done()
+    # stopping a stopped job does nothing
+    await job.stop()
+
+
+async def test_maintenance_job_survives_failed_runs(
+    monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture
+) -> None:
+    async def failing_run(config: Maintenance) -> dict[str, int]:
+        raise RuntimeError("database is gone")
+
+    monkeypatch.setattr(maintenance, "run_maintenance", failing_run)
+    job = maintenance.MaintenanceJob(Maintenance(interval_secs=0.01))
+    job.start()
+    try:
+        await _wait_for_log(caplog, "maintenance run failed")
+    finally:
+        await job.stop()
+
+
+def test_disabled_maintenance_job_does_not_start() -> None:
+    job = maintenance.MaintenanceJob(Maintenance(enabled=False))
+
+    job.start()
+
+    assert job._task is None
+
+
+def test_main_runs_maintenance_once(monkeypatch: pytest.MonkeyPatch) -> None:
+    runs: list[None] = []
+
+    async def fake_main() -> None:
+        runs.append(None)
+
+    monkeypatch.setattr(maintenance, "_main", fake_main)
+
+    maintenance.main()
+
+    assert runs == [None]
@@ -0,0 +1,79 @@
+import json
+from pathlib import Path
+
+from fastapi import FastAPI
+from pydantic import BaseModel
+
+from app.core.openapi import routes_hash, use_prebuilt_openapi, write_openapi
+from app.main import app
+
+
+class Item(BaseModel):
+    name: str
+
+
+def _app(schema_file: Path) -> FastAPI:
+    small = FastAPI(title="Items", version="1.0.0")
+
+    @small.get("/items", response_model=list[Item])
+    async def items(limit: int = 10) -> list[Item]:
+        return []
+
+    use_prebuilt_openapi(small, schema_file)
+    return small
+
+
+def test_a_prebuilt_schema_is_loaded(tmp_path: Path) -> None:
+    schema_file = tmp_path / "openapi.json"
+    write_openapi(_app(schema_file), schema_file)
+
+    small = _app(schema_file)
+    # a stand-in the rebuilt schema would not have
+    prebuilt = schema_file.read_text().replace('"Items"', '"Prebuilt"')
+    schema_file.write_text(prebuilt)
+
+    assert small.openapi()["info"]["title"] == "Prebuilt"
+    assert small.openapi() is small.openapi_schema
+
+
+def test_a_schema_for_other_routes_is_rebuilt(tmp_path: Path) -> None:
+    schema_file = tmp_path / "openapi.json"
+    write_openapi(_app(schema_file), schema_file)
+    schema_file.write_text(schema_file.read_text().replace('"Items"', '"Prebuilt"'))
+
+    # same version, one more query parameter
+    small = _app(schema_file)
+
+    @small.get("/other")
+    async def other(offset: int = 0) -> None:
+        pass
+
+    schema = small.openapi()
+    assert schema["info"]["title"] == "Items"
+    assert "/other" in schema["paths"]
+
+
+def test_routes_hash_follows_the_models(tmp_path: Path) -> None:
+    small = _app(tmp_path / "openapi.json")
+    before = routes_hash(small)
+
+    Item.model_fields["name"].description = "changed"
+    try:
+        assert routes_hash(small) != before
+    finally:
+        Item.model_fields["name"].description = None
+    assert routes_hash(small) == before
+
+
+def test_without_a_schema_file_it_is_built(tmp_path: Path) -> None:
+    assert "/items" in _app(tmp_path / "missing.json").openapi()["paths"]
+
+
+def test_the_app_schema_round_trips(tmp_path: Path) -> None:
+    schema_file = tmp_path / "openapi.json"
+    write_openapi(app, schema_file)
+
+    assert json.loads(schema_file.read_text()) == {
+        "routes_hash": routes_hash(app),
+        "schema": app.openapi(),
+    }
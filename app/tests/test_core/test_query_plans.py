@@ -0,0 +1,54 @@
+# EXPLAINs the hot queries of benchmarks/query_plans.py against a seeded
+# database, a Seq Scan on a checked table means an index they rely on is
+# missing or no longer matches the query.
+
+import asyncio
+from collections.abc import AsyncIterator, Iterator
+
+import pytest
+
+from app.core import database_session
+from app.models import Base
+from benchmarks.query_plans import (
+    CHECKS,
+    PlanCheck,
+    explain,
+    load_samples,
+    seed_statements,
+)
+
+# enough rows for the planner to prefer the indexes over scanning the tables,
+# 1000 attorneys among them
+SEED_LEADS = 200_000
+
+
+async def _run(*statements: str) -> None:
+    async with database_session.get_async_engine().begin() as connection:
+        for statement in statements:
+            await connection.exec_driver_sql(statement)
+    await database_session.dispose_async_engine()
+
+
+@pytest.fixture(scope="module", autouse=True)
+def seeded_database() -> Iterator[None]:
+    # Seeded once for the module, which is why clean_database below keeps
+    # the rows between its tests
+    asyncio.run(_run(*seed_statements(SEED_LEADS)))
+    yield
+    tables = ", ".join(f'"{table.name}"' for table in Base.metadata.sorted_tables)
+    asyncio.run(_run(f"TRUNCATE {tables} RESTART IDENTITY CASCADE"))
+
+
+@pytest.fixture(autouse=True)
+async def clean_database() -> AsyncIterator[None]:
+    yield
+    await database_session.dispose_async_engine()
+
+
+@pytest.mark.parametrize("check", CHECKS, ids=lambda check: check.name)
+async def test_query_plan_uses_indexes(check: PlanCheck) -> None:
+    async with database_session.get_async_engine().connect() as connection:
+        samples = await load_samples(connection)
+        plan = await explain(connection, check, samples)
+
+    assert plan["seq_scans"] == [], plan["scans"]
@@ -0,0 +1,101 @@
+import logging
+from collections.abc import AsyncIterator
+
+import httpx
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.types import Receive, Scope, Send
+
+from app.core import database_session, query_stats
+from app.core.config import QueryStats, get_settings
+from app.core.query_stats import (
+    QueryStatsMiddleware,
+    RequestQueries,
+    assert_max_queries,
+    collect_queries,
+    statement_shape,
+)
+from app.main import app
+from app.models import Lead
+
+
+@pytest.fixture
+async def stats_client(
+    monkeypatch: pytest.MonkeyPatch,
+) -> AsyncIterator[httpx.AsyncClient]:
+    # a fresh engine picks up the listeners, like a worker started with
+    # QUERY_STATS__ENABLED=true
+    monkeypatch.setattr(get_settings().query_stats, "enabled", True)
+    await database_session.dispose_async_engine()
+    config = QueryStats(enabled=True, query_budget=0, repeat_threshold=1)
+    transport = httpx.ASGITransport(app=QueryStatsMiddleware(app, config))
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://localhost"
+    ) as client:
+        yield client
+
+
+async def test_requests_report_their_queries(
+    stats_client: httpx.AsyncClient, lead: Lead, caplog: pytest.LogCaptureFixture
+) -> None:
+    with caplog.at_level(logging.WARNING, logger=query_stats.__name__):
+        response = await stats_client.get("/users/leads", params={"limit": 10})
+        # sent over COPY, past the cursor events
+        ids = await stats_client.get("/users/getpendingleads")
+        missing = await stats_client.get("/nowhere")
+
+    assert response.status_code == ids.status_code == 200
+    assert response.headers["server-timing"].endswith('desc="1 queries"')
+    assert ids.headers["server-timing"].endswith('desc="1 queries"')
+    assert missing.status_code == 404
+    assert missing.headers["server-timing"].endswith('desc="0 queries"')
+    warnings = [record.getMessage() for record in caplog.records]
+    assert warnings[0].startswith("GET /users/leads ran 1 queries in ")
+    assert "(budget 0), slowest: ['" in warnings[0]
+    assert warnings[1].startswith("GET /users/leads ran the same statement 1 times")
+    assert warnings[2].startswith("GET /users/getpendingleads ran 1 queries")
+    assert all("/nowhere" not in warning for warning in warnings)
+
+
+async def test_other_scopes_pass_through() -> None:
+    scopes: list[Scope] = []
+
+    async def inner(scope: Scope, receive: Receive, send: Send) -> None:
+        scopes.append(scope)
+
+    middleware = QueryStatsMiddleware(inner, QueryStats())
+    await middleware({"type": "lifespan"}, None, None)  # type: ignore[arg-type]
+
+    assert scopes == [{"type": "lifespan"}]
+
+
+def test_request_queries_keep_the_slowest_and_count_shapes() -> None:
+    with collect_queries(slowest_kept=2) as outer, collect_queries(2) as queries:
+        for secs, statement in [
+            (0.1, "SELECT a FROM t WHERE id IN ($1, $2)"),
+            (0.3, "SELECT a FROM t WHERE id IN ($1)"),
+            (0.2, "SELECT b FROM t"),
+            (0.05, "SELECT c FROM t"),
+        ]:
+            queries.record(statement, secs)
+
+    assert [secs for secs, _ in queries.slowest] == [0.3, 0.2]
+    assert queries.repeated(2) == [("SELECT a FROM t WHERE id IN (?)", 2)]
+    # the enclosing collector saw them too
+    assert outer.count == queries.count == 4
+    assert statement_shape("VALUES ($1::uuid, $2::uuid)\n") == "VALUES (?)"
+    assert RequestQueries().server_timing() == 'db;dur=0.0;desc="0 queries"'
+
+
+async def test_assert_max_queries_lists_the_queries_over_budget(
+    session: AsyncSession,
+) -> None:
+    with (
+        pytest.raises(
+            AssertionError, match=r"2 queries, expected at most 1:\n2x SELECT"
+        ),
+        assert_max_queries(1),
+    ):
+        for _ in range(2):
+            await session.scalar(select(func.count()).select_from(Lead))
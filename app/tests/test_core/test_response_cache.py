@@ -0,0 +1,254 @@
+import asyncio
+import logging
+import socket
+from collections.abc import AsyncIterator
+
+import pytest
+
+from app.core.config import get_settings
+from app.core.response_cache import (
+    CachedResponse,
+    RedisAuth,
+    RedisBackend,
+    RedisError,
+    ResponseCache,
+    SharedBackend,
+    close_response_cache,
+    get_response_cache,
+    read_reply,
+)
+from benchmarks.response_cache import RedisStandIn
+
+
+@pytest.fixture
+async def redis() -> AsyncIterator[RedisStandIn]:
+    stand_in = RedisStandIn(password="secret")
+    await stand_in.start()
+    yield stand_in
+    assert stand_in.server is not None
+    stand_in.server.close()
+
+
+def _url(redis: RedisStandIn, db: int = 0) -> str:
+    assert redis.server is not None
+    return f"redis://127.0.0.1:{redis.server.sockets[0].getsockname()[1]}/{db}"
+
+
+def _backend(url: str, password: str = "secret") -> RedisBackend:
+    return RedisBackend(url, "test:", 0.5, RedisAuth("default", password))
+
+
+class Loads:
+    def __init__(self, body: bytes) -> None:
+        self.body = body
+        self.count = 0
+
+    async def __call__(self) -> bytes:
+        self.count += 1
+        return self.body
+
+
+async def test_workers_share_entries_through_redis(redis: RedisStandIn) -> None:
+    workers = [ResponseCache(30, _backend(_url(redis, db=2))) for _ in range(2)]
+    load = Loads(b'{"ids":[]}')
+
+    first = await workers[0].get("leads", "PENDING", load)
+    second = await workers[1].get("leads", "PENDING", load)
+
+    assert second == first
+    assert load.count == 1
+    assert redis.selected_db == 2
+
+    # the writer bumps the generation, the NOTIFY drops the other's local entry
+    load.body = b'{"ids":["x"]}'
+    await workers[0].invalidate("leads")
+    workers[1].on_notification("leads")
+    workers[1].on_notification("unknown")
+
+    assert (await workers[1].get("leads", "PENDING", load)).body == load.body
+    assert (await workers[0].get("leads", "PENDING", load)).body == load.body
+    assert load.count == 2
+    for worker in workers:
+        await worker.close()
+
+
+async def test_a_notification_bumps_the_generation_once(
+    redis: RedisStandIn,
+) -> None:
+    backend = _backend(_url(redis))
+    cache = ResponseCache(30, backend)
+    generation = await backend.generation("leads")
+
+    for _ in range(3):
+        cache.on_notification("leads")
+    assert cache._bumper is not None
+    await cache._bumper
+
+    assert await backend.generation("leads") == generation + 1
+    await cache.close()
+
+
+async def test_an_unavailable_backend_falls_back_to_loading(
+    redis: RedisStandIn, caplog: pytest.LogCaptureFixture
+) -> None:
+    cache = ResponseCache(30, _backend(_url(redis), password="wrong"))
+    load = Loads(b"[]")
+
+    with caplog.at_level(logging.WARNING):
+        assert (await cache.get("leads", "", load)).body == b"[]"
+        # skipped until retry_secs passed, no second warning
+        cache.clear()
+        await cache.get("leads", "", load)
+    assert load.count == 2
+    assert [record.message for record in caplog.records] == [
+        "shared response cache unavailable: RedisError('WRONGPASS invalid "
+        "username-password pair')"
+    ]
+
+    caplog.clear()
+    cache.shared = _backend(_url(redis))
+    cache._retry_at = 0
+    cache.clear()
+    with caplog.at_level(logging.WARNING):
+        await cache.get("leads", "", load)
+    assert caplog.messages == ["shared response cache available again"]
+    await cache.close()
+
+
+class DictBackend(SharedBackend):
+    def __init__(self) -> None:
+        self.generations: dict[str, int] = {}
+        self.entries: dict[tuple[str, int], bytes] = {}
+
+    async def generation(self, table: str) -> int:
+        return self.generations.get(table, 0)
+
+    async def bump(self, table: str) -> None:
+        self.generations[table] = self.generations.get(table, 0) + 1
+
+    async def get(self, key: str, generation: int) -> bytes | None:
+        return self.entries.get((key, generation))
+
+    async def set(
+        self, key: str, generation: int, value: bytes, ttl_secs: float
+    ) -> None:
+        self.entries[key, generation] = value
+
+
+async def test_a_load_racing_with_a_write_is_not_served() -> None:
+    backend = DictBackend()
+    cache = ResponseCache(30, backend)
+    loading = asyncio.Event()
+    written = asyncio.Event()
+
+    async def stale_load() -> bytes:
+        loading.set()
+        await written.wait()
+        return b"stale"
+
+    polls = [asyncio.create_task(cache.get("leads", "", stale_load)) for _ in range(2)]
+    await loading.wait()
+    await cache.invalidate("leads")
+    written.set()
+
+    # both polls shared the one load, which went under the old generation
+    assert [(await poll).body for poll in polls] == [b"stale", b"stale"]
+    assert backend.entries == {("leads", 0): CachedResponse.for_body(b"stale").encode()}
+    assert (await cache.get("leads", "", Loads(b"fresh"))).body == b"fresh"
+    assert CachedResponse.decode(backend.entries["leads", 1]).body == b"fresh"
+    await cache.close()
+
+
+async def test_redis_backend_reconnects_after_a_failed_command(
+    redis: RedisStandIn,
+) -> None:
+    backend = _backend(_url(redis))
+
+    with pytest.raises(RedisError, match="unknown command"):
+        await backend.execute("FLUSHALL")
+    # an error reply leaves the connection usable
+    assert await backend.execute("PING") == "PONG"
+
+    # a reply that never arrives closes the connection mid-command
+    with socket.socket() as listener:
+        listener.bind(("127.0.0.1", 0))
+        listener.listen()
+        silent = _backend(f"redis://127.0.0.1:{listener.getsockname()[1]}/0")
+        silent.timeout_secs = 0.05
+        with pytest.raises(TimeoutError):
+            await silent.execute("PING")
+    assert silent._writer is None
+
+    await backend.set("leads", 1, b"value", ttl_secs=30)
+    assert await backend.get("leads", 1) == b"value"
+    await backend.close()
+
+
+async def test_redis_backend_without_a_username_or_password(
+    redis: RedisStandIn,
+) -> None:
+    redis.password = None
+    assert await RedisBackend(_url(redis), "", 0.5).execute("PING") == "PONG"
+
+    redis.password = "secret"
+    backend = RedisBackend(_url(redis), "", 0.5, RedisAuth(password="secret"))
+    assert await backend.execute("INCR", "counter") == 1
+    await backend.close()
+
+
+def test_redis_backend_rejects_other_urls() -> None:
+    with pytest.raises(ValueError, match="not a redis"):
+        RedisBackend("http://localhost:6379", "", 0.5)
+
+    backend = RedisBackend("rediss://cache.internal", "", 0.5)
+    assert (backend.host, backend.port, backend.db, backend.tls) == (
+        "cache.internal",
+        6379,
+        0,
+        True,
+    )
+
+
+@pytest.mark.parametrize(
+    ("data", "reply"),
+    [
+        (b"+OK\r\n", "OK"),
+        (b":42\r\n", 42),
+        (b"$3\r\nabc\r\n", b"abc"),
+        (b"$-1\r\n", None),
+        (b"*-1\r\n", None),
+        (b"*2\r\n:1\r\n$1\r\nx\r\n", [1, b"x"]),
+    ],
+)
+async def test_read_reply(data: bytes, reply: object) -> None:
+    reader = asyncio.StreamReader()
+    reader.feed_data(data)
+
+    assert await read_reply(reader) == reply
+
+
+async def test_read_reply_rejects_unknown_replies() -> None:
+    reader = asyncio.StreamReader()
+    reader.feed_data(b"?what\r\n")
+
+    with pytest.raises(ConnectionError, match="unexpected redis reply"):
+        await read_reply(reader)
+
+
+async def test_get_response_cache_uses_redis_when_configured(
+    redis: RedisStandIn, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    settings = get_settings().cache
+    monkeypatch.setattr(settings, "redis_url", _url(redis))
+    get_response_cache.cache_clear()
+    try:
+        cache = get_response_cache()
+        assert isinstance(cache.shared, RedisBackend)
+        assert cache.shared.key_prefix == settings.redis_key_prefix
+        await cache.get("leads", "", Loads(b"[]"))
+        assert cache.shared._writer is not None
+
+        await close_response_cache()
+        assert cache.shared._writer is None
+    finally:
+        get_response_cache.cache_clear()
@@ -0,0 +1,119 @@
+import datetime
+import io
+import os
+from pathlib import Path
+
+import pytest
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.core.storage import LocalBlobBackend, ResumeStore
+from app.models import ResumeBlob
+
+
+class UnavailableBackend(LocalBlobBackend):
+    async def put(self, digest: str, source: Path) -> None:
+        raise OSError("backend unavailable")
+
+
+class RacingBackend(LocalBlobBackend):
+    # another worker on the host took the pending file first
+    async def put(self, digest: str, source: Path) -> None:
+        raise FileNotFoundError(source)
+
+
+@pytest.fixture(autouse=True)
+def storage_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    # pending_dir is scanned whole, keep it apart from other test workers
+    settings = get_settings().resume
+    monkeypatch.setattr(settings, "storage_dir", tmp_path)
+    monkeypatch.setattr(settings, "persist_attempts", 2)
+    monkeypatch.setattr(settings, "persist_retry_secs", 0)
+    return tmp_path
+
+
+async def test_persist_parks_the_blob_and_retry_pending_stores_it(
+    storage_dir: Path,
+) -> None:
+    store = ResumeStore(UnavailableBackend(storage_dir))
+    staged = await store.stage_fileobj(io.BytesIO(b"resume"))
+
+    await store.persist(staged)
+
+    parked = storage_dir / ".pending" / staged.sha256
+    assert parked.read_bytes() == b"resume"
+    assert not staged.path.exists()
+    with pytest.raises(OSError, match="backend unavailable"):
+        await store.retry_pending()
+    store.backend = RacingBackend(storage_dir)
+    assert await store.retry_pending() == 0
+    assert parked.exists()
+
+    store.backend = LocalBlobBackend(storage_dir)
+    assert await store.retry_pending() == 1
+    assert not parked.exists()
+    assert await store.backend.exists(staged.sha256)
+
+
+async def test_persist_drops_the_staged_file_when_the_blob_is_stored(
+    storage_dir: Path,
+) -> None:
+    store = ResumeStore(LocalBlobBackend(storage_dir))
+    first = await store.stage_fileobj(io.BytesIO(b"resume"))
+    second = await store.stage_fileobj(io.BytesIO(b"resume"))
+
+    await store.persist(first)
+    await store.persist(second)
+
+    assert not second.path.exists()
+    blob = LocalBlobBackend(storage_dir).path_for(first.sha256)
+    assert blob.read_bytes() == b"resume"
+
+
+async def test_local_backend_moves_across_filesystems(
+    storage_dir: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def cross_device(*_: object) -> None:
+        raise OSError("Invalid cross-device link")
+
+    backend = LocalBlobBackend(storage_dir / "blobs")
+    source = storage_dir / "staged"
+    source.write_bytes(b"resume")
+    monkeypatch.setattr(os, "replace", cross_device)
+
+    await backend.put("ab" * 32, source)
+
+    assert backend.path_for("ab" * 32).read_bytes() == b"resume"
+    assert not source.exists()
+
+
+async def test_collect_garbage_removes_expired_blobs(
+    session: AsyncSession, storage_dir: Path
+) -> None:
+    store = ResumeStore(LocalBlobBackend(storage_dir))
+    await store.acquire(session, [])
+    await store.release(session, [])
+    kept, expired = [
+        await store.stage_fileobj(io.BytesIO(content)) for content in (b"a", b"b")
+    ]
+    await store.acquire(session, [kept, expired])
+    await store.release(session, [kept.sha256, expired.sha256])
+    # both unreferenced, only one past the grace period
+    await session.execute(
+        update(ResumeBlob)
+        .where(ResumeBlob.digest == expired.sha256)
+        .values(
+            update_time=datetime.datetime.now(datetime.UTC)
+            - datetime.timedelta(seconds=get_settings().resume.gc_grace_secs + 60)
+        )
+    )
+    await session.commit()
+    for staged in (kept, expired):
+        await store.persist(staged)
+
+    assert await store.collect_garbage(session) == 1
+
+    assert list(await session.scalars(select(ResumeBlob.digest))) == [kept.sha256]
+    assert not await store.backend.exists(expired.sha256)
+    assert await store.backend.exists(kept.sha256)
@@ -0,0 +1,179 @@
+import hashlib
+import hmac
+import threading
+from collections.abc import Iterator
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+from app.core.config import get_settings
+from app.core.storage import S3BlobBackend, S3Bucket, get_resume_store
+
+ACCESS_KEY = "access"
+SECRET_KEY = "secret"
+REGION = "eu-central-1"
+
+
+def _signature(handler: BaseHTTPRequestHandler, secret_key: str) -> str:
+    # Signature V4 as the S3 docs spell it out, for the headers the backend signs
+    amz_date = handler.headers["x-amz-date"]
+    scope = f"{amz_date[:8]}/{REGION}/s3/aws4_request"
+    names = ["host", "x-amz-content-sha256", "x-amz-date"]
+    canonical_headers = "".join(f"{name}:{handler.headers[name]}\n" for name in names)
+    canonical_request = (
+        f"{handler.command}\n{handler.path}\n\n{canonical_headers}\n"
+        f"{';'.join(names)}\n{handler.headers['x-amz-content-sha256']}"
+    )
+    string_to_sign = (
+        f"AWS4-HMAC-SHA256\n{amz_date}\n{scope}\n"
+        f"{hashlib.sha256(canonical_request.encode()).hexdigest()}"
+    )
+    key = f"AWS4{secret_key}".encode()
+    for part in scope.split("/"):
+        key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+    return hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+
+
+class FakeS3(ThreadingHTTPServer):
+    # Just enough of S3 for the backend: HEAD, PUT and DELETE of objects,
+    # signed requests and the payload hash check
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), FakeS3Handler)
+        self.objects: dict[str, bytes] = {}
+
+    @property
+    def endpoint_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class FakeS3Handler(BaseHTTPRequestHandler):
+    server: FakeS3
+
+    def log_message(self, *_: object) -> None:
+        pass
+
+    def _reply(self, status: HTTPStatus, body: bytes = b"") -> None:
+        self.send_response(status)
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _authorized(self) -> bool:
+        credential = f"Credential={ACCESS_KEY}/"
+        authorization = self.headers.get("authorization", "")
+        return credential in authorization and authorization.endswith(
+            f"Signature={_signature(self, SECRET_KEY)}"
+        )
+
+    def do_HEAD(self) -> None:
+        if not self._authorized():
+            self._reply(HTTPStatus.FORBIDDEN)
+        elif self.path in self.server.objects:
+            self._reply(HTTPStatus.OK)
+        else:
+            self._reply(HTTPStatus.NOT_FOUND)
+
+    def do_PUT(self) -> None:
+        body = self.rfile.read(int(self.headers["content-length"]))
+        if not self._authorized():
+            self._reply(HTTPStatus.FORBIDDEN, b"<Code>SignatureDoesNotMatch</Code>")
+        elif hashlib.sha256(body).hexdigest() != self.headers["x-amz-content-sha256"]:
+            self._reply(HTTPStatus.BAD_REQUEST, b"<Code>BadDigest</Code>")
+        else:
+            self.server.objects[self.path] = body
+            self._reply(HTTPStatus.OK)
+
+    def do_DELETE(self) -> None:
+        if not self._authorized():
+            self._reply(HTTPStatus.FORBIDDEN)
+        else:
+            self.server.objects.pop(self.path, None)
+            self._reply(HTTPStatus.NO_CONTENT)
+
+
+@pytest.fixture
+def fake_s3() -> Iterator[FakeS3]:
+    server = FakeS3()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _backend(fake_s3: FakeS3, secret_key: str = SECRET_KEY) -> S3BlobBackend:
+    bucket = S3Bucket(fake_s3.endpoint_url, "resumes", REGION, key_prefix="cv/")
+    return S3BlobBackend(bucket, access_key=ACCESS_KEY, secret_key=secret_key)
+
+
+def _blob(tmp_path: Path, content: bytes) -> tuple[str, Path]:
+    path = tmp_path / "staged"
+    path.write_bytes(content)
+    return hashlib.sha256(content).hexdigest(), path
+
+
+async def test_s3_backend_stores_and_deletes_blobs(
+    fake_s3: FakeS3, tmp_path: Path
+) -> None:
+    backend = _backend(fake_s3)
+    digest, path = _blob(tmp_path, b"resume")
+
+    assert not await backend.exists(digest)
+    await backend.put(digest, path)
+
+    assert fake_s3.objects == {f"/resumes/cv/{digest}": b"resume"}
+    assert not path.exists()
+    assert await backend.exists(digest)
+
+    await backend.delete(digest)
+    assert fake_s3.objects == {}
+    # already gone is fine, garbage collection may run twice
+    await backend.delete(digest)
+
+
+async def test_s3_backend_keeps_the_source_when_the_upload_fails(
+    fake_s3: FakeS3, tmp_path: Path
+) -> None:
+    backend = _backend(fake_s3)
+    _, path = _blob(tmp_path, b"resume")
+
+    with pytest.raises(OSError, match="400.*BadDigest"):
+        await backend.put(hashlib.sha256(b"other").hexdigest(), path)
+
+    assert path.exists()
+    assert fake_s3.objects == {}
+
+
+async def test_s3_backend_raises_on_rejected_signatures(
+    fake_s3: FakeS3, tmp_path: Path
+) -> None:
+    backend = _backend(fake_s3, secret_key="wrong")
+    digest, path = _blob(tmp_path, b"resume")
+
+    with pytest.raises(OSError, match="403"):
+        await backend.exists(digest)
+    with pytest.raises(OSError, match="403.*SignatureDoesNotMatch"):
+        await backend.put(digest, path)
+    with pytest.raises(OSError, match="403"):
+        await backend.delete(digest)
+
+
+async def test_resume_store_uses_the_configured_backend(
+    fake_s3: FakeS3, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    settings = get_settings().resume
+    monkeypatch.setattr(settings, "backend", "s3")
+    monkeypatch.setattr(settings, "s3_endpoint_url", fake_s3.endpoint_url)
+    get_resume_store.cache_clear()
+    try:
+        backend = get_resume_store().backend
+    finally:
+        get_resume_store.cache_clear()
+
+    assert isinstance(backend, S3BlobBackend)
+    assert backend.bucket == S3Bucket(
+        fake_s3.endpoint_url, settings.s3_bucket, settings.s3_region, "resumes/"
+    )
@@ -0,0 +1,46 @@
+import io
+from pathlib import Path
+
+import pytest
+from fastapi import UploadFile
+
+from app.core.config import get_settings
+from app.core.uploads import ResumeTooLarge, stage_fileobj, stage_upload
+
+
+@pytest.fixture(autouse=True)
+def small_limits(monkeypatch: pytest.MonkeyPatch) -> None:
+    settings = get_settings().resume
+    monkeypatch.setattr(settings, "max_upload_bytes", 8)
+    monkeypatch.setattr(settings, "upload_chunk_bytes", 4)
+
+
+async def test_stage_upload_removes_the_partial_file(tmp_path: Path) -> None:
+    # no size up front, like a stream, the limit is hit while copying
+    upload = UploadFile(io.BytesIO(b"x" * 9), size=None)
+
+    with pytest.raises(ResumeTooLarge):
+        await stage_upload(upload, tmp_path)
+
+    assert list(tmp_path.iterdir()) == []
+
+
+async def test_stage_upload_refuses_a_known_size_before_staging(
+    tmp_path: Path,
+) -> None:
+    upload = UploadFile(io.BytesIO(b"x" * 9), size=9)
+
+    with pytest.raises(ResumeTooLarge):
+        await stage_upload(upload, tmp_path / "staging")
+
+    assert not (tmp_path / "staging").exists()
+
+
+def test_stage_fileobj_removes_the_partial_file(tmp_path: Path) -> None:
+    with pytest.raises(ResumeTooLarge):
+        stage_fileobj(io.BytesIO(b"x" * 9), tmp_path)
+
+    assert list(tmp_path.iterdir()) == []
+
+    staged = stage_fileobj(io.BytesIO(b"x" * 8), tmp_path)
+    assert (staged.size, staged.path.read_bytes()) == (8, b"x" * 8)
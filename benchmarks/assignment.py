@@ -0,0 +1,128 @@
+# Attorney assignment cost as the attorney table grows
+#
+# In-process part (no database): cost of one pick for the random and round
+# robin strategies with a preloaded directory of N attorneys.
+#
+# python -m benchmarks.assignment --sizes 10 1000 100000 1000000
+#
+# With --database the picks run against the configured database instead (seed
+# it first, see benchmarks.seed) and the old ORDER BY random() query is timed
+# next to the three strategies.
+
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Any
+
+os.environ.setdefault("SECURITY__JWT_SECRET_KEY", "benchmark")
+os.environ.setdefault("DATABASE__PASSWORD", "benchmark")
+
+from sqlalchemy import func, select  # noqa: E402
+
+from app.core import database_session  # noqa: E402
+from app.core.assignment import (  # noqa: E402
+    AssignmentStrategy,
+    AttorneyDirectory,
+    LeastLoadedStrategy,
+    RandomStrategy,
+    RoundRobinStrategy,
+)
+from app.models import Attorney  # noqa: E402
+
+
+class _SequenceSession:
+    # Stands in for the nextval() round trip of the round robin strategy
+    def __init__(self) -> None:
+        self.turn = 0
+
+    async def scalars(self, _: Any) -> list[int]:
+        self.turn += 1
+        return [self.turn]
+
+
+async def _time_picks(
+    strategy: AssignmentStrategy, session: Any, iterations: int
+) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await strategy.pick(session)
+    return (time.perf_counter() - start) / iterations * 1_000_000
+
+
+async def in_process(sizes: list[int], iterations: int) -> dict[str, dict[str, float]]:
+    report = {}
+    for size in sizes:
+        directory = AttorneyDirectory(refresh_secs=float("inf"))
+        directory._ids = [str(uuid.uuid4()) for _ in range(size)]
+        directory._loaded_at = time.monotonic()
+
+        report[str(size)] = {
+            "random_us": round(
+                await _time_picks(RandomStrategy(directory), None, iterations), 3
+            ),
+            "round_robin_us": round(
+                await _time_picks(
+                    RoundRobinStrategy(directory), _SequenceSession(), iterations
+                ),
+                3,
+            ),
+        }
+    return report
+
+
+async def against_database(iterations: int) -> dict[str, Any]:
+    async with database_session.get_async_session() as session:
+        attorneys = await session.scalar(select(func.count()).select_from(Attorney))
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await session.scalar(select(Attorney).order_by(func.random()).limit(1))
+        order_by_random = (time.perf_counter() - start) / iterations * 1_000_000
+
+        directory = AttorneyDirectory(refresh_secs=float("inf"))
+        await directory.get_ids(session)
+        report = {
+            "attorneys": attorneys,
+            "order_by_random_us": round(order_by_random, 1),
+            "random_us": round(
+                await _time_picks(RandomStrategy(directory), session, iterations), 1
+            ),
+            "round_robin_us": round(
+                await _time_picks(RoundRobinStrategy(directory), session, iterations), 1
+            ),
+            "least_loaded_us": round(
+                await _time_picks(LeastLoadedStrategy(), session, iterations), 1
+            ),
+        }
+    await database_session.dispose_async_engine()
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="attorney assignment benchmark")
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10, 1_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--iterations", type=int, default=10_000)
+    parser.add_argument("--database", action="store_true")
+    parser.add_argument("--output", type=Path)
+    args = parser.parse_args()
+
+    if args.database:
+        report: dict[str, Any] = asyncio.run(
+            against_database(min(args.iterations, 200))
+        )
+    else:
+        report = asyncio.run(in_process(args.sizes, args.iterations))
+    print(json.dumps(report, indent=2))
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+# Database round trips and latency of filing one lead, old flow vs file_lead
+#
+# "legacy" replays the queries /users/filelead ran before it was rewritten:
+# select the prospect, insert it and commit, select it again, load the
+# attorney, insert the lead and commit. "single" is app.core.lead_intake.
+# Round trips are counted from engine events (statements, BEGIN, COMMIT).
+#
+# Needs a migrated database with at least one attorney (POST /auth/register):
+# python -m benchmarks.filelead --iterations 2000 --concurrency 8
+#
+# --emails N files the leads for N distinct emails instead of a new one each
+# time, which exercises the update path and concurrent same email requests.
+# Rows created here are left in the database.
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Any
+
+os.environ.setdefault("SECURITY__JWT_SECRET_KEY", "benchmark")
+os.environ.setdefault("DATABASE__PASSWORD", "benchmark")
+
+from sqlalchemy import event, select  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession  # noqa: E402
+
+from app.core import database_session  # noqa: E402
+from app.core.assignment import get_assignment_strategy  # noqa: E402
+from app.core.email_outbox import enqueue_emails, new_lead_email  # noqa: E402
+from app.core.lead_intake import file_lead  # noqa: E402
+from app.core.lead_stats import adjust_lead_counts, transition_deltas  # noqa: E402
+from app.core.storage import get_resume_store  # noqa: E402
+from app.core.uploads import StagedUpload  # noqa: E402
+from app.models import Attorney, Lead, Prospect  # noqa: E402
+
+
+async def legacy_file_lead(
+    session: AsyncSession, staged: StagedUpload, name: str, email: str
+) -> None:
+    store = get_resume_store()
+    user = await session.scalar(select(Prospect).where(Prospect.email == email))
+    if user is None:
+        user = Prospect(email=email, name=name, resume=staged.sha256)
+        session.add(user)
+        await store.acquire(session, [staged])
+        await session.commit()
+    elif user.resume != staged.sha256:
+        await store.release(session, [user.resume])
+        await store.acquire(session, [staged])
+        user.resume = staged.sha256
+        session.add(user)
+
+    prospect = await session.scalar(select(Prospect).where(Prospect.email == email))
+    attorney_id = await get_assignment_strategy().pick(session)
+    attorney = await session.get(Attorney, attorney_id)
+    # both were written or picked just above
+    assert prospect is not None and attorney is not None
+    lead = Lead(
+        lead_id=str(uuid.uuid4()),
+        prospect_id=prospect.prospect_id,
+        attorney_id=attorney.attorney_id,
+        state="PENDING",
+    )
+    session.add(lead)
+    await adjust_lead_counts(
+        session, transition_deltas(lead.attorney_id, None, lead.state)
+    )
+    await enqueue_emails(
+        session,
+        [
+            new_lead_email(
+                lead.lead_id, attorney.name, attorney.email, prospect.name, email
+            )
+        ],
+    )
+    await session.commit()
+
+
+VARIANTS = {"legacy": legacy_file_lead, "single": file_lead}
+
+
+def _percentile(samples: list[float], percent: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+async def run(
+    variant: str, iterations: int, concurrency: int, emails: int
+) -> dict[str, Any]:
+    engine = database_session.get_async_engine().sync_engine
+    round_trips: Counter[str] = Counter()
+
+    def count(kind: str) -> Any:
+        def listener(*_: Any, **__: Any) -> None:
+            round_trips[kind] += 1
+
+        return listener
+
+    listeners = {
+        "before_cursor_execute": count("statements"),
+        "begin": count("begin"),
+        "commit": count("commit"),
+        "rollback": count("rollback"),
+    }
+    for name, listener in listeners.items():
+        event.listen(engine, name, listener)
+
+    run_id = uuid.uuid4().hex[:8]
+    file_lead_fn = VARIANTS[variant]
+    latencies: list[float] = []
+    errors: Counter[str] = Counter()
+    queue: asyncio.Queue[int] = asyncio.Queue()
+    for iteration in range(iterations):
+        queue.put_nowait(iteration)
+
+    async def worker() -> None:
+        while not queue.empty():
+            iteration = queue.get_nowait()
+            number = random.randrange(emails) if emails else iteration
+            # A different resume every time, so updates also move blob refs
+            digest = hashlib.sha256(f"{run_id}-{iteration}".encode()).hexdigest()
+            staged = StagedUpload(Path(os.devnull), 1024, digest)
+            start = time.perf_counter()
+            try:
+                async with database_session.get_async_session() as session:
+                    await file_lead_fn(
+                        session,
+                        staged,
+                        "Bench Prospect",
+                        f"bench-{run_id}-{number}@example.com",
+                    )
+            except Exception as error:
+                # legacy loses same email races with an IntegrityError
+                errors[type(error).__name__] += 1
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    for name, listener in listeners.items():
+        event.remove(engine, name, listener)
+
+    return {
+        "iterations": iterations,
+        "round_trips_per_lead": round(sum(round_trips.values()) / iterations, 2),
+        "statements_per_lead": round(round_trips["statements"] / iterations, 2),
+        "transactions_per_lead": round(round_trips["commit"] / iterations, 2),
+        "p50_ms": round(_percentile(latencies, 50), 2),
+        "p99_ms": round(_percentile(latencies, 99), 2),
+        "leads_per_sec": round(iterations / elapsed, 1),
+        "errors": dict(errors),
+    }
+
+
+async def main_async(args: argparse.Namespace) -> dict[str, Any]:
+    report: dict[str, Any] = {"concurrency": args.concurrency, "emails": args.emails}
+    for variant in args.variants:
+        report[variant] = await run(
+            variant, args.iterations, args.concurrency, args.emails
+        )
+    await database_session.dispose_async_engine()
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="filelead round trip and latency benchmark"
+    )
+    parser.add_argument("--iterations", type=int, default=1_000)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--emails", type=int, default=0)
+    parser.add_argument(
+        "--variants", nargs="+", choices=list(VARIANTS), default=list(VARIANTS)
+    )
+    parser.add_argument("--output", type=Path)
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    print(json.dumps(report, indent=2))
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
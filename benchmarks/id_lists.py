@@ -0,0 +1,167 @@
+# Serialization of large id list responses, rows and models against COPY
+#
+# Fills a scratch table per size (--sizes, 10k, 100k and 1M ids) and serves
+# all of its ids, like the endpoints do, through two FastAPI routes over the
+# ASGI app:
+# - rows: the ids fetched through the ORM into IDList, validated and dumped
+#   by FastAPI's response_model, what /users/get* did before
+# - copy: app/core/id_lists.py, COPY output turned into the JSON bytes
+# Reports wall and CPU time per request (best of --repeat) and the peak of
+# Python allocations (tracemalloc, a separate run). Exits with 1 when the two
+# bodies differ in more than the order of the ids, which no ORDER BY fixes.
+# The scratch tables are dropped afterwards.
+#
+# python -m benchmarks.id_lists
+# python -m benchmarks.id_lists --sizes 10000,100000 --repeat 5
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any
+
+os.environ.setdefault("SECURITY__JWT_SECRET_KEY", "benchmark")
+os.environ.setdefault("DATABASE__PASSWORD", "benchmark")
+
+import httpx  # noqa: E402
+from fastapi import FastAPI, Response  # noqa: E402
+from sqlalchemy import Column, MetaData, Table, Uuid, select, text  # noqa: E402
+
+from app.core import database_session  # noqa: E402
+from app.core.id_lists import id_list_json  # noqa: E402
+from app.schemas.responses import IDList  # noqa: E402
+
+metadata = MetaData()
+
+
+def scratch_table(size: int) -> Table:
+    name = f"id_list_bench_{size}"
+    if name in metadata.tables:
+        return metadata.tables[name]
+    return Table(name, metadata, Column("id", Uuid(as_uuid=False), primary_key=True))
+
+
+app = FastAPI()
+
+
+@app.get("/rows", response_model=IDList)
+async def rows(size: int) -> IDList:
+    async with database_session.get_async_session() as session:
+        return IDList(ids=list(await session.scalars(select(scratch_table(size).c.id))))
+
+
+@app.get("/copy", response_model=IDList)
+async def copy(size: int) -> Response:
+    async with database_session.get_async_session() as session:
+        body = await id_list_json(session, select(scratch_table(size).c.id))
+    return Response(body, media_type="application/json")
+
+
+def same_ids(before: bytes, after: bytes) -> bool:
+    return len(before) == len(after) and sorted(json.loads(before)["ids"]) == sorted(
+        json.loads(after)["ids"]
+    )
+
+
+async def measure(
+    client: httpx.AsyncClient, path: str, size: int, repeat: int
+) -> dict[str, Any]:
+    best_wall = best_cpu = float("inf")
+    body = b""
+    for _ in range(repeat):
+        wall, cpu = time.perf_counter(), time.process_time()
+        response = await client.get(path, params={"size": size})
+        best_wall = min(best_wall, time.perf_counter() - wall)
+        best_cpu = min(best_cpu, time.process_time() - cpu)
+        response.raise_for_status()
+        body = response.content
+
+    tracemalloc.start()
+    await client.get(path, params={"size": size})
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "wall_ms": round(best_wall * 1000, 1),
+        "cpu_ms": round(best_cpu * 1000, 1),
+        "peak_mb": round(peak / 1024**2, 1),
+        "body": body,
+    }
+
+
+async def main_async(args: argparse.Namespace) -> dict[str, Any]:
+    async with database_session.get_async_session() as session:
+        for size in args.sizes:
+            table = scratch_table(size)
+            await session.execute(text(f"DROP TABLE IF EXISTS {table.name}"))
+            await session.execute(
+                text(f"CREATE TABLE {table.name} (id uuid PRIMARY KEY)")
+            )
+            await session.execute(
+                text(
+                    f"INSERT INTO {table.name} SELECT gen_random_uuid() FROM generate_series(1, :rows)"
+                ),
+                {"rows": size},
+            )
+        await session.commit()
+
+    results: dict[str, Any] = {}
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://localhost", timeout=None
+        ) as client:
+            for size in args.sizes:
+                before = await measure(client, "/rows", size, args.repeat)
+                after = await measure(client, "/copy", size, args.repeat)
+                same = same_ids(before.pop("body"), after.pop("body"))
+                results[str(size)] = {
+                    "rows": before,
+                    "copy": after,
+                    "cpu_saved": round(1 - after["cpu_ms"] / before["cpu_ms"], 3),
+                    "peak_saved": round(
+                        1 - after["peak_mb"] / max(before["peak_mb"], 0.1), 3
+                    ),
+                    "same_ids": same,
+                }
+                print(f"{size}: {json.dumps(results[str(size)])}", file=sys.stderr)
+    finally:
+        async with database_session.get_async_session() as session:
+            for size in args.sizes:
+                await session.execute(text(f"DROP TABLE {scratch_table(size).name}"))
+            await session.commit()
+        await database_session.dispose_async_engine()
+
+    return {
+        "sizes": results,
+        "failed": [size for size, result in results.items() if not result["same_ids"]],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="id list serialization, rows and models against COPY"
+    )
+    parser.add_argument(
+        "--sizes",
+        type=lambda value: [int(size) for size in value.split(",")],
+        default=[10_000, 100_000, 1_000_000],
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", type=Path)
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    print(json.dumps(report, indent=2))
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    if report["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
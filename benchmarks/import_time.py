@@ -0,0 +1,94 @@
+# Import time benchmark for app.main
+#
+# Runs `python -X importtime -c "import app.main"` in fresh interpreters and
+# reports the cumulative import cost of the app and its slowest modules.
+#
+# python -m benchmarks.import_time --runs 10 --output import_time.json
+# python -m benchmarks.import_time --baseline import_time.json --max-regression 0.2
+#
+# With --baseline the run fails (exit code 1) when the median import time grew
+# by more than --max-regression compared to the stored result.
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).parent.parent
+
+# importtime lines look like: "import time:   1234 |      5678 |   app.main"
+IMPORT_TIME_PREFIX = "import time:"
+
+
+def measure_once(module: str) -> dict[str, int]:
+    env = {
+        # settings without defaults, import must not need a real database
+        "SECURITY__JWT_SECRET_KEY": "benchmark",
+        "DATABASE__PASSWORD": "benchmark",
+        **os.environ,
+    }
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    cumulative_us: dict[str, int] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith(IMPORT_TIME_PREFIX) or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len(IMPORT_TIME_PREFIX) :].split("|")
+        cumulative_us[name.strip()] = int(cumulative)
+    return cumulative_us
+
+
+def run(module: str, runs: int, top: int) -> dict[str, object]:
+    samples = [measure_once(module) for _ in range(runs)]
+    totals = [sample[module] for sample in samples]
+    slowest = sorted(samples[-1].items(), key=lambda item: item[1], reverse=True)
+
+    return {
+        "module": module,
+        "runs": runs,
+        "median_us": int(statistics.median(totals)),
+        "min_us": min(totals),
+        "max_us": max(totals),
+        "slowest_modules_us": dict(slowest[:top]),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Import time benchmark for app.main")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--baseline", type=Path)
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    report = run(args.module, args.runs, args.top)
+    print(json.dumps(report, indent=2))
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        allowed = baseline["median_us"] * (1 + args.max_regression)
+        if report["median_us"] > allowed:
+            print(
+                f"import time regressed: {report['median_us']}us > {int(allowed)}us allowed",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
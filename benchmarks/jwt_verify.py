@@ -0,0 +1,57 @@
+# Microbenchmark of verify_jwt_token with and without the verified token cache
+#
+# python -m benchmarks.jwt_verify --iterations 50000 --output jwt_verify.json
+
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+
+os.environ.setdefault("SECURITY__JWT_SECRET_KEY", "benchmark")
+os.environ.setdefault("DATABASE__PASSWORD", "benchmark")
+
+from app.core.security.jwt import (  # noqa: E402
+    create_jwt_token,
+    get_verified_token_cache,
+    verify_jwt_token,
+)
+
+
+def per_call_us(iterations: int, cached: bool) -> float:
+    token = create_jwt_token(
+        user_id="7d5b4c43-3a8e-4f7b-8f0d-b0d3bde0c2a1"
+    ).access_token
+    cache = get_verified_token_cache()
+    cache.clear()
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        if not cached:
+            cache.clear()
+        verify_jwt_token(token)
+    return (time.perf_counter() - start) / iterations * 1_000_000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="verify_jwt_token microbenchmark")
+    parser.add_argument("--iterations", type=int, default=20_000)
+    parser.add_argument("--output", type=Path)
+    args = parser.parse_args()
+
+    uncached = per_call_us(args.iterations, cached=False)
+    cached = per_call_us(args.iterations, cached=True)
+    report = {
+        "iterations": args.iterations,
+        "uncached_us_per_call": round(uncached, 3),
+        "cached_us_per_call": round(cached, 3),
+        "speedup": round(uncached / cached, 1),
+    }
+    print(json.dumps(report, indent=2))
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
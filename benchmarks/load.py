@@ -0,0 +1,476 @@
+# HTTP load test of the API
+#
+# Boots the app with uvicorn against the configured database (or uses a
+# running server with --url), registers --attorneys attorneys and files
+# --seed-leads leads, then runs --concurrency virtual users for --duration
+# seconds after --warmup seconds that are not measured. Every virtual user
+# logs in once and then loops, picking the next workload by --mix weight:
+#
+# login        POST /auth/access-token
+# refresh      POST /auth/refresh-token, rotating the user's own token
+# filelead     POST /users/filelead, resume size picked from --resume-sizes
+# list         GET  /users/leads, first page or filtered by state
+# stats        GET  /leads/stats
+# updatelead   POST /auth/updatelead
+# transitions  POST /leads/transitions, 1 to 20 of the attorney's own leads
+#
+# python -m benchmarks.load --concurrency 32 --duration 30 --output load.json
+# python -m benchmarks.load --mix list=10,filelead=2 --duration 20
+# python -m benchmarks.load --baseline load.json --max-regression 0.2
+#
+# Reports requests, RPS, p50/p95/p99 latency and errors (status code or
+# exception) per endpoint. With --baseline the run fails (exit code 1) when an
+# endpoint's p99 grew or its RPS dropped by more than --max-regression.
+# Choices are drawn from --seed, so runs with the same options send the same
+# request mix. Users, prospects and leads created here stay in the database.
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+PROJECT_DIR = Path(__file__).parent.parent
+
+DEFAULT_MIX = "login=1,refresh=2,filelead=2,list=10,stats=2,updatelead=1,transitions=2"
+PASSWORD = "load-test-password"
+# stands in for lead ids before any lead was filed
+NO_LEAD = str(uuid.UUID(int=0))
+# share of lead list requests that filter on a state
+STATE_FILTER_SHARE = 0.5
+
+
+def _percentile(samples: list[float], percent: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+def _size(value: str) -> int:
+    units = {"k": 1024, "m": 1024 * 1024}
+    suffix = value[-1].lower()
+    return int(float(value[:-1]) * units[suffix]) if suffix in units else int(value)
+
+
+def _mix(value: str) -> dict[str, int]:
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if name not in WORKLOADS:
+            raise argparse.ArgumentTypeError(f"unknown workload {name!r}")
+        mix[name] = int(weight or 1)
+    return mix
+
+
+@dataclass
+class Attorney:
+    attorney_id: str
+    email: str
+    # lead ids filed for this attorney during the run
+    lead_ids: list[str] = field(default_factory=list)
+
+
+@dataclass
+class VirtualUser:
+    attorney: Attorney
+    rng: random.Random
+    access_token: str = ""
+    refresh_token: str = ""
+
+
+@dataclass(frozen=True)
+class Window:
+    # requests started before measure_from are warmup and not recorded
+    measure_from: float
+    end: float
+
+
+@dataclass
+class Context:
+    client: httpx.AsyncClient
+    run_id: str
+    attorneys: dict[str, Attorney]
+    resume_sizes: list[int]
+    prospects: int
+    all_lead_ids: list[str] = field(default_factory=list)
+
+
+def _remember_lead(ctx: Context, response: httpx.Response) -> None:
+    if response.is_success:
+        body = response.json()
+        ctx.all_lead_ids.append(body["lead_id"])
+        attorney = ctx.attorneys.get(body["attorney_id"])
+        if attorney is not None:
+            attorney.lead_ids.append(body["lead_id"])
+
+
+async def login(ctx: Context, user: VirtualUser) -> httpx.Response:
+    response = await ctx.client.post(
+        "/auth/access-token",
+        data={"username": user.attorney.email, "password": PASSWORD},
+    )
+    if response.is_success:
+        user.access_token = response.json()["access_token"]
+        user.refresh_token = response.json()["refresh_token"]
+    return response
+
+
+async def refresh(ctx: Context, user: VirtualUser) -> httpx.Response:
+    response = await ctx.client.post(
+        "/auth/refresh-token", json={"refresh_token": user.refresh_token}
+    )
+    if response.is_success:
+        user.access_token = response.json()["access_token"]
+        user.refresh_token = response.json()["refresh_token"]
+    return response
+
+
+async def filelead(ctx: Context, user: VirtualUser) -> httpx.Response:
+    # Repeated prospect emails exercise the update path
+    number = user.rng.randrange(ctx.prospects)
+    size = user.rng.choice(ctx.resume_sizes)
+    response = await ctx.client.post(
+        "/users/filelead",
+        data={
+            "fname": "Load",
+            "lname": "Test",
+            "email": f"load-{ctx.run_id}-{number}@example.com",
+        },
+        files={"file": ("resume.pdf", user.rng.randbytes(size), "application/pdf")},
+    )
+    _remember_lead(ctx, response)
+    return response
+
+
+async def list_leads(ctx: Context, user: VirtualUser) -> httpx.Response:
+    params: dict[str, Any] = {"limit": 100}
+    if user.rng.random() < STATE_FILTER_SHARE:
+        params["state"] = user.rng.choice(["PENDING", "REACHED_OUT"])
+    return await ctx.client.get("/users/leads", params=params)
+
+
+async def stats(ctx: Context, user: VirtualUser) -> httpx.Response:
+    return await ctx.client.get("/leads/stats")
+
+
+async def updatelead(ctx: Context, user: VirtualUser) -> httpx.Response:
+    return await ctx.client.post(
+        "/auth/updatelead",
+        json={
+            "email": user.attorney.email,
+            "password": PASSWORD,
+            "lead_id": user.rng.choice(ctx.all_lead_ids or [NO_LEAD]),
+        },
+    )
+
+
+async def transitions(ctx: Context, user: VirtualUser) -> httpx.Response:
+    lead_ids = user.attorney.lead_ids or [NO_LEAD]
+    return await ctx.client.post(
+        "/leads/transitions",
+        headers={"Authorization": f"Bearer {user.access_token}"},
+        json={
+            "lead_ids": user.rng.sample(
+                lead_ids, min(len(lead_ids), user.rng.randint(1, 20))
+            ),
+            "state": user.rng.choice(["PENDING", "REACHED_OUT"]),
+        },
+    )
+
+
+Workload = Callable[[Context, VirtualUser], Awaitable[httpx.Response]]
+
+# name: (endpoint label in the report, workload)
+WORKLOADS: dict[str, tuple[str, Workload]] = {
+    "login": ("POST /auth/access-token", login),
+    "refresh": ("POST /auth/refresh-token", refresh),
+    "filelead": ("POST /users/filelead", filelead),
+    "list": ("GET /users/leads", list_leads),
+    "stats": ("GET /leads/stats", stats),
+    "updatelead": ("POST /auth/updatelead", updatelead),
+    "transitions": ("POST /leads/transitions", transitions),
+}
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, Counter[str]] = defaultdict(Counter)
+
+    def record(self, label: str, latency_ms: float, error: str | None) -> None:
+        self.latencies[label].append(latency_ms)
+        if error is not None:
+            self.errors[label][error] += 1
+
+    def report(self, duration: float) -> dict[str, Any]:
+        def summary(latencies: list[float], errors: Counter[str]) -> dict[str, Any]:
+            return {
+                "requests": len(latencies),
+                "rps": round(len(latencies) / duration, 1),
+                "p50_ms": round(_percentile(latencies, 50), 2),
+                "p95_ms": round(_percentile(latencies, 95), 2),
+                "p99_ms": round(_percentile(latencies, 99), 2),
+                "errors": dict(errors),
+            }
+
+        every = [
+            latency for latencies in self.latencies.values() for latency in latencies
+        ]
+        errors: Counter[str] = sum(self.errors.values(), Counter())
+        return {
+            "endpoints": {
+                label: summary(latencies, self.errors[label])
+                for label, latencies in sorted(self.latencies.items())
+            },
+            "total": summary(every, errors) if every else {},
+        }
+
+
+async def virtual_user(
+    ctx: Context,
+    user: VirtualUser,
+    mix: dict[str, int],
+    recorder: Recorder,
+    window: Window,
+) -> None:
+    names = list(mix)
+    weights = list(mix.values())
+    while time.perf_counter() < window.end:
+        name = user.rng.choices(names, weights)[0]
+        label, workload = WORKLOADS[name]
+        start = time.perf_counter()
+        error: str | None = None
+        try:
+            response = await workload(ctx, user)
+            if response.is_error:
+                error = str(response.status_code)
+        except httpx.HTTPError as exc:
+            error = type(exc).__name__
+        if start >= window.measure_from:
+            recorder.record(label, (time.perf_counter() - start) * 1000, error)
+
+
+async def setup(
+    client: httpx.AsyncClient, args: argparse.Namespace, rng: random.Random
+) -> tuple[Context, list[VirtualUser]]:
+    run_id = uuid.uuid4().hex[:8]
+    attorneys: dict[str, Attorney] = {}
+    for number in range(args.attorneys):
+        email = f"load-attorney-{run_id}-{number}@example.com"
+        response = await client.post(
+            "/auth/register",
+            json={
+                "name": f"Load Attorney {number}",
+                "email": email,
+                "password": PASSWORD,
+            },
+        )
+        response.raise_for_status()
+        attorneys[response.json()["attorney_id"]] = Attorney(
+            response.json()["attorney_id"], email
+        )
+
+    ctx = Context(
+        client=client,
+        run_id=run_id,
+        attorneys=attorneys,
+        resume_sizes=args.resume_sizes,
+        prospects=args.prospects,
+    )
+    attorney_list = list(attorneys.values())
+    users = [
+        VirtualUser(
+            attorney=attorney_list[number % len(attorney_list)],
+            rng=random.Random(rng.random()),
+        )
+        for number in range(args.concurrency)
+    ]
+    for user in users:
+        (await login(ctx, user)).raise_for_status()
+    for _ in range(args.seed_leads):
+        await filelead(ctx, users[0])
+    return ctx, users
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return int(sock.getsockname()[1])
+
+
+def start_server(workers: int) -> tuple[subprocess.Popen[bytes], str]:
+    port = _free_port()
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app.main:app",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+            "--log-level",
+            "warning",
+            "--no-access-log",
+        ],
+        cwd=PROJECT_DIR,
+        env={
+            "SECURITY__JWT_SECRET_KEY": "benchmark",
+            "DATABASE__PASSWORD": "benchmark",
+            **os.environ,
+        },
+    )
+    return server, f"http://127.0.0.1:{port}"
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout_secs: float) -> None:
+    deadline = time.perf_counter() + timeout_secs
+    while True:
+        try:
+            if (
+                await client.get("/leads/stats", params={"attorney_id": NO_LEAD})
+            ).is_success:
+                return
+        except httpx.TransportError:
+            pass
+        if time.perf_counter() > deadline:
+            raise TimeoutError("server did not start")
+        await asyncio.sleep(0.2)
+
+
+async def main_async(args: argparse.Namespace, url: str) -> dict[str, Any]:
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(
+        max_connections=args.concurrency, max_keepalive_connections=args.concurrency
+    )
+    async with httpx.AsyncClient(
+        base_url=url, limits=limits, timeout=args.timeout
+    ) as client:
+        await wait_ready(client, timeout_secs=60)
+        ctx, users = await setup(client, args, rng)
+
+        recorder = Recorder()
+        start = time.perf_counter()
+        measure_from = start + args.warmup
+        window = Window(measure_from, measure_from + args.duration)
+        await asyncio.gather(
+            *(virtual_user(ctx, user, args.mix, recorder, window) for user in users)
+        )
+        duration = time.perf_counter() - measure_from
+
+    return {
+        "config": {
+            "concurrency": args.concurrency,
+            "duration_secs": args.duration,
+            "warmup_secs": args.warmup,
+            "workers": args.workers,
+            "attorneys": args.attorneys,
+            "mix": args.mix,
+            "resume_sizes": args.resume_sizes,
+            "seed": args.seed,
+        },
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        **recorder.report(duration),
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=PROJECT_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def regressions(
+    report: dict[str, Any], baseline: dict[str, Any], max_regression: float
+) -> list[str]:
+    found = []
+    for label, result in report["endpoints"].items():
+        base = baseline["endpoints"].get(label)
+        if base is None:
+            continue
+        if result["p99_ms"] > base["p99_ms"] * (1 + max_regression):
+            found.append(
+                f"{label}: p99 {result['p99_ms']}ms > {base['p99_ms']}ms baseline"
+            )
+        if result["rps"] < base["rps"] * (1 - max_regression):
+            found.append(f"{label}: {result['rps']} rps < {base['rps']} rps baseline")
+    return found
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="HTTP load test of the API")
+    parser.add_argument("--url", help="running server, by default one is started")
+    parser.add_argument(
+        "--workers", type=int, default=1, help="uvicorn workers of the started server"
+    )
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--warmup", type=float, default=5.0)
+    parser.add_argument("--mix", type=_mix, default=_mix(DEFAULT_MIX))
+    parser.add_argument(
+        "--resume-sizes",
+        type=lambda value: [_size(size) for size in value.split(",")],
+        default=[_size(size) for size in ("10k", "100k", "1m")],
+    )
+    parser.add_argument("--attorneys", type=int, default=8)
+    parser.add_argument(
+        "--prospects", type=int, default=100_000, help="distinct prospect emails"
+    )
+    parser.add_argument("--seed-leads", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--baseline", type=Path)
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if url is None:
+        server, url = start_server(args.workers)
+    try:
+        report = asyncio.run(main_async(args, url))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+    if args.baseline:
+        found = regressions(
+            report, json.loads(args.baseline.read_text()), args.max_regression
+        )
+        for regression in found:
+            print(f"regressed: {regression}", file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
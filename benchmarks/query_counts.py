@@ -0,0 +1,183 @@
+# Query count budget per endpoint
+#
+# Calls every endpoint twice through the ASGI app (no server needed), once to
+# warm the caches (attorney directory, JWT verification) and once more inside
+# assert_max_queries (app/core/query_stats.py), and exits with 1 when one of
+# them sent more statements than its budget, listing the statements it ran.
+# Catches a new query per row or a re-select sneaking into a hot path before
+# it shows up as latency.
+#
+# Needs a migrated database, the attorney and leads it creates are left there:
+# python -m benchmarks.query_counts
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import sys
+import uuid
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+os.environ.setdefault("SECURITY__JWT_SECRET_KEY", "benchmark")
+os.environ.setdefault("DATABASE__PASSWORD", "benchmark")
+
+import httpx  # noqa: E402
+
+from app.core import database_session  # noqa: E402
+from app.core.query_stats import assert_max_queries  # noqa: E402
+from app.main import app  # noqa: E402
+
+PASSWORD = "query-counts-password"
+
+
+@dataclass
+class Context:
+    client: httpx.AsyncClient
+    email: str = ""
+    access_token: str = ""
+    refresh_token: str = ""
+    lead_id: str = ""
+
+    @property
+    def auth(self) -> dict[str, str]:
+        return {"Authorization": f"Bearer {self.access_token}"}
+
+
+async def register(ctx: Context) -> httpx.Response:
+    ctx.email = f"query-counts-{uuid.uuid4().hex[:8]}@example.com"
+    return await ctx.client.post(
+        "/auth/register",
+        json={"name": "Query Counts", "email": ctx.email, "password": PASSWORD},
+    )
+
+
+async def login(ctx: Context) -> httpx.Response:
+    response = await ctx.client.post(
+        "/auth/access-token", data={"username": ctx.email, "password": PASSWORD}
+    )
+    ctx.access_token = response.json()["access_token"]
+    ctx.refresh_token = response.json()["refresh_token"]
+    return response
+
+
+async def refresh(ctx: Context) -> httpx.Response:
+    response = await ctx.client.post(
+        "/auth/refresh-token", json={"refresh_token": ctx.refresh_token}
+    )
+    ctx.refresh_token = response.json()["refresh_token"]
+    return response
+
+
+async def filelead(ctx: Context) -> httpx.Response:
+    response = await ctx.client.post(
+        "/users/filelead",
+        data={
+            "fname": "Query",
+            "lname": "Counts",
+            "email": f"prospect-{uuid.uuid4().hex[:12]}@example.com",
+        },
+        files={"file": ("resume.pdf", io.BytesIO(os.urandom(1024)), "application/pdf")},
+    )
+    ctx.lead_id = response.json()["lead_id"]
+    return response
+
+
+def get(path: str, **params: Any) -> Callable[[Context], Awaitable[httpx.Response]]:
+    async def call(ctx: Context) -> httpx.Response:
+        return await ctx.client.get(path, params=params, headers=ctx.auth)
+
+    return call
+
+
+def post(path: str) -> Callable[[Context], Awaitable[httpx.Response]]:
+    async def call(ctx: Context) -> httpx.Response:
+        return await ctx.client.post(path, headers=ctx.auth)
+
+    return call
+
+
+async def transitions(ctx: Context) -> httpx.Response:
+    return await ctx.client.post(
+        "/leads/transitions",
+        headers=ctx.auth,
+        json={"lead_ids": [ctx.lead_id], "state": "REACHED_OUT"},
+    )
+
+
+async def updatelead(ctx: Context) -> httpx.Response:
+    return await ctx.client.post(
+        "/auth/updatelead",
+        json={"email": ctx.email, "password": PASSWORD, "lead_id": ctx.lead_id},
+    )
+
+
+# (name, budget, call), in order, later calls use what earlier ones returned
+CHECKS: list[tuple[str, int, Callable[[Context], Awaitable[httpx.Response]]]] = [
+    ("POST /auth/register", 3, register),
+    ("POST /auth/access-token", 2, login),
+    ("POST /auth/refresh-token", 1, refresh),
+    # the assigned attorney's row when it is not in the attorney cache, then
+    # the single statement filing the lead
+    ("POST /users/filelead", 2, filelead),
+    ("GET /users/leads", 1, get("/users/leads", limit=100)),
+    ("GET /users/leads?state", 1, get("/users/leads", limit=100, state="PENDING")),
+    ("GET /users/attorneys", 1, get("/users/attorneys", limit=100)),
+    ("GET /users/prospects", 1, get("/users/prospects", limit=100)),
+    ("GET /leads/stats", 1, get("/leads/stats")),
+    ("POST /leads/transitions", 2, transitions),
+    ("POST /auth/updatelead", 4, updatelead),
+    ("POST /users/getpendingleads", 1, post("/users/getpendingleads")),
+]
+
+
+async def main_async(args: argparse.Namespace) -> dict[str, Any]:
+    results: dict[str, Any] = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://localhost"
+    ) as client:
+        ctx = Context(client=client)
+        for name, budget, call in CHECKS:
+            (await call(ctx)).raise_for_status()
+            error = None
+            try:
+                with assert_max_queries(budget) as queries:
+                    response = await call(ctx)
+                    response.raise_for_status()
+            except AssertionError as exc:
+                error = str(exc)
+            results[name] = {
+                "queries": queries.count,
+                "budget": budget,
+                "db_ms": round(queries.total_secs * 1000, 2),
+                "ok": error is None,
+            }
+            if error is not None:
+                results[name]["statements"] = dict(queries.shapes)
+    await database_session.dispose_async_engine()
+    return {
+        "endpoints": results,
+        "failed": [name for name, result in results.items() if not result["ok"]],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="query count budget per endpoint")
+    parser.add_argument("--output", type=Path)
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    print(json.dumps(report, indent=2))
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    if report["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
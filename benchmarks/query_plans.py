@@ -0,0 +1,404 @@
+# Query plan regression check for the hot queries
+#
+# EXPLAINs the queries the endpoints and background jobs send and fails (exit
+# status 1) when one of them reads a checked table with a Seq Scan, which
+# means an index it relies on is missing or no longer matches the query.
+#
+# By default the tables are filled with --leads generated rows inside a
+# transaction that is rolled back at the end, and ANALYZEd, so the planner
+# sees realistic sizes and the database is left as it was. Roughly 5% of the
+# leads are PENDING, like a backlog that is mostly worked through, and about
+# 2% of the refresh tokens are used or expired, like between two cleanup runs:
+# python -m benchmarks.query_plans --leads 200000
+#
+# --no-seed checks the data already in the database instead (e.g. after
+# benchmarks.seed), which must have been ANALYZEd.
+#
+# The unpaginated getters (/users/getreachedleads, /getattorneys,
+# /getprospects) and the unfiltered export read most of a table and are
+# expected to scan it, they are not checked.
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+os.environ.setdefault("SECURITY__JWT_SECRET_KEY", "benchmark")
+os.environ.setdefault("DATABASE__PASSWORD", "benchmark")
+
+from sqlalchemy import ClauseElement, func, select  # noqa: E402
+from sqlalchemy.dialects import postgresql  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncConnection  # noqa: E402
+
+from app.api.endpoints.exports import export_query  # noqa: E402
+from app.api.pagination import (  # noqa: E402
+    PageParams,
+    encode_cursor,
+    keyset_query,
+)
+from app.core import database_session  # noqa: E402
+from app.core.maintenance import purgeable_refresh_tokens  # noqa: E402
+from app.models import (  # noqa: E402
+    EMAIL_OUTBOX_UNSENT,
+    Attorney,
+    AttorneyLeadCount,
+    EmailOutbox,
+    Lead,
+    Prospect,
+    RefreshToken,
+    ResumeBlob,
+)
+
+SEED_TABLES = [
+    "attorneys",
+    "prospects",
+    "resume_blobs",
+    "leads",
+    "attorney_lead_counts",
+    "refresh_token",
+    "email_outbox",
+]
+
+
+def seed_statements(leads: int) -> list[str]:
+    attorneys = max(leads // 200, 10)
+    prospects = max(leads // 2, 10)
+    tokens = max(leads // 4, 10)
+    return [
+        "SELECT setseed(0.42)",
+        f"""
+        INSERT INTO attorneys (attorney_id, name, email, hashed_password, create_time)
+        SELECT gen_random_uuid(), 'Plan Attorney ' || i, 'plan-attorney-' || i || '@example.com',
+               'x', now() - random() * interval '365 days'
+        FROM generate_series(1, {attorneys}) AS i
+        """,
+        f"""
+        INSERT INTO resume_blobs (digest, size, ref_count, update_time)
+        SELECT md5('plan-' || i) || md5('blob-' || i), 1024,
+               CASE WHEN i % 20 = 0 THEN 0 ELSE 1 END,
+               now() - random() * interval '30 days'
+        FROM generate_series(1, {prospects}) AS i
+        """,
+        f"""
+        INSERT INTO prospects (prospect_id, email, name, resume, create_time)
+        SELECT gen_random_uuid(), 'plan-prospect-' || i || '@example.com', 'Plan Prospect',
+               md5('plan-' || i) || md5('blob-' || i), now() - random() * interval '365 days'
+        FROM generate_series(1, {prospects}) AS i
+        """,
+        f"""
+        WITH a AS (SELECT array_agg(attorney_id) AS ids FROM attorneys),
+             p AS (SELECT array_agg(prospect_id) AS ids FROM prospects)
+        INSERT INTO leads (lead_id, attorney_id, prospect_id, state, create_time)
+        SELECT gen_random_uuid(),
+               a.ids[1 + (i % cardinality(a.ids))],
+               p.ids[1 + (i % cardinality(p.ids))],
+               CASE WHEN random() < 0.05 THEN 'PENDING' ELSE 'REACHED_OUT' END,
+               now() - random() * interval '365 days'
+        FROM a, p, generate_series(1, {leads}) AS i
+        """,
+        """
+        INSERT INTO attorney_lead_counts (attorney_id, state, lead_count)
+        SELECT attorney_id, state, count(*) FROM leads GROUP BY attorney_id, state
+        ON CONFLICT (attorney_id, state) DO UPDATE SET lead_count = excluded.lead_count
+        """,
+        f"""
+        WITH a AS (SELECT array_agg(attorney_id) AS ids FROM attorneys)
+        INSERT INTO refresh_token (token_hash, used, exp, attorney_id)
+        SELECT sha256(convert_to('plan-token-' || i, 'UTF8')), random() < 0.02,
+               extract(epoch FROM now())::bigint + (random() * 86400 * 31)::bigint - 43200,
+               a.ids[1 + (i % cardinality(a.ids))]
+        FROM a, generate_series(1, {tokens}) AS i
+        """,
+        f"""
+        INSERT INTO email_outbox (subject, recipients, body, template, status, attempts,
+                                  next_attempt_time)
+        SELECT 'New Lead Pair', '[]', '{{}}', 'email.html',
+               CASE WHEN i % 100 = 0 THEN 'PENDING' ELSE 'SENT' END, 1,
+               now() - random() * interval '30 days'
+        FROM generate_series(1, {leads}) AS i
+        """,
+    ] + [f"ANALYZE {table}" for table in SEED_TABLES]
+
+
+@dataclass
+class PlanCheck:
+    name: str
+    build: Callable[["Samples"], ClauseElement]
+    # Tables that must not be read with a Seq Scan
+    tables: frozenset[str]
+
+
+@dataclass
+class Samples:
+    # Real values from the database, so the planner sees selective predicates
+    attorney_id: str
+    prospect_id: str
+    attorney_email: str
+    prospect_email: str
+    token_hash: bytes
+    lead_cursor: str
+    attorney_cursor: str
+    prospect_cursor: str
+
+
+async def load_samples(connection: AsyncConnection) -> Samples:
+    async def middle(id_column: Any, time_column: Any) -> str:
+        count = (
+            await connection.scalar(select(func.count()).select_from(id_column.table))
+            or 0
+        )
+        row = (
+            await connection.execute(
+                select(time_column, id_column)
+                .order_by(time_column, id_column)
+                .offset(count // 2)
+                .limit(1)
+            )
+        ).one()
+        return encode_cursor(row[0], row[1])
+
+    attorney = (
+        await connection.execute(select(Attorney.attorney_id, Attorney.email).limit(1))
+    ).one()
+    prospect = (
+        await connection.execute(select(Prospect.prospect_id, Prospect.email).limit(1))
+    ).one()
+    return Samples(
+        attorney_id=str(attorney.attorney_id),
+        prospect_id=str(prospect.prospect_id),
+        attorney_email=attorney.email,
+        prospect_email=prospect.email,
+        token_hash=await connection.scalar(select(RefreshToken.token_hash).limit(1))
+        or b"",
+        lead_cursor=await middle(Lead.lead_id, Lead.create_time),
+        attorney_cursor=await middle(Attorney.attorney_id, Attorney.create_time),
+        prospect_cursor=await middle(Prospect.prospect_id, Prospect.create_time),
+    )
+
+
+def _leads_page(**filters: Any) -> Callable[[Samples], ClauseElement]:
+    def build(samples: Samples) -> ClauseElement:
+        query = select(Lead.lead_id)
+        if "state" in filters:
+            query = query.where(Lead.state == filters["state"])
+        if filters.get("attorney"):
+            query = query.where(Lead.attorney_id == samples.attorney_id)
+        cursor = samples.lead_cursor if filters.get("deep") else None
+        return keyset_query(
+            query, Lead.lead_id, Lead.create_time, PageParams(cursor=cursor)
+        )
+
+    return build
+
+
+LEADS = frozenset({"leads"})
+
+CHECKS = [
+    # /users/getpendingleads
+    PlanCheck(
+        "pending_leads",
+        lambda _: select(Lead.lead_id).where(Lead.state == "PENDING"),
+        LEADS,
+    ),
+    # /users/leads
+    PlanCheck("leads_page", _leads_page(), LEADS),
+    PlanCheck("leads_page_deep", _leads_page(deep=True), LEADS),
+    PlanCheck("leads_page_pending", _leads_page(state="PENDING"), LEADS),
+    PlanCheck(
+        "leads_page_reached_out_deep",
+        _leads_page(state="REACHED_OUT", deep=True),
+        LEADS,
+    ),
+    PlanCheck("leads_page_attorney", _leads_page(attorney=True), LEADS),
+    PlanCheck(
+        "leads_page_attorney_pending",
+        _leads_page(attorney=True, state="PENDING"),
+        LEADS,
+    ),
+    # /users/attorneys, /users/prospects
+    PlanCheck(
+        "attorneys_page_deep",
+        lambda s: keyset_query(
+            select(Attorney.attorney_id),
+            Attorney.attorney_id,
+            Attorney.create_time,
+            PageParams(cursor=s.attorney_cursor),
+        ),
+        frozenset({"attorneys"}),
+    ),
+    PlanCheck(
+        "prospects_page_deep",
+        lambda s: keyset_query(
+            select(Prospect.prospect_id),
+            Prospect.prospect_id,
+            Prospect.create_time,
+            PageParams(cursor=s.prospect_cursor),
+        ),
+        frozenset({"prospects"}),
+    ),
+    # /exports/leads?state=PENDING
+    PlanCheck("export_pending", lambda _: export_query("PENDING"), LEADS),
+    # /auth/access-token, /auth/refresh-token, prospect lookup of the intake
+    PlanCheck(
+        "attorney_by_email",
+        lambda s: select(Attorney).where(Attorney.email == s.attorney_email),
+        frozenset({"attorneys"}),
+    ),
+    PlanCheck(
+        "refresh_token_lookup",
+        # bytea has no literal rendering, decode() is folded to a constant
+        lambda s: select(RefreshToken).where(
+            RefreshToken.token_hash == func.decode(s.token_hash.hex(), "hex")
+        ),
+        frozenset({"refresh_token"}),
+    ),
+    PlanCheck(
+        "prospect_by_email",
+        lambda s: select(Prospect.resume).where(Prospect.email == s.prospect_email),
+        frozenset({"prospects"}),
+    ),
+    # What the ON DELETE CASCADE foreign keys look up when an attorney or
+    # prospect is deleted
+    PlanCheck(
+        "cascade_attorney_leads",
+        lambda s: select(Lead.lead_id).where(Lead.attorney_id == s.attorney_id),
+        LEADS,
+    ),
+    PlanCheck(
+        "cascade_prospect_leads",
+        lambda s: select(Lead.lead_id).where(Lead.prospect_id == s.prospect_id),
+        LEADS,
+    ),
+    PlanCheck(
+        "cascade_attorney_refresh_tokens",
+        lambda s: select(RefreshToken.id).where(
+            RefreshToken.attorney_id == s.attorney_id
+        ),
+        frozenset({"refresh_token"}),
+    ),
+    # Background jobs
+    PlanCheck(
+        "purgeable_refresh_tokens",
+        lambda _: purgeable_refresh_tokens(retention_secs=0, limit=1000),
+        frozenset({"refresh_token"}),
+    ),
+    PlanCheck(
+        "resume_garbage",
+        lambda _: select(ResumeBlob.digest)
+        .where(ResumeBlob.ref_count == 0, ResumeBlob.update_time < func.now())
+        .limit(1000),
+        frozenset({"resume_blobs"}),
+    ),
+    PlanCheck(
+        "email_outbox_due",
+        lambda _: select(EmailOutbox.id)
+        .where(EMAIL_OUTBOX_UNSENT, EmailOutbox.next_attempt_time <= func.now())
+        .order_by(EmailOutbox.next_attempt_time)
+        .limit(50),
+        frozenset({"email_outbox"}),
+    ),
+    PlanCheck(
+        "least_loaded_attorneys",
+        lambda _: select(AttorneyLeadCount.lead_count, AttorneyLeadCount.attorney_id)
+        .where(AttorneyLeadCount.state == "PENDING")
+        .order_by(AttorneyLeadCount.lead_count, AttorneyLeadCount.attorney_id)
+        .limit(1),
+        frozenset({"attorney_lead_counts"}),
+    ),
+]
+
+
+def _walk(plan: dict[str, Any]) -> list[dict[str, Any]]:
+    nodes = [plan]
+    for child in plan.get("Plans", []):
+        nodes.extend(_walk(child))
+    return nodes
+
+
+async def explain(
+    connection: AsyncConnection, check: PlanCheck, samples: Samples
+) -> dict[str, Any]:
+    sql = str(
+        check.build(samples).compile(
+            dialect=postgresql.dialect(),  # type: ignore[no-untyped-call]
+            compile_kwargs={"literal_binds": True},
+        )
+    )
+    result = await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}")
+    document = result.scalar_one()
+    if isinstance(document, str):
+        document = json.loads(document)
+    nodes = _walk(document[0]["Plan"])
+
+    seq_scans = sorted(
+        {
+            node["Relation Name"]
+            for node in nodes
+            if node["Node Type"] == "Seq Scan" and node["Relation Name"] in check.tables
+        }
+    )
+    return {
+        "ok": not seq_scans,
+        "seq_scans": seq_scans,
+        "scans": sorted(
+            {
+                f'{node["Node Type"]} {node.get("Index Name") or node["Relation Name"]}'
+                for node in nodes
+                if "Relation Name" in node or "Index Name" in node
+            }
+        ),
+        "cost": document[0]["Plan"]["Total Cost"],
+    }
+
+
+async def main_async(args: argparse.Namespace) -> dict[str, Any]:
+    engine = database_session.get_async_engine()
+    report: dict[str, Any] = {"seeded_leads": 0 if args.no_seed else args.leads}
+    async with engine.connect() as connection:
+        transaction = await connection.begin()
+        try:
+            if not args.no_seed:
+                for statement in seed_statements(args.leads):
+                    await connection.exec_driver_sql(statement)
+            samples = await load_samples(connection)
+            report["checks"] = {
+                check.name: await explain(connection, check, samples)
+                for check in CHECKS
+                if not args.checks or check.name in args.checks
+            }
+        finally:
+            # Leaves the database as it was, seeded rows included
+            await transaction.rollback()
+    await database_session.dispose_async_engine()
+    report["failed"] = [
+        name for name, result in report["checks"].items() if not result["ok"]
+    ]
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="fail when a hot query plan uses a Seq Scan"
+    )
+    parser.add_argument("--leads", type=int, default=200_000)
+    parser.add_argument("--no-seed", action="store_true")
+    parser.add_argument("--checks", nargs="+", choices=[check.name for check in CHECKS])
+    parser.add_argument("--output", type=Path)
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    print(json.dumps(report, indent=2))
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    if report["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
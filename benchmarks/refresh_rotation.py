@@ -0,0 +1,144 @@
+# Concurrent refresh token rotation
+#
+# Sends the same refresh token to /auth/refresh-token from --tasks concurrent
+# requests, --rounds times, through the ASGI app (no server needed). Every
+# round must have exactly one 200 and "already used" 400s for the rest, and
+# exactly one new token must be stored. Exits with 1 otherwise.
+#
+# Needs a migrated database, an attorney and its tokens are created directly
+# in the tables and left there:
+# python -m benchmarks.refresh_rotation --tasks 50 --rounds 20
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from collections import Counter
+from http import HTTPStatus
+from pathlib import Path
+from typing import Any
+
+os.environ.setdefault("SECURITY__JWT_SECRET_KEY", "benchmark")
+os.environ.setdefault("DATABASE__PASSWORD", "benchmark")
+
+import httpx  # noqa: E402
+from sqlalchemy import func, select  # noqa: E402
+
+from app.api import api_messages  # noqa: E402
+from app.core import database_session  # noqa: E402
+from app.core.security.refresh_token import (  # noqa: E402
+    generate_refresh_token,
+    hash_refresh_token,
+    refresh_token_exp,
+)
+from app.main import app  # noqa: E402
+from app.models import Attorney, RefreshToken  # noqa: E402
+
+
+def _percentile(samples: list[float], percent: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+async def _issue_token(attorney_id: str) -> str:
+    token = generate_refresh_token()
+    async with database_session.get_async_session() as session:
+        session.add(
+            RefreshToken(
+                attorney_id=attorney_id,
+                token_hash=hash_refresh_token(token),
+                exp=refresh_token_exp(),
+            )
+        )
+        await session.commit()
+    return token
+
+
+async def _token_count(attorney_id: str) -> int:
+    async with database_session.get_async_session() as session:
+        return await session.scalar(  # type: ignore[return-value]
+            select(func.count()).where(RefreshToken.attorney_id == attorney_id)
+        )
+
+
+async def main_async(args: argparse.Namespace) -> dict[str, Any]:
+    attorney = Attorney(
+        name="Rotation Benchmark",
+        email=f"rotation-{uuid.uuid4().hex[:8]}@example.com",
+        hashed_password="not a bcrypt hash",
+    )
+    async with database_session.get_async_session() as session:
+        session.add(attorney)
+        await session.commit()
+
+    outcomes: Counter[str] = Counter()
+    violations: list[dict[str, Any]] = []
+    latencies: list[float] = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://localhost"
+    ) as client:
+
+        async def refresh(token: str) -> str:
+            start = time.perf_counter()
+            response = await client.post(
+                "/auth/refresh-token", json={"refresh_token": token}
+            )
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code == HTTPStatus.OK:
+                return "rotated"
+            return f"{response.status_code} {response.json().get('detail')}"
+
+        for number in range(args.rounds):
+            token = await _issue_token(attorney.attorney_id)
+            before = await _token_count(attorney.attorney_id)
+            results = Counter(
+                await asyncio.gather(*(refresh(token) for _ in range(args.tasks)))
+            )
+            issued = await _token_count(attorney.attorney_id) - before
+            outcomes.update(results)
+
+            expected = Counter({"rotated": 1})
+            if args.tasks > 1:
+                expected[f"400 {api_messages.REFRESH_TOKEN_ALREADY_USED}"] = (
+                    args.tasks - 1
+                )
+            if results != expected or issued != 1:
+                violations.append(
+                    {"round": number, "results": dict(results), "issued": issued}
+                )
+
+    await database_session.dispose_async_engine()
+    return {
+        "tasks": args.tasks,
+        "rounds": args.rounds,
+        "outcomes": dict(outcomes),
+        "p50_ms": round(_percentile(latencies, 50), 2),
+        "p99_ms": round(_percentile(latencies, 99), 2),
+        "violations": violations,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="same refresh token from many concurrent requests"
+    )
+    parser.add_argument("--tasks", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--output", type=Path)
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    print(json.dumps(report, indent=2))
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    if report["violations"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+# Id list response cache and ETag check
+#
+# Goes through the cached /users/get* endpoints with the ASGI app (no server
+# needed) and exits with 1 when one of these does not hold:
+# - a GET with the ETag of the last response gets a 304 without a query
+# - a second worker (a separate ResponseCache on the same shared backend)
+#   finds the entry without loading it
+# - filing a lead (app side invalidation) and a lead state change written
+#   straight to the database (NOTIFY trigger) both change the ETag and body
+# Then times polls answered with 304 against polls that load the list.
+#
+# The shared backend is a small in-process Redis stand-in speaking RESP,
+# unless --redis-url points at a real one. Needs a migrated database with at
+# least one attorney, the lead it files is left there:
+# python -m benchmarks.response_cache
+# python -m benchmarks.response_cache --redis-url redis://localhost:6379/0
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import sys
+import time
+import uuid
+from collections.abc import Callable
+from http import HTTPStatus
+from pathlib import Path
+from typing import Any
+
+os.environ.setdefault("SECURITY__JWT_SECRET_KEY", "benchmark")
+os.environ.setdefault("DATABASE__PASSWORD", "benchmark")
+
+import asyncpg  # noqa: E402
+import httpx  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+
+from app.core.response_cache import (  # noqa: E402
+    NAMESPACE,
+    RedisBackend,
+    ResponseCache,
+    read_reply,
+)
+from app.models import Lead  # noqa: E402
+from app.schemas.responses import IDList  # noqa: E402
+
+PATH = "/users/getpendingleads"
+
+
+class RedisStandIn:
+    # GET, SET (with PX), INCR, DEL, PING, AUTH and SELECT, enough for the
+    # response cache. With a password set every other command needs AUTH first.
+    def __init__(self, password: str | None = None) -> None:
+        self.data: dict[bytes, tuple[bytes, float | None]] = {}
+        self.commands = 0
+        self.password = password
+        self.selected_db = 0
+        self.server: asyncio.Server | None = None
+
+    def _get(self, key: bytes) -> bytes | None:
+        value, expires_at = self.data.get(key, (None, None))
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def _reply(self, command: list[bytes], authenticated: bool) -> bytes:
+        name, args = command[0].upper(), command[1:]
+        self.commands += 1
+        if name == b"AUTH":
+            return self._auth(args)
+        if not authenticated:
+            return b"-NOAUTH Authentication required.\r\n"
+        handlers: dict[bytes, Callable[[list[bytes]], bytes]] = {
+            b"PING": lambda _: b"+PONG\r\n",
+            b"SELECT": self._select,
+            b"GET": self._get_reply,
+            b"SET": self._set,
+            b"INCR": self._incr,
+            b"DEL": self._del,
+        }
+        if name not in handlers:
+            return b"-ERR unknown command '%s'\r\n" % name
+        return handlers[name](args)
+
+    def _auth(self, args: list[bytes]) -> bytes:
+        # the password is the last argument, with or without a username
+        if self.password is not None and args[-1] == self.password.encode():
+            return b"+OK\r\n"
+        return b"-WRONGPASS invalid username-password pair\r\n"
+
+    def _select(self, args: list[bytes]) -> bytes:
+        self.selected_db = int(args[0])
+        return b"+OK\r\n"
+
+    def _get_reply(self, args: list[bytes]) -> bytes:
+        value = self._get(args[0])
+        if value is None:
+            return b"$-1\r\n"
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def _set(self, args: list[bytes]) -> bytes:
+        expires_at = None
+        if [option.upper() for option in args[2:3]] == [b"PX"]:
+            expires_at = time.monotonic() + int(args[3]) / 1000
+        self.data[args[0]] = (args[1], expires_at)
+        return b"+OK\r\n"
+
+    def _incr(self, args: list[bytes]) -> bytes:
+        count = int(self._get(args[0]) or 0) + 1
+        self.data[args[0]] = (str(count).encode(), None)
+        return b":%d\r\n" % count
+
+    def _del(self, args: list[bytes]) -> bytes:
+        return b":%d\r\n" % sum(self.data.pop(key, None) is not None for key in args)
+
+    async def _serve(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        authenticated = self.password is None
+        try:
+            while True:
+                command = await read_reply(reader)
+                reply = self._reply(command, authenticated)
+                if command[0].upper() == b"AUTH":
+                    authenticated = reply == b"+OK\r\n"
+                writer.write(reply)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+
+    async def start(self) -> str:
+        self.server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        return f"redis://127.0.0.1:{self.server.sockets[0].getsockname()[1]}/0"
+
+
+async def wait_for(check: Any, timeout_secs: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout_secs
+    while time.monotonic() < deadline:
+        if await check():
+            return True
+        await asyncio.sleep(0.02)
+    return False
+
+
+async def check_etag(client: httpx.AsyncClient, checks: dict[str, bool]) -> str:
+    from app.core.query_stats import assert_max_queries
+
+    first = await client.get(PATH)
+    first.raise_for_status()
+    etag: str = first.headers["etag"]
+    checks["get has a strong etag"] = etag.startswith('"')
+    checks["post gives the same body"] = (
+        await client.post(PATH)
+    ).content == first.content
+
+    with assert_max_queries(0) as queries:
+        not_modified = await client.get(PATH, headers={"If-None-Match": etag})
+    checks["get with the etag is a 304 without a query"] = (
+        not_modified.status_code == HTTPStatus.NOT_MODIFIED
+        and not not_modified.content
+        and queries.count == 0
+    )
+    return etag
+
+
+async def check_other_worker(
+    redis_url: str, etag: str, checks: dict[str, bool]
+) -> ResponseCache:
+    from app.core import invalidation
+    from app.core.config import get_settings
+
+    async def no_load() -> bytes:
+        raise AssertionError("loaded although the shared backend has the entry")
+
+    settings = get_settings().cache
+    other_worker = ResponseCache(
+        settings.id_list_ttl_secs,
+        RedisBackend(
+            redis_url,
+            key_prefix=settings.redis_key_prefix,
+            timeout_secs=settings.redis_timeout_secs,
+        ),
+    )
+    invalidation.register_handler(
+        NAMESPACE, other_worker.on_notification, other_worker.clear
+    )
+    try:
+        shared = await other_worker.get("leads", "PENDING", no_load)
+        checks["another worker finds the entry in the shared backend"] = (
+            shared.etag == etag
+        )
+    except AssertionError:
+        checks["another worker finds the entry in the shared backend"] = False
+    return other_worker
+
+
+async def check_writes(
+    client: httpx.AsyncClient,
+    other_worker: ResponseCache,
+    etag: str,
+    checks: dict[str, bool],
+) -> None:
+    from app.core.config import get_settings
+
+    filed = await client.post(
+        "/users/filelead",
+        data={
+            "fname": "Cache",
+            "lname": "Check",
+            "email": f"cache-{uuid.uuid4().hex[:12]}@example.com",
+        },
+        files={"file": ("resume.pdf", io.BytesIO(os.urandom(1024)), "application/pdf")},
+    )
+    filed.raise_for_status()
+    lead_id = filed.json()["lead_id"]
+    after_write = await client.get(PATH, headers={"If-None-Match": etag})
+    checks["filing a lead changes the list"] = (
+        after_write.status_code == HTTPStatus.OK
+        and lead_id in after_write.json()["ids"]
+    )
+
+    async def other_worker_reloaded() -> bool:
+        async def load() -> bytes:
+            return b""
+
+        return (
+            await other_worker.get("leads", "PENDING", load)
+        ).etag == after_write.headers["etag"]
+
+    # The other worker's local entry went with the NOTIFY, its reload
+    # finds the entry the app stored under the bumped generation
+    checks["another worker sees the new list"] = await wait_for(other_worker_reloaded)
+
+    etag = after_write.headers["etag"]
+    uri = get_settings().sqlalchemy_database_uri.set(drivername="postgresql")
+    connection = await asyncpg.connect(uri.render_as_string(hide_password=False))
+    try:
+        await connection.execute(
+            "UPDATE leads SET state = 'REACHED_OUT' WHERE lead_id = $1", lead_id
+        )
+    finally:
+        await connection.close()
+
+    async def changed() -> bool:
+        response = await client.get(PATH, headers={"If-None-Match": etag})
+        return (
+            response.status_code == HTTPStatus.OK
+            and lead_id not in response.json()["ids"]
+        )
+
+    checks["a write outside the app changes the list (NOTIFY)"] = await wait_for(
+        changed
+    )
+
+
+async def time_polls(client: httpx.AsyncClient, polls: int) -> dict[str, Any]:
+    from app.core import database_session
+
+    etag = (await client.get(PATH)).headers["etag"]
+    start = time.perf_counter()
+    for _ in range(polls):
+        response = await client.get(PATH, headers={"If-None-Match": etag})
+        assert response.status_code == HTTPStatus.NOT_MODIFIED
+    cached_secs = time.perf_counter() - start
+
+    # What every poll cost before, the endpoint's query and serialization
+    start = time.perf_counter()
+    for _ in range(polls):
+        async with await database_session.get_read_session() as session:
+            ids = list(
+                await session.scalars(
+                    select(Lead.lead_id).where(Lead.state == "PENDING")
+                )
+            )
+            IDList(ids=ids).model_dump_json()
+    uncached_secs = time.perf_counter() - start
+    return {
+        "pending_leads": len(ids),
+        "polls": polls,
+        "cached_304_ms": round(cached_secs / polls * 1000, 3),
+        "query_and_serialize_ms": round(uncached_secs / polls * 1000, 3),
+    }
+
+
+async def main_async(args: argparse.Namespace) -> dict[str, Any]:
+    stand_in = None
+    redis_url = args.redis_url
+    if redis_url is None:
+        stand_in = RedisStandIn()
+        redis_url = await stand_in.start()
+    os.environ["CACHE__REDIS_URL"] = redis_url
+    os.environ["CACHE__REDIS_KEY_PREFIX"] = (
+        f"response-cache-check-{uuid.uuid4().hex[:8]}:"
+    )
+
+    # Settings are read on first use, after the environment above is set
+    from app.core import database_session
+    from app.core.invalidation import InvalidationListener
+    from app.core.response_cache import close_response_cache
+    from app.main import app
+
+    checks: dict[str, bool] = {}
+    listener = InvalidationListener()
+    listener.start()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://localhost"
+    ) as client:
+        etag = await check_etag(client, checks)
+        other_worker = await check_other_worker(redis_url, etag, checks)
+        await check_writes(client, other_worker, etag, checks)
+        timings = await time_polls(client, args.polls)
+        await other_worker.close()
+
+    await listener.stop()
+    await close_response_cache()
+    await database_session.dispose_async_engine()
+    report: dict[str, Any] = {"checks": checks, "timings": timings}
+    if stand_in is not None and stand_in.server is not None:
+        stand_in.server.close()
+        report["stand_in_commands"] = stand_in.commands
+    report["failed"] = [name for name, ok in checks.items() if not ok]
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="id list response cache and ETag check"
+    )
+    parser.add_argument(
+        "--redis-url", help="real Redis to use instead of the in-process stand-in"
+    )
+    parser.add_argument("--polls", type=int, default=200)
+    parser.add_argument("--output", type=Path)
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    print(json.dumps(report, indent=2))
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    if report["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
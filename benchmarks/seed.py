@@ -0,0 +1,344 @@
+# Synthetic dataset for scale testing
+#
+# Fills attorneys, prospects, resume_blobs, leads, attorney_lead_counts and
+# refresh_token with COPY (asyncpg copy_records_to_table), millions of rows
+# take minutes instead of the hours filing them through the API would.
+#
+# python -m benchmarks.seed --attorneys 2000 --prospects 1000000 --leads 2000000
+# python -m benchmarks.seed --leads 5000000 --skew 1.2 --truncate
+#
+# - Leads (and refresh tokens) are spread over attorneys with a Zipf
+#   distribution of exponent --skew, so a few attorneys hold most of them.
+#   0 spreads them evenly. The report shows the share of the top 1%.
+# - Every prospect has one lead, the remaining leads are repeat filings of
+#   random prospects. Resumes are shared by several prospects like identical
+#   uploads are, resume_blobs.ref_count matches.
+# - attorney_lead_counts is computed from the generated leads, so the
+#   counters are exact and reconciliation has nothing to fix.
+# - All attorneys share one bcrypt hash of --password, computed once with the
+#   configured rounds, so any of them can log in (benchmarks.load).
+# - Rows are generated from --seed, every table from its own stream, so the
+#   same options give the same data. Times are spread over the --days before
+#   now.
+# - The defaults follow a steady state: 5% of the leads PENDING, like a
+#   backlog that is mostly worked through, and 2% used / 1% expired refresh
+#   tokens, no older than maintenance keeps them. benchmarks.query_plans
+#   --no-seed expects a similar shape, much higher shares make a Seq Scan the
+#   right plan.
+#
+# Emails are fixed (seed-attorney-N@example.com), seeding twice fails on the
+# unique indexes. --truncate empties the seeded tables first, ALL rows in them
+# are deleted. Tables are ANALYZEd at the end.
+
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from collections import Counter
+from collections.abc import Iterator
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+from typing import Any
+
+os.environ.setdefault("SECURITY__JWT_SECRET_KEY", "benchmark")
+os.environ.setdefault("DATABASE__PASSWORD", "benchmark")
+
+import asyncpg  # noqa: E402
+
+from app.core.config import get_settings  # noqa: E402
+from app.core.security.password import get_password_hash  # noqa: E402
+
+SEED_TABLES = [
+    "attorneys",
+    "resume_blobs",
+    "prospects",
+    "leads",
+    "attorney_lead_counts",
+    "refresh_token",
+]
+
+
+def _uuid(rng: random.Random) -> uuid.UUID:
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+
+def zipf_cum_weights(count: int, skew: float) -> list[float]:
+    return list(itertools.accumulate(1 / (rank + 1) ** skew for rank in range(count)))
+
+
+class Dataset:
+    def __init__(self, args: argparse.Namespace, now: datetime) -> None:
+        self.args = args
+        self.now = now
+        self.window_secs = args.days * 86400
+        ids_rng = self._rng("attorney ids")
+        self.attorney_ids = [_uuid(ids_rng) for _ in range(args.attorneys)]
+        self.prospect_ids: list[uuid.UUID] = []
+        self.prospect_times: list[float] = []
+        self.blob_refs: Counter[int] = Counter()
+        self.lead_counts: Counter[tuple[uuid.UUID, str]] = Counter()
+        self.attorney_weights = zipf_cum_weights(args.attorneys, args.skew)
+
+    def _rng(self, table: str) -> random.Random:
+        return random.Random(f"{self.args.seed}-{table}")
+
+    def _time(self, secs_ago: float) -> datetime:
+        return self.now - timedelta(seconds=secs_ago)
+
+    def _pick_attorneys(self, rng: random.Random, count: int) -> Iterator[uuid.UUID]:
+        for start in range(0, count, 10_000):
+            picks = rng.choices(
+                self.attorney_ids,
+                cum_weights=self.attorney_weights,
+                k=min(10_000, count - start),
+            )
+            yield from picks
+
+    @staticmethod
+    def _digest(blob: int) -> str:
+        return hashlib.sha256(f"seed-resume-{blob}".encode()).hexdigest()
+
+    def attorneys(self, hashed_password: str) -> Iterator[tuple[Any, ...]]:
+        rng = self._rng("attorneys")
+        for number, attorney_id in enumerate(self.attorney_ids):
+            created = self._time(rng.uniform(0, self.window_secs))
+            yield (
+                attorney_id,
+                f"Seed Attorney {number}",
+                f"seed-attorney-{number}@example.com",
+                hashed_password,
+                created,
+                created,
+            )
+
+    def prospects(self) -> Iterator[tuple[Any, ...]]:
+        rng = self._rng("prospects")
+        blobs = max(1, int(self.args.prospects * self.args.distinct_resumes))
+        for number in range(self.args.prospects):
+            prospect_id = _uuid(rng)
+            secs_ago = rng.uniform(0, self.window_secs)
+            blob = rng.randrange(blobs)
+            self.prospect_ids.append(prospect_id)
+            self.prospect_times.append(secs_ago)
+            self.blob_refs[blob] += 1
+            created = self._time(secs_ago)
+            yield (
+                prospect_id,
+                f"seed-prospect-{number}@example.com",
+                f"Seed Prospect {number}",
+                self._digest(blob),
+                created,
+                created,
+            )
+
+    def resume_blobs(self) -> Iterator[tuple[Any, ...]]:
+        # After prospects, the reference counts are known by then
+        rng = self._rng("resume blobs")
+        for blob, ref_count in sorted(self.blob_refs.items()):
+            updated = self._time(rng.uniform(0, self.window_secs))
+            yield (
+                self._digest(blob),
+                rng.randint(10_000, 2_000_000),
+                ref_count,
+                updated,
+                updated,
+            )
+
+    def leads(self) -> Iterator[tuple[Any, ...]]:
+        rng = self._rng("leads")
+        attorneys = self._pick_attorneys(rng, self.args.leads)
+        for number, attorney_id in enumerate(attorneys):
+            if number < len(self.prospect_ids):
+                prospect = number
+                secs_ago = self.prospect_times[number]
+            else:
+                # Repeat filing, after the prospect first appeared
+                prospect = rng.randrange(len(self.prospect_ids))
+                secs_ago = rng.uniform(0, self.prospect_times[prospect])
+            state = "PENDING" if rng.random() < self.args.pending else "REACHED_OUT"
+            self.lead_counts[attorney_id, state] += 1
+            created = self._time(secs_ago)
+            yield (
+                _uuid(rng),
+                attorney_id,
+                self.prospect_ids[prospect],
+                state,
+                created,
+                created,
+            )
+
+    def attorney_lead_counts(self) -> Iterator[tuple[Any, ...]]:
+        for (attorney_id, state), count in self.lead_counts.items():
+            yield (attorney_id, state, count, self.now, self.now)
+
+    def refresh_tokens(self) -> Iterator[tuple[Any, ...]]:
+        rng = self._rng("refresh tokens")
+        settings = get_settings()
+        refresh_secs = settings.security.refresh_token_expire_secs
+        # Older used and expired tokens would have been purged by maintenance,
+        # whole seconds as exp is an int
+        purged_after = int(
+            settings.maintenance.refresh_token_retention_secs
+            + settings.maintenance.interval_secs
+        )
+        now_secs = int(self.now.timestamp())
+        attorneys = self._pick_attorneys(rng, self.args.refresh_tokens)
+        for number, attorney_id in enumerate(attorneys):
+            if rng.random() < self.args.expired_tokens:
+                exp = now_secs - rng.randrange(1, purged_after)
+            else:
+                exp = now_secs + rng.randrange(1, refresh_secs)
+            issued = datetime.fromtimestamp(exp - refresh_secs, UTC)
+            updated = issued
+            used = rng.random() < self.args.used_tokens
+            if used:
+                updated = max(issued, self._time(rng.uniform(0, purged_after)))
+            token_hash = hashlib.sha256(
+                f"seed-{self.args.seed}-token-{number}".encode()
+            ).digest()
+            yield (token_hash, used, exp, attorney_id, issued, updated)
+
+
+async def copy(
+    connection: asyncpg.Connection,
+    table: str,
+    columns: list[str],
+    records: Iterator[tuple[Any, ...]],
+) -> tuple[int, float]:
+    start = time.perf_counter()
+    status = await connection.copy_records_to_table(
+        table, records=records, columns=columns
+    )
+    return int(status.split()[-1]), time.perf_counter() - start
+
+
+def _top_share(counts: Counter[uuid.UUID], attorneys: int) -> float:
+    top = max(1, attorneys // 100)
+    total = sum(counts.values())
+    return (
+        round(sum(count for _, count in counts.most_common(top)) / total, 3)
+        if total
+        else 0.0
+    )
+
+
+async def main_async(args: argparse.Namespace) -> dict[str, Any]:
+    dataset = Dataset(args, now=datetime.now(UTC))
+    # The one expensive hash, shared by every attorney
+    hashed_password = get_password_hash(args.password)
+
+    uri = get_settings().sqlalchemy_database_uri.set(drivername="postgresql")
+    connection = await asyncpg.connect(uri.render_as_string(hide_password=False))
+    times = {}
+    rows = {}
+    try:
+        async with connection.transaction():
+            if args.truncate:
+                await connection.execute(f"TRUNCATE {', '.join(SEED_TABLES)} CASCADE")
+            tables = [
+                (
+                    "attorneys",
+                    ["attorney_id", "name", "email", "hashed_password"],
+                    dataset.attorneys(hashed_password),
+                ),
+                (
+                    "prospects",
+                    ["prospect_id", "email", "name", "resume"],
+                    dataset.prospects(),
+                ),
+                (
+                    "resume_blobs",
+                    ["digest", "size", "ref_count"],
+                    dataset.resume_blobs(),
+                ),
+                (
+                    "leads",
+                    ["lead_id", "attorney_id", "prospect_id", "state"],
+                    dataset.leads(),
+                ),
+                (
+                    "attorney_lead_counts",
+                    ["attorney_id", "state", "lead_count"],
+                    dataset.attorney_lead_counts(),
+                ),
+                (
+                    "refresh_token",
+                    ["token_hash", "used", "exp", "attorney_id"],
+                    dataset.refresh_tokens(),
+                ),
+            ]
+            for table, columns, records in tables:
+                rows[table], times[table] = await copy(
+                    connection, table, [*columns, "create_time", "update_time"], records
+                )
+                print(
+                    f"{table}: {rows[table]} rows in {times[table]:.1f}s",
+                    file=sys.stderr,
+                )
+        for table in SEED_TABLES:
+            await connection.execute(f"ANALYZE {table}")
+    finally:
+        await connection.close()
+
+    leads_per_attorney: Counter[uuid.UUID] = Counter()
+    for (attorney_id, _), count in dataset.lead_counts.items():
+        leads_per_attorney[attorney_id] += count
+    return {
+        "seed": args.seed,
+        "skew": args.skew,
+        "rows": rows,
+        "copy_secs": {table: round(secs, 2) for table, secs in times.items()},
+        "top_1pct_attorneys_lead_share": _top_share(leads_per_attorney, args.attorneys),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="seed the database with synthetic rows"
+    )
+    parser.add_argument("--attorneys", type=int, default=1000)
+    parser.add_argument("--prospects", type=int, default=500_000)
+    parser.add_argument("--leads", type=int, default=1_000_000)
+    parser.add_argument("--refresh-tokens", type=int, default=200_000)
+    parser.add_argument(
+        "--skew", type=float, default=1.1, help="Zipf exponent, 0 for uniform"
+    )
+    parser.add_argument(
+        "--pending", type=float, default=0.05, help="share of PENDING leads"
+    )
+    parser.add_argument(
+        "--distinct-resumes", type=float, default=0.8, help="resume blobs per prospect"
+    )
+    parser.add_argument("--used-tokens", type=float, default=0.02)
+    parser.add_argument("--expired-tokens", type=float, default=0.01)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--password", default="seed-password")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--truncate",
+        action="store_true",
+        help="delete all rows of the seeded tables first",
+    )
+    parser.add_argument("--output", type=Path)
+    args = parser.parse_args()
+    if args.attorneys < 1 or args.leads and not args.prospects:
+        parser.error("leads need at least one attorney and one prospect")
+
+    try:
+        report = asyncio.run(main_async(args))
+    except asyncpg.UniqueViolationError as exc:
+        sys.exit(f"{exc}\nalready seeded? --truncate empties the tables first")
+    print(json.dumps(report, indent=2))
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
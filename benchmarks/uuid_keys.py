@@ -0,0 +1,173 @@
+# Insert rate and index size with UUIDv4 against UUIDv7 keys
+#
+# For every key version a scratch copy of leads (same columns and indexes, no
+# foreign keys or triggers) is filled in batches like lead intake writes it,
+# one INSERT and commit per batch, with keys from app/core/ids.py. Reports
+# rows per second overall and over the last fifth (the index no longer fits
+# in cache on larger runs, random keys then read a leaf page per row) and the
+# size of the table, its primary key and all its indexes afterwards.
+#
+# Exits with 1 when the v7 keys generated are not all version 7 and in
+# generation order. The scratch tables are dropped unless --keep is given:
+# python -m benchmarks.uuid_keys --rows 2000000
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+os.environ.setdefault("SECURITY__JWT_SECRET_KEY", "benchmark")
+os.environ.setdefault("DATABASE__PASSWORD", "benchmark")
+
+import asyncpg  # noqa: E402
+
+from app.core.config import get_settings  # noqa: E402
+from app.core.ids import uuid7  # noqa: E402
+
+UUID_V7 = 7
+GENERATORS: dict[int, Callable[[], uuid.UUID]] = {4: uuid.uuid4, UUID_V7: uuid7}
+# share of seeded leads still pending, most have been reached out to
+PENDING_SHARE = 0.05
+
+INSERT = """
+    INSERT INTO {table} (lead_id, attorney_id, prospect_id, state)
+    SELECT * FROM unnest($1::uuid[], $2::uuid[], $3::uuid[], $4::text[])
+"""
+
+
+def generation_us(generate: Callable[[], uuid.UUID], count: int = 100_000) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        str(generate())
+    return round((time.perf_counter() - start) / count * 1e6, 3)
+
+
+def ordered_v7(count: int = 100_000) -> bool:
+    keys = [uuid7() for _ in range(count)]
+    return all(key.version == UUID_V7 for key in keys) and all(
+        a < b for a, b in zip(keys, keys[1:])
+    )
+
+
+async def fill(
+    connection: asyncpg.Connection, version: int, args: argparse.Namespace
+) -> dict[str, Any]:
+    table = f"uuid_keys_bench_v{version}"
+    await connection.execute(f"DROP TABLE IF EXISTS {table}")
+    await connection.execute(
+        f"CREATE TABLE {table} (LIKE leads INCLUDING DEFAULTS INCLUDING INDEXES)"
+    )
+
+    generate = GENERATORS[version]
+    # Same attorneys, prospects and states for every version
+    rng = random.Random(args.seed)
+    attorneys = [uuid.UUID(int=rng.getrandbits(128), version=4) for _ in range(1000)]
+    statement = INSERT.format(table=table)
+    batches = -(-args.rows // args.batch)
+    last_fifth_from = batches - max(1, batches // 5)
+    start = time.perf_counter()
+    last_fifth_start = start
+    for number in range(batches):
+        if number == last_fifth_from:
+            last_fifth_start = time.perf_counter()
+        size = min(args.batch, args.rows - number * args.batch)
+        await connection.execute(
+            statement,
+            [generate() for _ in range(size)],
+            rng.choices(attorneys, k=size),
+            [uuid.UUID(int=rng.getrandbits(128), version=4) for _ in range(size)],
+            [
+                "PENDING" if rng.random() < PENDING_SHARE else "REACHED_OUT"
+                for _ in range(size)
+            ],
+        )
+    end = time.perf_counter()
+    last_fifth_rows = args.rows - last_fifth_from * args.batch
+
+    sizes = await connection.fetchrow(
+        """
+        SELECT pg_table_size($1::regclass) AS table_bytes,
+               pg_relation_size($2::regclass) AS pkey_bytes,
+               pg_indexes_size($1::regclass) AS indexes_bytes
+        """,
+        table,
+        f"{table}_pkey",
+    )
+    if not args.keep:
+        await connection.execute(f"DROP TABLE {table}")
+    return {
+        "rows_per_sec": round(args.rows / (end - start)),
+        "last_fifth_rows_per_sec": round(last_fifth_rows / (end - last_fifth_start)),
+        **dict(sizes),
+        "key_generation_us": generation_us(generate),
+    }
+
+
+async def main_async(args: argparse.Namespace) -> dict[str, Any]:
+    uri = get_settings().sqlalchemy_database_uri.set(drivername="postgresql")
+    connection = await asyncpg.connect(uri.render_as_string(hide_password=False))
+    results = {}
+    try:
+        for version in args.versions:
+            results[f"v{version}"] = await fill(connection, version, args)
+            print(f"v{version}: {json.dumps(results[f'v{version}'])}", file=sys.stderr)
+    finally:
+        await connection.close()
+
+    report: dict[str, Any] = {
+        "rows": args.rows,
+        "batch": args.batch,
+        "versions": results,
+    }
+    if "v4" in results and "v7" in results:
+        report["v7_vs_v4"] = {
+            key: round(results["v7"][key] / results["v4"][key], 3)
+            for key in (
+                "rows_per_sec",
+                "last_fifth_rows_per_sec",
+                "pkey_bytes",
+                "indexes_bytes",
+            )
+        }
+    report["v7_keys_ordered"] = ordered_v7()
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="insert rate and index size with v4 and v7 keys"
+    )
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument(
+        "--batch", type=int, default=100, help="rows per INSERT and commit"
+    )
+    parser.add_argument(
+        "--versions",
+        type=lambda value: [int(v) for v in value.split(",")],
+        default=[4, 7],
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch tables")
+    parser.add_argument("--output", type=Path)
+    args = parser.parse_args()
+    if any(version not in GENERATORS for version in args.versions):
+        parser.error("--versions takes 4 and/or 7")
+
+    report = asyncio.run(main_async(args))
+    print(json.dumps(report, indent=2))
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    if not report["v7_keys_ordered"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,3 +2,14 @@
 
 echo "Run migrations"
 alembic upgrade head
+
+# Workers share metrics through this directory, values of a previous run
+# must not be added to the new ones (see app/core/metrics.py)
+if [ -n "$PROMETHEUS_MULTIPROC_DIR" ]; then
+    echo "Reset metrics directory"
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+    if id uvicorn >/dev/null 2>&1; then
+        chown uvicorn:uvicorn "$PROMETHEUS_MULTIPROC_DIR"
+    fi
+fi